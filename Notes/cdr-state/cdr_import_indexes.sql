@@ -0,0 +1,6 @@
+-- cdr_import is created by cdr-pusher (CDRImport is managed = False), so
+-- Django migrations never touch it. Run once on the cdr-pusher database:
+--   psql -d <cdr-pusher db> -f cdr_import_indexes.sql
+
+-- GeneralReport: latest CDR per job uuid
+CREATE INDEX IF NOT EXISTS cdr_import_callid_idx ON cdr_import (callid, starting_date DESC);
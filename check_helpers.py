@@ -0,0 +1,25 @@
+"""Pass/fail reporting shared by the check scripts (see TEST_SCRIPTS_GUIDE.md)"""
+
+import sys
+
+failures = 0
+
+
+def check(label, ok, detail=None):
+    """Print one ✓/✗ line and count failures; `detail` is shown under a failed check"""
+    global failures
+    print(f"   {'✓' if ok else '✗'} {label}")
+    if not ok:
+        failures += 1
+        if detail:
+            print("     " + detail.replace("\n", "\n     "))
+    return ok
+
+
+def finish(failed="checks failed", passed="All checks passed"):
+    """Print the summary line; exit with status 1 if any check failed"""
+    print()
+    if failures:
+        print(f"❌ {failures} {failed}")
+        sys.exit(1)
+    print(f"✅ {passed}")
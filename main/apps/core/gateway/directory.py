@@ -0,0 +1,59 @@
+from xml.etree import ElementTree as ET
+from django.conf import settings
+from django.core.cache import cache
+from main.apps.gateway.models import Gateway
+
+GATEWAY_VERSION_KEY = "gateway:xml:version"
+GATEWAY_XML_TIMEOUT = getattr(settings, 'GATEWAY_XML_CACHE_TIMEOUT', 3600)
+
+NOT_FOUND = (
+	'<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+	'<document type="freeswitch/xml">'
+	'<section name="result"><result status="not found"/></section>'
+	'</document>'
+)
+
+
+def get_gateway_version():
+	version = cache.get(GATEWAY_VERSION_KEY)
+	if version is None:
+		cache.add(GATEWAY_VERSION_KEY, 1, timeout=None)
+		version = cache.get(GATEWAY_VERSION_KEY, 1)
+	return version
+
+
+def invalidate_gateways():
+	"""Drop every cached directory document; called when a gateway changes"""
+	try:
+		cache.incr(GATEWAY_VERSION_KEY)
+	except ValueError:
+		cache.set(GATEWAY_VERSION_KEY, 1, timeout=None)
+
+
+def render_gateways(profile, domain):
+	"""
+	Directory document carrying the profile's gateways
+
+	Sofia reads it when the profile is started or rescanned and its
+	<domains> entry has parse="true" (see Notes/freeswitch-gateways.md).
+	"""
+	document = ET.Element("document", type="freeswitch/xml")
+	section = ET.SubElement(document, "section", name="directory")
+	domain_el = ET.SubElement(section, "domain", name=domain)
+	user = ET.SubElement(domain_el, "user", id="gateways")
+	gateways = ET.SubElement(user, "gateways")
+	for gw in Gateway.objects.filter(profile=profile, is_active=True).iterator():
+		gateway = ET.SubElement(gateways, "gateway", name=gw.name)
+		for name, value in gw.get_params():
+			ET.SubElement(gateway, "param", name=name, value=value)
+	return '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n' + ET.tostring(document, encoding="unicode")
+
+
+def get_gateways_xml(profile, domain):
+	"""Cached render_gateways(); a version bump makes every cached copy unreachable"""
+	key = "gateway:xml:%s:%s:%s" % (get_gateway_version(), profile, domain)
+	xml = cache.get(key)
+	if xml is None:
+		xml = render_gateways(profile, domain)
+		cache.set(key, xml, GATEWAY_XML_TIMEOUT)
+	return xml
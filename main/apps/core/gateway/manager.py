@@ -1,9 +1,14 @@
-from xml.etree import ElementTree as ET
-from .gateway import GateWay
-import main.utils.esl.ESL as ESL
-from ..vars import FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD, GATEWAY_PREFIX
+from .status import get_gateway_status
+from main.apps.gateway.models import Gateway
+from ..vars import GATEWAY_PREFIX
 
 class GatewayManager(object):
+	"""
+	Create, edit and delete gateways in the database
+
+	Changes reach FreeSWITCH through the xml_curl directory endpoint; the
+	sofia reload is queued and applied in batches by `manage.py reload_gateways`.
+	"""
 	def __init__(self, service="", username="", password="", host="", register=False):
 		self.service = service
 		self.username = username
@@ -12,36 +17,44 @@ class GatewayManager(object):
 		self.register = register
 
 	def execute(self):
-		body = None
 		name = GATEWAY_PREFIX + self.username
-		con = ESL.ESLconnection(FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD)
-		gateway = GateWay(self.username, self.password, self.host, self.register)
+		defaults = {
+			"username": self.username,
+			"password": self.password,
+			"realm": self.host,
+			"register": self.register in (True, "true"),
+		}
 		if self.service == "new":
-			gateway.add_new()
-			if con.connected():
-				xx = con.api("sofia", str("profile external killgw %s reloadxml" % name))
-				xx = con.api("sofia profile external rescan reloadxml")
-				if xx:
-					# print xx.getBody()
-					body = xx.getBody()
+			Gateway.objects.update_or_create(name=name, defaults=defaults)
 		elif self.service == "edit":
-			gateway.modify_existed()
-			if con.connected():
-				xx = con.api("sofia", str("profile external killgw %s reloadxml" % name))
-				xx = con.api("sofia profile external rescan reloadxml")
-				if xx:
-					#print xx.getBody()
-					body = xx.getBody()
+			gateway = Gateway.objects.filter(name=name).first()
+			if gateway is None:
+				return None
+			for field, value in defaults.items():
+				setattr(gateway, field, value)
+			gateway.save()
 		elif self.service == "delete":
+			gateway = Gateway.objects.filter(name=name).first()
+			if gateway is None:
+				return None
 			gateway.delete()
-			if con.connected():
-				xx = con.api("sofia", str("profile external killgw %s reloadxml" % name))
-				xx = con.api("sofia profile external rescan reloadxml")
-				if xx:
-					# print xx.getBody()
-					body = xx.getBody()
-		con.disconnect()
-		return body
+		else:
+			return None
+		return "Gateway %s %s; reload queued" % (name, "deleted" if self.service == "delete" else "saved")
+
 	def check(self):
-		gateway = GateWay(self.username, "", "", "")
-		return gateway.check()
\ No newline at end of file
+		args = {}
+		name = GATEWAY_PREFIX + self.username
+		gateway = Gateway.objects.filter(name=name).first()
+		if gateway:
+			snapshot = get_gateway_status()
+			args["status"] = "Ok"
+			args["code"] = 200
+			args["body"] = dict(gateway.get_params())
+			# Live sofia state from the cached `xmlstatus gateway` snapshot
+			args["registration"] = snapshot["gateways"].get(name) if snapshot else None
+			args["fetched_at"] = snapshot["fetched_at"] if snapshot else None
+		else:
+			args['status'] = "Not Found"
+			args["code"] = 404
+		return args
@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.db.models import Max, Min
+from django.utils import timezone
+import main.utils.esl.ESL as ESL
+from main.apps.gateway.models import GatewayReload
+from ..vars import FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD
+
+
+class GatewayReloader(object):
+	"""
+	Apply queued gateway changes to sofia in one batch
+
+	A batch is held back while changes keep arriving (`quiet` seconds since
+	the last one), but never longer than `max_delay` seconds after the first.
+	Each batch kills only the changed gateways and rescans each affected
+	profile once, instead of a full `rescan reloadxml` per edit.
+	"""
+	def __init__(self, quiet=2, max_delay=30):
+		self.quiet = timedelta(seconds=quiet)
+		self.max_delay = timedelta(seconds=max_delay)
+
+	def ready_batch(self):
+		"""Highest GatewayReload id to apply now, or None while debouncing"""
+		agg = GatewayReload.objects.aggregate(first=Min('created'), last=Max('created'), last_id=Max('id'))
+		if agg['last_id'] is None:
+			return None
+		now = timezone.now()
+		if now - agg['last'] < self.quiet and now - agg['first'] < self.max_delay:
+			return None
+		return agg['last_id']
+
+	def apply(self, force=False):
+		"""Run one batch; returns the sofia commands issued (empty if nothing was due)"""
+		last_id = GatewayReload.objects.aggregate(last_id=Max('id'))['last_id'] if force else self.ready_batch()
+		if last_id is None:
+			return []
+
+		pending = GatewayReload.objects.filter(id__lte=last_id)
+		kills = set()
+		profiles = set()
+		for name, profile, action in pending.values_list('name', 'profile', 'action'):
+			profiles.add(profile)
+			if action == 'kill':
+				kills.add((profile, name))
+
+		commands = ["profile %s killgw %s" % (profile, name) for profile, name in sorted(kills)]
+		commands += ["profile %s rescan" % profile for profile in sorted(profiles)]
+
+		con = ESL.ESLconnection(FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD)
+		if not con.connected():
+			# Leave the batch queued; the next run retries it
+			raise ConnectionError("Failed to connect to FreeSWITCH")
+		try:
+			for command in commands:
+				con.api("sofia", str(command))
+		finally:
+			con.disconnect()
+
+		pending.delete()
+		return commands
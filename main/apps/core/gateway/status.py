@@ -0,0 +1,88 @@
+from datetime import datetime
+from xml.etree import ElementTree as ET
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import main.utils.esl.ESL as ESL
+from ..vars import FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD
+
+STATUS_KEY = "gateway:status"
+STATUS_LOCK_KEY = "gateway:status:lock"
+STATUS_TTL = getattr(settings, 'GATEWAY_STATUS_TTL', 30)
+
+# xmlstatus element -> (key, type); credentials and SIP URIs are left out
+STATUS_FIELDS = {
+	'profile': ('profile', str),
+	'state': ('state', str),
+	'status': ('status', str),
+	'pingtime': ('ping_time', float),
+	'uptime-usec': ('uptime_usec', int),
+	'calls-in': ('calls_in', int),
+	'calls-out': ('calls_out', int),
+	'failed-calls-in': ('failed_calls_in', int),
+	'failed-calls-out': ('failed_calls_out', int),
+}
+
+
+def parse_gateway_status(xml):
+	"""`sofia xmlstatus gateway` output -> {gateway name: status dict}"""
+	result = {}
+	for gateway in ET.fromstring(xml).iter('gateway'):
+		name = gateway.findtext('name')
+		if not name:
+			continue
+		status = {}
+		for tag, (key, cast) in STATUS_FIELDS.items():
+			value = gateway.findtext(tag)
+			try:
+				status[key] = cast(value) if value is not None else None
+			except ValueError:
+				status[key] = None
+		result[name] = status
+	return result
+
+
+def refresh_gateway_status():
+	"""One ESL call for every gateway; stores and returns the snapshot"""
+	con = ESL.ESLconnection(FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD)
+	if not con.connected():
+		raise ConnectionError("Failed to connect to FreeSWITCH")
+	try:
+		res = con.api("sofia", "xmlstatus gateway")
+		body = res.getBody() if res else ""
+	finally:
+		con.disconnect()
+
+	snapshot = {
+		"fetched_at": timezone.now().isoformat(),
+		"gateways": parse_gateway_status(body) if body and body.lstrip().startswith("<") else {},
+	}
+	# Kept twice as long as the TTL so readers can still get a stale copy if FreeSWITCH is down
+	cache.set(STATUS_KEY, snapshot, STATUS_TTL * 2)
+	return snapshot
+
+
+def get_gateway_status():
+	"""
+	Latest snapshot from cache
+
+	Refreshes inline when the snapshot is older than GATEWAY_STATUS_TTL.
+	Only one process refreshes at a time; the others serve the stale copy.
+	Returns None if there is no snapshot and FreeSWITCH can't be reached.
+	"""
+	snapshot = cache.get(STATUS_KEY)
+	if snapshot is None:
+		try:
+			return refresh_gateway_status()
+		except ConnectionError:
+			return None
+
+	age = (timezone.now() - datetime.fromisoformat(snapshot["fetched_at"])).total_seconds()
+	if age < STATUS_TTL or not cache.add(STATUS_LOCK_KEY, 1, STATUS_TTL):
+		return snapshot
+	try:
+		return refresh_gateway_status()
+	except ConnectionError:
+		return snapshot
+	finally:
+		cache.delete(STATUS_LOCK_KEY)
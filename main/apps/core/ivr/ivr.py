@@ -1,4 +1,4 @@
-from xml.etree import ElementTree as ET
+from xml.sax.saxutils import quoteattr
 
 class IVR(object):
 
@@ -20,25 +20,36 @@ class IVR(object):
 		self.digit_len = digit_len
 		self.action_list = action_list
 
-	def write(self, root):
-		main_menu = ET.SubElement(root, "menu")
-		main_menu.set("name", self.name)
-		main_menu.set("greet-long", self.greet_long)
-		main_menu.set("greet-short", self.greet_short)
-		main_menu.set("invalid-sound", self.invalid_sound)
-		main_menu.set("exit-sound", self.exit_sound)
-		main_menu.set("confirm-macro", self.confirm_macro)
-		main_menu.set("confirm-key", self.confirm_key)
-		main_menu.set("tts-engine", self.tts_engine)
-		main_menu.set("tts-voice", self.tts_voice)
-		main_menu.set("confirm-attempts", self.confirm_attempts)
-		main_menu.set("timeout", self.timeout)
-		main_menu.set("inter-digit-timeout", self.inter_digit_timeout)
-		main_menu.set("max-failures", self.max_failures)
-		main_menu.set("max-timeouts", self.max_timeouts)
-		main_menu.set("digit-len", self.digit_len)
+	def attributes(self):
+		return [
+			("name", self.name),
+			("greet-long", self.greet_long),
+			("greet-short", self.greet_short),
+			("invalid-sound", self.invalid_sound),
+			("exit-sound", self.exit_sound),
+			("confirm-macro", self.confirm_macro),
+			("confirm-key", self.confirm_key),
+			("tts-engine", self.tts_engine),
+			("tts-voice", self.tts_voice),
+			("confirm-attempts", self.confirm_attempts),
+			("timeout", self.timeout),
+			("inter-digit-timeout", self.inter_digit_timeout),
+			("max-failures", self.max_failures),
+			("max-timeouts", self.max_timeouts),
+			("digit-len", self.digit_len),
+		]
+
+	def write(self, out):
+		"""Stream this <menu> to a text file object, already indented"""
+		out.write("  <menu %s>\n" % _attrs(self.attributes()))
 		for action in self.action_list:
-			action_tag = ET.SubElement(main_menu, "entry")
-			action_tag.set("action", action.get("action"))
-			action_tag.set("digits", action.get("digits"))
-			action_tag.set("params", action.get("params"))
\ No newline at end of file
+			out.write("    <entry %s/>\n" % _attrs([
+				("action", action.get("action")),
+				("digits", action.get("digits")),
+				("params", action.get("params")),
+			]))
+		out.write("  </menu>\n")
+
+
+def _attrs(pairs):
+	return " ".join("%s=%s" % (name, quoteattr(str(value))) for name, value in pairs)
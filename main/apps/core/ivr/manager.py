@@ -1,11 +1,24 @@
-from ivr import IVR
-from xml.etree import ElementTree as ET
-from ..vars import IVR_DIR , GATEWAY_PREFIX, FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD
+from .ivr import IVR
+from ..vars import IVR_DIR , IVR_FILE_MAX_AGE, GATEWAY_PREFIX, FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD
+import hashlib
+import json
+import os
 import time
-import datetime
+from xml.etree import ElementTree as ET
 import main.utils.esl.ESL as ESL
 
 class IVRManager(object):
+	"""
+	Write IVR menus and originate calls into them
+
+	Menu files are named after a hash of their definition, so repeating a
+	campaign with the same menus reuses the existing file and skips
+	reloadxml. FreeSWITCH finds a menu by name across every file, so when a
+	new file is written the user's other files defining one of its menu
+	names are removed at once (calls already in a menu keep the copy they
+	loaded). Files with other names are removed once no campaign has used
+	them for IVR_FILE_MAX_AGE.
+	"""
 
 	def __init__(self, service, username, ivr_list_dic, numbers):
 		self.service = service
@@ -14,63 +27,87 @@ class IVRManager(object):
 		self.numbers = numbers
 		self.name = GATEWAY_PREFIX + self.username
 
-	def indent(self, elem, level=0):
-		i = "\n" + level*"  "
-		if len(elem):
-			if not elem.text or not elem.text.strip():
-				elem.text = i + "  "
-			if not elem.tail or not elem.tail.strip():
-				elem.tail = i
-			for elem in elem:
-				self.indent(elem, level+1)
-			if not elem.tail or not elem.tail.strip():
-				elem.tail = i
-		else:
-			if level and (not elem.tail or not elem.tail.strip()):
-				elem.tail = i
-
 	def execute(self):
-		file_path = self.write_xml_ivr()
-		self.reload_xml()
-		numbers_list = []
+		file_path, changed = self.write_xml_ivr()
+		if changed:
+			self.reload_xml()
 		numbers_list = self.numbers.split(',')
+		bodies = []
 		con = ESL.ESLconnection(FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD)
 		if con.connected():
 			for number in numbers_list:
 				xx = con.bgapi("originate", str("sofia/gateway/%s/%s &ivr(%s)" % (self.name, number, self.ivr_list_dic[0]["name"])))
 				if xx:
-					print xx.getBody()
+					bodies.append(xx.getBody())
 		con.disconnect()
+		return bodies
 
-	def write_xml_ivr(self):
-		root = ET.Element("include")
+	def menus(self):
 		for menu in self.ivr_list_dic:
 			actions = []
-			actions_string = []
-			actions_string = menu["entry"].split(',')
-			for x in actions_string:
-				tmp_list = []
+			for x in menu["entry"].split(','):
 				tmp_list = x.split(':')
-				tmp_dic = {}
-				tmp_dic["action"] = tmp_list[0]
-				tmp_dic["digits"] = tmp_list[1]
-				tmp_dic["params"] = tmp_list[2]
-				actions.append(tmp_dic)
-			tmp_ivr_menu = IVR(menu["name"], menu["greet_long"], menu["greet_short"], menu["invalid_sound"], menu["exit_sound"], menu["confirm_macro"], menu["confirm_key"], menu["tts_engine"], menu["tts_voice"], menu["confirm_attempts"], menu["timeout"], menu["inter_digit_timeout"], menu["max_failures"], menu["max_timeouts"], menu["digit_len"], actions)
-			tmp_ivr_menu.write(root)
-		ts = time.time()
-		st = datetime.datetime.fromtimestamp(ts).strftime('%Y%m%d%H%M%S')
-		file_name = self.username + "IVR" + st + ".xml"
-		self.indent(root)
-		tree = ET.ElementTree(root)
+				actions.append({
+					"action": tmp_list[0],
+					"digits": tmp_list[1],
+					"params": tmp_list[2],
+				})
+			yield IVR(menu["name"], menu["greet_long"], menu["greet_short"], menu["invalid_sound"], menu["exit_sound"], menu["confirm_macro"], menu["confirm_key"], menu["tts_engine"], menu["tts_voice"], menu["confirm_attempts"], menu["timeout"], menu["inter_digit_timeout"], menu["max_failures"], menu["max_timeouts"], menu["digit_len"], actions)
+
+	def content_hash(self):
+		canonical = json.dumps(self.ivr_list_dic, sort_keys=True, separators=(',', ':'), default=str)
+		return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+	def write_xml_ivr(self):
+		"""Returns (file_path, changed); changed is False when an identical file already exists"""
+		prefix = self.username + "IVR"
+		file_name = "%s-%s.xml" % (prefix, self.content_hash())
 		file_path = "%s%s" % (IVR_DIR, file_name)
-		tree.write(file_path)
-		return file_path
+		if os.path.exists(file_path):
+			# Mark it as in use again so remove_stale leaves it alone
+			os.utime(file_path)
+			return file_path, False
+
+		# Write under a temporary name so FreeSWITCH never reads a partial file
+		tmp_path = file_path + ".tmp"
+		with open(tmp_path, "w", encoding="utf-8") as out:
+			out.write("<include>\n")
+			for menu in self.menus():
+				menu.write(out)
+			out.write("</include>\n")
+		os.replace(tmp_path, file_path)
+
+		self.remove_stale(prefix, keep=file_name, names={menu["name"] for menu in self.ivr_list_dic})
+		return file_path, True
+
+	def remove_stale(self, prefix, keep, names):
+		"""
+		Delete this user's other IVR files (older hashes and legacy timestamped ones)
+		that define one of `names` or haven't been used for IVR_FILE_MAX_AGE
+		"""
+		cutoff = time.time() - IVR_FILE_MAX_AGE
+		for entry in os.scandir(IVR_DIR):
+			if entry.name.startswith(prefix) and entry.name.endswith(".xml") and entry.name != keep:
+				try:
+					if entry.stat().st_mtime < cutoff or names & menu_names(entry.path):
+						os.remove(entry.path)
+				except OSError:
+					pass
 
 	def reload_xml(self):
 		con = ESL.ESLconnection(FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD)
+		body = None
 		if con.connected():
 			xx = con.api("reloadxml")
 			if xx:
-				print xx.getBody()
-		con.disconnect()
\ No newline at end of file
+				body = xx.getBody()
+		con.disconnect()
+		return body
+
+
+def menu_names(path):
+	"""Names of the <menu> elements in an IVR file; unreadable files define none"""
+	try:
+		return {elem.get("name") for _, elem in ET.iterparse(path) if elem.tag == "menu"}
+	except ET.ParseError:
+		return set()
@@ -4,5 +4,7 @@ FREESWITCH_PASSWORD = "ClueCon"
 GATEWAY_PREFIX = ""#"sippy"
 USERS_DIR = "/home/user1/freeswitchusers/"
 IVR_DIR = "/usr/local/freeswitch/conf/ivr_menus/"
+# Longer than any campaign runs; a user's IVR files unused this long are removed
+IVR_FILE_MAX_AGE = 2 * 24 * 60 * 60
 RXFAX_DIR = "/opt/fs-service/fax_files/rx/"
 TXFAX_DIR = "/opt/fs-service/fax_files/tx/"
@@ -1,19 +1,28 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
 from django.utils.html import format_html
-from django.urls import reverse
+from django.urls import reverse, path
 from django.utils.safestring import mark_safe
 from django.contrib import messages
-from django.db.models import Count, Sum
+from django.db.models import Count, Sum, OuterRef, Subquery, IntegerField
+from django.db.models.functions import Coalesce
 from django.shortcuts import redirect
 from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django import forms
 import requests
 import json
+import uuid
 from datetime import datetime
-from .models import FaxTransaction, FaxQueue
+from .models import FaxTransaction, FaxQueue, AdminBulkJob
 from .models_complete import (
     Tenant, DID, CoverPage, InboundFaxSettings, 
-    OutboundFaxSettings, UserProfile
+    OutboundFaxSettings, UserProfile, RateDeck, Rate, fax_transport_choices
 )
+from .bulk_actions import run_bulk_action
+from .admin_counts import tenant_counts
+from .telnyx_integration import TelnyxDIDManager
+from .search import FaxSearch
 
 
 # Custom Admin Site
@@ -32,8 +41,56 @@ class FaxAdminSite(admin.AdminSite):
 fax_admin_site = FaxAdminSite(name='fax_admin')
 
 
+def count_subquery(queryset, field='tenant'):
+    """
+    Correlated COUNT(*) of `queryset` rows pointing at the outer row
+
+    Unlike Count() over a join, several of these can be annotated on the
+    same list without multiplying rows (users x DIDs per tenant).
+    """
+    counts = queryset.filter(**{field: OuterRef('pk')}).order_by().values(field).annotate(n=Count('pk')).values('n')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class BulkActionMixin:
+    """Run actions from bulk_actions.BULK_ACTIONS inline, or queue them when the selection is large"""
+    
+    def run_bulk_action(self, request, queryset, action, message):
+        count, job = run_bulk_action(action, queryset, user=request.user)
+        if job:
+            self.message_user(
+                request,
+                f"⏳ {job.total_items} rows queued as background job #{job.pk}; "
+                f"track it under Admin bulk jobs",
+                level=messages.INFO
+            )
+        else:
+            self.message_user(request, message.format(count=count))
+
+
+class TransportChoiceMixin:
+    """Hide the fake transport from fax_transport unless it is enabled"""
+    
+    def formfield_for_choice_field(self, db_field, request, **kwargs):
+        if db_field.name == 'fax_transport':
+            kwargs['choices'] = fax_transport_choices()
+        return super().formfield_for_choice_field(db_field, request, **kwargs)
+
+
+class DIDPurchaseForm(forms.Form):
+    tenant = forms.ModelChoiceField(queryset=Tenant.objects.filter(is_active=True))
+    area_codes = forms.CharField(help_text="Comma-separated, most preferred first (e.g. 212,646,917)")
+    quantity = forms.IntegerField(min_value=1, max_value=500, initial=10)
+    
+    def clean_area_codes(self):
+        codes = [code.strip() for code in self.cleaned_data['area_codes'].split(',') if code.strip()]
+        if not codes or not all(code.isdigit() and len(code) == 3 for code in codes):
+            raise forms.ValidationError("Enter 3-digit area codes separated by commas")
+        return codes
+
+
 @admin.register(Tenant)
-class TenantAdmin(admin.ModelAdmin):
+class TenantAdmin(TransportChoiceMixin, BulkActionMixin, admin.ModelAdmin):
     list_display = ['name', 'company_name', 'domain', 'user_count', 'did_count', 'status_badge', 'created_at']
     list_filter = ['is_active', 'country', 'created_at']
     search_fields = ['name', 'company_name', 'domain', 'admin_email']
@@ -50,7 +107,7 @@ class TenantAdmin(admin.ModelAdmin):
             'fields': ('address_line1', 'address_line2', 'city', 'state', 'postal_code', 'country')
         }),
         ('Limits & Settings', {
-            'fields': ('max_users', 'max_dids', 'max_pages_per_month'),
+            'fields': ('max_users', 'max_dids', 'max_pages_per_month', 'fax_transport'),
             'classes': ('collapse',)
         }),
         ('Branding', {
@@ -62,13 +119,47 @@ class TenantAdmin(admin.ModelAdmin):
         })
     )
     
+    count_columns = ('user_count', 'did_count')
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.sorted_by_counts(request):
+            # ORDER BY needs the counts in SQL; otherwise the page reads them from tenant_counts()
+            queryset = queryset.annotate(
+                num_users=count_subquery(UserProfile.objects.all()),
+                num_dids=count_subquery(DID.objects.all())
+            )
+        return queryset
+    
+    def sorted_by_counts(self, request):
+        """Whether the changelist `o` parameter sorts on a count column"""
+        columns = list(self.get_list_display(request))
+        if self.get_actions(request):
+            columns.insert(0, 'action_checkbox')
+        for part in request.GET.get(ORDER_VAR, '').split('.'):
+            index = part.rpartition('-')[2]
+            if index.isdigit() and int(index) < len(columns) and columns[int(index)] in self.count_columns:
+                return True
+        return False
+    
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        counts = None
+        for tenant in changelist.result_list:
+            if not hasattr(tenant, 'num_users'):
+                counts = tenant_counts() if counts is None else counts
+                tenant.num_users, tenant.num_dids = counts.get(tenant.pk, (0, 0))
+        return changelist
+    
     def user_count(self, obj):
-        return obj.users.count()
+        return obj.num_users
     user_count.short_description = '👥 Users'
+    user_count.admin_order_field = 'num_users'
     
     def did_count(self, obj):
-        return obj.dids.count()
+        return obj.num_dids
     did_count.short_description = '📞 DIDs'
+    did_count.admin_order_field = 'num_dids'
     
     def status_badge(self, obj):
         if obj.is_active:
@@ -85,23 +176,22 @@ class TenantAdmin(admin.ModelAdmin):
     actions = ['activate_tenants', 'deactivate_tenants']
     
     def activate_tenants(self, request, queryset):
-        queryset.update(is_active=True)
-        self.message_user(request, f"✅ {queryset.count()} tenants activated")
+        self.run_bulk_action(request, queryset, 'activate_tenants', "✅ {count} tenants activated")
     activate_tenants.short_description = "✅ Activate selected tenants"
     
     def deactivate_tenants(self, request, queryset):
-        queryset.update(is_active=False)
-        self.message_user(request, f"❌ {queryset.count()} tenants deactivated")
+        self.run_bulk_action(request, queryset, 'deactivate_tenants', "❌ {count} tenants deactivated")
     deactivate_tenants.short_description = "❌ Deactivate selected tenants"
 
 
 @admin.register(DID)
-class DIDAdmin(admin.ModelAdmin):
-    list_display = ['formatted_number', 'tenant', 'assigned_to', 'provider_badge', 'capabilities', 'status_badge', 'actions_buttons']
-    list_filter = ['provider', 'is_active', 'is_fax_enabled', 'is_voice_enabled', 'is_sms_enabled', 'tenant']
+class DIDAdmin(TransportChoiceMixin, BulkActionMixin, admin.ModelAdmin):
+    list_display = ['formatted_number', 'tenant', 'assigned_to', 'provider_badge', 'capabilities', 'provisioning_status', 'status_badge', 'actions_buttons']
+    list_filter = ['provider', 'provisioning_status', 'is_active', 'is_fax_enabled', 'is_voice_enabled', 'is_sms_enabled', 'tenant']
     search_fields = ['number', 'description', 'assigned_to__username', 'assigned_to__email']
     raw_id_fields = ['assigned_to']
-    readonly_fields = ['created_at', 'updated_at', 'provider_sid']
+    readonly_fields = ['created_at', 'updated_at', 'provider_sid', 'provider_order_id', 'provisioning_error']
+    list_select_related = ['tenant', 'assigned_to']
     
     fieldsets = (
         ('DID Information', {
@@ -111,14 +201,14 @@ class DIDAdmin(admin.ModelAdmin):
             'fields': ('assigned_to', 'assigned_at')
         }),
         ('Provider Details', {
-            'fields': ('provider', 'provider_sid'),
+            'fields': ('provider', 'provider_sid', 'provisioning_status', 'provider_order_id', 'provisioning_error'),
             'classes': ('collapse',)
         }),
         ('Capabilities', {
             'fields': ('is_fax_enabled', 'is_voice_enabled', 'is_sms_enabled')
         }),
         ('Routing', {
-            'fields': ('route_to_email', 'route_to_extension'),
+            'fields': ('route_to_email', 'route_to_extension', 'fax_transport'),
             'classes': ('collapse',)
         }),
         ('Status', {
@@ -183,6 +273,35 @@ class DIDAdmin(admin.ModelAdmin):
     
     actions = ['purchase_dids_from_telnyx', 'assign_to_user', 'enable_fax', 'disable_fax']
     
+    def get_urls(self):
+        urls = [
+            path('purchase/', self.admin_site.admin_view(self.purchase_view), name='purchase_dids'),
+        ]
+        return urls + super().get_urls()
+    
+    def purchase_view(self, request):
+        """Search several area codes and order the numbers in one Telnyx order"""
+        form = DIDPurchaseForm(request.POST or None)
+        if request.method == 'POST' and form.is_valid():
+            data = form.cleaned_data
+            dids = TelnyxDIDManager().provision_numbers(data['tenant'], data['area_codes'], data['quantity'])
+            if dids:
+                self.message_user(
+                    request,
+                    f"🛒 Ordered {len(dids)} of {data['quantity']} DIDs for {data['tenant']}; "
+                    f"they activate when the order completes"
+                )
+                return HttpResponseRedirect(reverse('admin:fax_did_changelist'))
+            self.message_user(request, "❌ No numbers could be ordered", level=messages.ERROR)
+        
+        context = dict(
+            self.admin_site.each_context(request),
+            opts=self.model._meta,
+            title="Purchase DIDs from Telnyx",
+            form=form,
+        )
+        return TemplateResponse(request, 'admin/fax/did/purchase.html', context)
+    
     def purchase_dids_from_telnyx(self, request, queryset=None):
         """Purchase DIDs from Telnyx API"""
         # Redirect to DID purchase view
@@ -196,13 +315,11 @@ class DIDAdmin(admin.ModelAdmin):
     assign_to_user.short_description = "👤 Assign to user"
     
     def enable_fax(self, request, queryset):
-        queryset.update(is_fax_enabled=True)
-        self.message_user(request, f"📠 Fax enabled for {queryset.count()} DIDs")
+        self.run_bulk_action(request, queryset, 'enable_fax', "📠 Fax enabled for {count} DIDs")
     enable_fax.short_description = "📠 Enable fax"
     
     def disable_fax(self, request, queryset):
-        queryset.update(is_fax_enabled=False)
-        self.message_user(request, f"❌ Fax disabled for {queryset.count()} DIDs")
+        self.run_bulk_action(request, queryset, 'disable_fax', "❌ Fax disabled for {count} DIDs")
     disable_fax.short_description = "❌ Disable fax"
     
     class Media:
@@ -440,14 +557,51 @@ class OutboundFaxSettingsAdmin(admin.ModelAdmin):
     settings_summary.short_description = 'Settings'
 
 
+class RateInline(admin.TabularInline):
+    model = Rate
+    extra = 0
+    fields = ['prefix', 'description', 'rate_per_page']
+
+
+@admin.register(RateDeck)
+class RateDeckAdmin(admin.ModelAdmin):
+    list_display = ['name', 'tenant', 'default_rate', 'currency', 'rate_count', 'is_active', 'updated_at']
+    list_filter = ['is_active', 'tenant']
+    search_fields = ['name', 'tenant__name']
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [RateInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('tenant').annotate(num_rates=Count('rates'))
+    
+    def rate_count(self, obj):
+        return obj.num_rates
+    rate_count.short_description = '💰 Prefixes'
+    rate_count.admin_order_field = 'num_rates'
+
+
 @admin.register(FaxTransaction)
-class FaxTransactionAdmin(admin.ModelAdmin):
+class FaxTransactionAdmin(BulkActionMixin, admin.ModelAdmin):
     list_display = ['uuid', 'direction_icon', 'formatted_sender', 'formatted_recipient', 
                    'pages', 'duration_display', 'status_badge', 'created_at']
     list_filter = ['direction', 'status', 'created_at']
     search_fields = ['uuid', 'sender_number', 'recipient_number']
     readonly_fields = ['uuid', 'created_at', 'updated_at']
     date_hierarchy = 'created_at'
+    # Skip the unfiltered COUNT(*) over the whole table on every page load
+    show_full_result_count = False
+    
+    def get_search_results(self, request, queryset, search_term):
+        """UUIDs match exactly; anything else goes through the full-text index instead of LIKE scans"""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        try:
+            return queryset.filter(uuid=uuid.UUID(search_term)), False
+        except ValueError:
+            pass
+        # Every match, in the changelist's ordering (the ranked order is the search API's)
+        return queryset.filter(search_entry__in=FaxSearch(search_term, source='transaction').matching_ids()), False
     
     def direction_icon(self, obj):
         if obj.direction == 'inbound':
@@ -496,13 +650,32 @@ class FaxTransactionAdmin(admin.ModelAdmin):
     actions = ['retry_failed_faxes', 'export_to_csv']
     
     def retry_failed_faxes(self, request, queryset):
-        failed = queryset.filter(status='failed')
-        for fax in failed:
-            # Queue for retry
-            fax.status = 'pending'
-            fax.save()
-        self.message_user(request, f"🔄 {failed.count()} faxes queued for retry")
+        self.run_bulk_action(request, queryset, 'retry_failed_faxes', "🔄 {count} faxes queued for retry")
     retry_failed_faxes.short_description = "🔄 Retry failed faxes"
 
 
+
+@admin.register(AdminBulkJob)
+class AdminBulkJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'action', 'user', 'status', 'progress_bar', 'affected_items', 'created_at', 'completed_at']
+    list_filter = ['status', 'action']
+    exclude = ['object_ids']
+    readonly_fields = ['action', 'status', 'total_items', 'processed_items', 'affected_items',
+                       'error_message', 'user', 'started_at', 'completed_at']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def progress_bar(self, obj):
+        return format_html(
+            '<progress value="{}" max="100"></progress> {}/{}',
+            obj.progress(), obj.processed_items, obj.total_items
+        )
+    progress_bar.short_description = 'Progress'
+    
+    def get_queryset(self, request):
+        # object_ids can hold tens of thousands of keys; the list does not need them
+        return super().get_queryset(request).select_related('user').defer('object_ids')
+
+
 # Models are already registered with @admin.register decorator
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""
+Admin Counts
+Per-tenant user and DID counts for the tenant changelist, cached between changes
+"""
+
+from django.core.cache import cache
+from django.db.models import Count
+from .models_complete import DID, UserProfile
+
+ADMIN_COUNTS_VERSION_KEY = 'fax:admin_counts:version'
+ADMIN_COUNTS_KEY = 'fax:admin_counts:{version}'
+# Safety net for writes that bypass signals (QuerySet.update, raw SQL)
+ADMIN_COUNTS_TIMEOUT = 300
+
+
+def get_counts_version():
+    version = cache.get(ADMIN_COUNTS_VERSION_KEY)
+    if version is None:
+        cache.add(ADMIN_COUNTS_VERSION_KEY, 1, timeout=None)
+        version = cache.get(ADMIN_COUNTS_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_admin_counts():
+    """Drop the cached counts everywhere; called when a UserProfile or DID changes"""
+    try:
+        cache.incr(ADMIN_COUNTS_VERSION_KEY)
+    except ValueError:
+        cache.set(ADMIN_COUNTS_VERSION_KEY, 1, timeout=None)
+
+
+def _grouped(queryset):
+    return dict(queryset.order_by().values_list('tenant_id').annotate(n=Count('pk')))
+
+
+def tenant_counts():
+    """
+    {tenant_id: (users, dids)} for every tenant with users or DIDs
+
+    Two GROUP BY queries per cache version, however many tenants or
+    changelist pages are viewed in between.
+    """
+    key = ADMIN_COUNTS_KEY.format(version=get_counts_version())
+    counts = cache.get(key)
+    if counts is None:
+        users = _grouped(UserProfile.objects.all())
+        dids = _grouped(DID.objects.all())
+        counts = {
+            tenant_id: (users.get(tenant_id, 0), dids.get(tenant_id, 0))
+            for tenant_id in set(users) | set(dids)
+        }
+        cache.set(key, counts, ADMIN_COUNTS_TIMEOUT)
+    return counts
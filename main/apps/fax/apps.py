@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class FaxConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'main.apps.fax'
-    verbose_name = 'Fax Service'
\ No newline at end of file
+    verbose_name = 'Fax Service'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,342 @@
+"""
+Batch (mail-merge) Fax Jobs
+Manifest ingestion and chunked dispatch of FaxBatchJob items
+"""
+
+import csv
+import io
+import os
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
+from django.db import connection, transaction as db_transaction
+from django.utils import timezone
+from .models import FaxTransaction, FaxQueue, FaxBatchJob, FaxBatchItem
+from .models_extended import FaxAccount, FaxContact
+from .fax_handler import FaxHandler
+from .search import index_transactions
+from .coverpage import CoverRenderer, default_cover_page, cover_fields
+
+BATCH_MAX_ITEMS = getattr(settings, 'FAX_BATCH_MAX_ITEMS', 50000)
+INSERT_CHUNK_SIZE = 1000
+# Processing jobs without progress for this long are assumed to belong to a dead dispatcher
+BATCH_STALE_AFTER = timedelta(minutes=getattr(settings, 'FAX_BATCH_STALE_MINUTES', 15))
+
+# Manifest columns; anything else in a CSV row becomes a cover page variable
+FILENAME_FIELD = 'filename'
+NUMBER_FIELD = 'number'
+
+
+class ManifestError(ValueError):
+    pass
+
+
+# Used for JSON items (BatchFaxItemSerializer) and CSV rows alike
+validate_recipient_number = RegexValidator(
+    r'^\+?\d{3,19}$', 'Enter a fax number of 3 to 19 digits, optionally starting with +'
+)
+
+
+def iter_csv_manifest(uploaded_file):
+    """Yield manifest rows from an uploaded CSV without reading it all into memory"""
+    text = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(text)
+    if not reader.fieldnames or FILENAME_FIELD not in reader.fieldnames or NUMBER_FIELD not in reader.fieldnames:
+        raise ManifestError(f"CSV manifest needs '{FILENAME_FIELD}' and '{NUMBER_FIELD}' columns")
+
+    for row in reader:
+        yield {
+            FILENAME_FIELD: (row.pop(FILENAME_FIELD) or '').strip(),
+            NUMBER_FIELD: (row.pop(NUMBER_FIELD) or '').strip(),
+            'variables': {k: v for k, v in row.items() if k},
+        }
+
+
+def create_batch_job(user, sender_number, rows, is_enhanced=False):
+    """
+    Stream manifest rows into a new FaxBatchJob
+
+    Rows are inserted with bulk_create in chunks, so a 10k row manifest
+    is ten INSERTs. Rows missing a filename or number, or with a number
+    validate_recipient_number rejects, are stored as failed so they
+    still show up in the job's counters.
+    """
+    with db_transaction.atomic():
+        job = FaxBatchJob.objects.create(
+            user=user,
+            sender_number=sender_number,
+            is_enhanced=is_enhanced
+        )
+
+        chunk = []
+        total = 0
+        for row in rows:
+            total += 1
+            if total > BATCH_MAX_ITEMS:
+                raise ManifestError(f"Manifest exceeds {BATCH_MAX_ITEMS} rows")
+
+            filename = row.get(FILENAME_FIELD) or ''
+            number = row.get(NUMBER_FIELD) or ''
+            item = FaxBatchItem(
+                job=job,
+                row_number=total,
+                filename=filename,
+                recipient_number=number[:20],
+                variables=row.get('variables') or {}
+            )
+            if not filename or not number:
+                item.status = 'failed'
+                item.error_message = 'Missing filename or number'
+            else:
+                try:
+                    validate_recipient_number(number)
+                except ValidationError as e:
+                    item.status = 'failed'
+                    item.error_message = f"Invalid number {number[:40]!r}: {e.messages[0]}"
+            chunk.append(item)
+
+            if len(chunk) >= INSERT_CHUNK_SIZE:
+                FaxBatchItem.objects.bulk_create(chunk)
+                chunk = []
+
+        if chunk:
+            FaxBatchItem.objects.bulk_create(chunk)
+
+        if not total:
+            raise ManifestError('Manifest is empty')
+
+        job.total_items = total
+        job.save(update_fields=['total_items'])
+
+    return job
+
+
+def _load_ids(model, objs, field):
+    """Fill in the ids bulk_create couldn't return (MySQL) by looking the rows up on a unique field"""
+    ids = dict(model.objects.filter(
+        **{f'{field}__in': [getattr(obj, field) for obj in objs]}
+    ).values_list(field, 'id'))
+    for obj in objs:
+        obj.pk = ids[getattr(obj, field)]
+        obj._state.adding = False
+
+
+class BatchDispatcher:
+    """
+    Send the pending items of a job, opening the transports once per job
+
+    Each distinct document is converted once and reused for every row
+    that references it. With a default cover page, each row gets its own
+    cover (filled from the row's variables) in front of that document.
+    Items are processed in chunks: the chunk's transactions and queue
+    items are inserted (two bulk INSERTs) and its batch items marked
+    'dispatching' before anything is sent, so transport events always
+    find their queue row. Each send is then recorded right away. A job
+    interrupted by an error goes back to 'pending' and resumes with the
+    items it had not sent yet.
+    """
+
+    def __init__(self, job, chunk_size=200, handler=None):
+        self.job = job
+        self.chunk_size = chunk_size
+        self.handler = handler or FaxHandler()
+        self._converted = {}
+        self.cover = None
+        self.account = None
+
+    @classmethod
+    def requeue_stale(cls):
+        """Hand jobs of dead dispatchers (no progress for BATCH_STALE_AFTER) back to claim()"""
+        return FaxBatchJob.objects.filter(
+            status='processing', updated_at__lt=timezone.now() - BATCH_STALE_AFTER
+        ).update(status='pending')
+
+    @classmethod
+    def claim(cls, job_uuid=None):
+        """Atomically take the oldest pending job (or the given one); None if nothing to do"""
+        cls.requeue_stale()
+        jobs = FaxBatchJob.objects.filter(status='pending').order_by('created_at')
+        if job_uuid:
+            jobs = jobs.filter(uuid=job_uuid)
+
+        for job in jobs[:5]:
+            if FaxBatchJob.objects.filter(pk=job.pk, status='pending').update(
+                status='processing', started_at=timezone.now(), updated_at=timezone.now()
+            ):
+                job.refresh_from_db()
+                return job
+        return None
+
+    def recover(self):
+        """
+        Settle items a previous run left 'dispatching'
+
+        Items whose queue row got a job id were sent. The others may or
+        may not have gone out, so they are failed rather than sent twice.
+        """
+        dispatching = self.job.items.filter(status='dispatching')
+        sent = dispatching.filter(transaction__queue_items__job_uuid__isnull=False)
+        FaxTransaction.objects.filter(batch_items__in=sent).update(status='sent')
+        sent.update(status='sent')
+
+        error = 'Dispatch interrupted; not resent to avoid a duplicate fax'
+        FaxTransaction.objects.filter(batch_items__in=dispatching).update(status='failed', error_message=error)
+        dispatching.update(status='failed', error_message=error)
+
+    def run(self):
+        """Dispatch all pending items; returns the job's progress counters"""
+        self.recover()
+        cover = default_cover_page(self.job.user)
+        self.cover = CoverRenderer(cover) if cover else None
+        self.account = FaxAccount.objects.filter(user_id=self.job.user_id).first()
+
+        if not self.handler.connect():
+            self._finish('failed', 'No fax transport available')
+            return self.job.progress()
+
+        try:
+            while True:
+                if FaxBatchJob.objects.filter(pk=self.job.pk, status='cancelled').exists():
+                    self.job.items.filter(status='pending').update(status='cancelled')
+                    return self.job.progress()
+
+                items = list(self.job.items.filter(status='pending').order_by('row_number')[:self.chunk_size])
+                if not items:
+                    break
+                self._dispatch_chunk(items)
+                FaxBatchJob.objects.filter(pk=self.job.pk).update(updated_at=timezone.now())
+
+            self._finish('completed')
+        except Exception as e:
+            # Sent items are recorded; the job is claimable again for the rest
+            self._release(str(e))
+        finally:
+            self.handler.disconnect()
+
+        return self.job.progress()
+
+    def _prepare(self, filename):
+        if filename not in self._converted:
+            try:
+                self._converted[filename] = (self.handler.prepare_file(filename, self.job.is_enhanced), None)
+            except ValueError as e:
+                self._converted[filename] = (None, str(e))
+        return self._converted[filename]
+
+    def _dispatch_chunk(self, items):
+        now = timezone.now()
+        ready = []
+
+        for item in items:
+            item.dispatched_at = now
+            converted_path, error = self._prepare(item.filename)
+            if error:
+                item.status = 'failed'
+                item.error_message = error
+                continue
+
+            fax = FaxTransaction(
+                direction='outbound',
+                status='processing',
+                sender_number=self.job.sender_number,
+                recipient_number=item.recipient_number,
+                file_path=converted_path,
+                original_filename=os.path.basename(item.filename),
+                converted_filename=os.path.basename(converted_path),
+                user=self.job.user
+            )
+            item.status = 'dispatching'
+            item.transaction = fax
+            ready.append((item, fax, FaxQueue(recipient_number=item.recipient_number), converted_path))
+
+        with db_transaction.atomic():
+            FaxTransaction.objects.bulk_create([fax for _, fax, _, _ in ready])
+            if not connection.features.can_return_rows_from_bulk_insert:
+                _load_ids(FaxTransaction, [fax for _, fax, _, _ in ready], 'uuid')
+            for _, fax, queue_item, _ in ready:
+                queue_item.transaction = fax
+            FaxQueue.objects.bulk_create([queue_item for _, _, queue_item, _ in ready])
+            if not connection.features.can_return_rows_from_bulk_insert:
+                _load_ids(FaxQueue, [queue_item for _, _, queue_item, _ in ready], 'transaction_id')
+            FaxBatchItem.objects.bulk_update(
+                items, ['status', 'error_message', 'transaction', 'dispatched_at']
+            )
+
+        try:
+            # After the commit, so an index error can't undo the rows
+            index_transactions([fax for _, fax, _, _ in ready])
+        except Exception as e:
+            print(f"[WARNING] Search indexing failed for batch {self.job.uuid}: {e}")
+
+        try:
+            for index, (item, fax, queue_item, converted_path) in enumerate(ready):
+                try:
+                    self._dispatch_item(item, fax, queue_item, converted_path)
+                except Exception:
+                    self._unclaim(ready[index + 1:])
+                    raise
+        finally:
+            self._record_usage([item.recipient_number for item, _, _, _ in ready if item.status == 'sent'])
+
+    def _record_usage(self, numbers):
+        """Contact usage for a chunk in one statement; existing contacts only, a send isn't a delivery"""
+        if not numbers or self.account is None:
+            return
+        try:
+            FaxContact.objects.record_usage(self.account, numbers, create_missing=False)
+        except Exception as e:
+            print(f"[WARNING] Contact usage not recorded for batch {self.job.uuid}: {e}")
+
+    def _unclaim(self, rows):
+        """Put rows that were never sent back to 'pending' (best effort; recover() covers the rest)"""
+        try:
+            with db_transaction.atomic():
+                FaxBatchItem.objects.filter(pk__in=[item.pk for item, _, _, _ in rows]).update(
+                    status='pending', transaction=None, dispatched_at=None
+                )
+                FaxTransaction.objects.filter(pk__in=[fax.pk for _, fax, _, _ in rows]).delete()
+        except Exception as e:
+            print(f"[WARNING] Could not reset unsent items of batch {self.job.uuid}: {e}")
+
+    def _dispatch_item(self, item, fax, queue_item, converted_path):
+        """Send one row and record the outcome at once (three single-row UPDATEs)"""
+        try:
+            send_path = converted_path
+            if self.cover:
+                fields = cover_fields(
+                    self.job.user, self.job.sender_number, item.recipient_number, item.variables, item.dispatched_at
+                )
+                send_path = self.handler.add_cover(self.cover, converted_path, fields, self.job.is_enhanced)
+            dispatch = self.handler.dispatch(self.job.sender_number, item.recipient_number, send_path)
+        except Exception as e:
+            fax.status = item.status = 'failed'
+            fax.error_message = item.error_message = str(e)
+            dispatch = None
+        else:
+            fax.status = item.status = 'sent'
+
+        with db_transaction.atomic():
+            if dispatch:
+                FaxQueue.objects.filter(pk=queue_item.pk).update(
+                    job_uuid=dispatch.job_id,
+                    event_name=dispatch.event_name,
+                    transport=dispatch.transport,
+                    attempts=1,
+                    updated_at=timezone.now()
+                )
+            FaxTransaction.objects.filter(pk=fax.pk).update(
+                status=fax.status, error_message=fax.error_message, updated_at=timezone.now()
+            )
+            FaxBatchItem.objects.filter(pk=item.pk).update(status=item.status, error_message=item.error_message)
+
+    def _release(self, error):
+        self.job.status = 'pending'
+        self.job.error_message = error
+        self.job.save(update_fields=['status', 'error_message', 'updated_at'])
+
+    def _finish(self, status, error=None):
+        self.job.status = status
+        self.job.error_message = error
+        self.job.completed_at = timezone.now()
+        self.job.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
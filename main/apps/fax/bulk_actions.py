@@ -0,0 +1,101 @@
+"""
+Bulk Admin Actions
+Set-based admin actions, run inline or as an AdminBulkJob for large selections
+"""
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+from .models import FaxTransaction, AdminBulkJob
+from .models_complete import Tenant, DID
+from .inbound_routes import invalidate_inbound_routes
+
+# Selections above this many rows are handed to run_admin_bulk_jobs
+BULK_ACTION_THRESHOLD = getattr(settings, 'FAX_ADMIN_BULK_THRESHOLD', 5000)
+JOB_CHUNK_SIZE = 2000
+
+
+def _update(**values):
+    """Single UPDATE; update() skips auto_now so stamp updated_at explicitly"""
+    def apply(queryset):
+        return queryset.update(updated_at=timezone.now(), **values)
+    return apply
+
+
+def _rerouting(apply):
+    """update() sends no signals, so refresh the inbound routing map explicitly"""
+    def wrapped(queryset):
+        changed = apply(queryset)
+        if changed:
+            db_transaction.on_commit(invalidate_inbound_routes)
+        return changed
+    return wrapped
+
+
+def _retry_failed(queryset):
+    return queryset.filter(status='failed').update(status='pending', updated_at=timezone.now())
+
+
+# action name -> (model, function(queryset) returning rows changed)
+BULK_ACTIONS = {
+    'retry_failed_faxes': (FaxTransaction, _retry_failed),
+    'activate_tenants': (Tenant, _rerouting(_update(is_active=True))),
+    'deactivate_tenants': (Tenant, _rerouting(_update(is_active=False))),
+    'enable_fax': (DID, _rerouting(_update(is_fax_enabled=True))),
+    'disable_fax': (DID, _rerouting(_update(is_fax_enabled=False))),
+}
+
+
+def run_bulk_action(action, queryset, user=None):
+    """
+    Apply a registered action to an admin selection
+
+    Returns (rows_changed, None) when applied directly, or (None, job) when
+    the selection was larger than BULK_ACTION_THRESHOLD and was queued.
+    """
+    model, apply = BULK_ACTIONS[action]
+    ids = list(queryset.values_list('pk', flat=True)[:BULK_ACTION_THRESHOLD + 1])
+    if len(ids) <= BULK_ACTION_THRESHOLD:
+        return apply(model.objects.filter(pk__in=ids)), None
+
+    ids = list(queryset.values_list('pk', flat=True))
+    job = AdminBulkJob.objects.create(
+        action=action,
+        object_ids=ids,
+        total_items=len(ids),
+        user=user
+    )
+    return None, job
+
+
+def claim_job():
+    """Atomically take the oldest pending job; None if there is nothing to do"""
+    for job in AdminBulkJob.objects.filter(status='pending').order_by('created_at')[:5]:
+        if AdminBulkJob.objects.filter(pk=job.pk, status='pending').update(
+            status='processing', started_at=timezone.now()
+        ):
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def run_job(job, chunk_size=JOB_CHUNK_SIZE):
+    """Apply the job's action one UPDATE per chunk, saving progress after each"""
+    try:
+        model, apply = BULK_ACTIONS[job.action]
+        ids = job.object_ids
+        for start in range(job.processed_items, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            with db_transaction.atomic():
+                job.affected_items += apply(model.objects.filter(pk__in=chunk))
+                job.processed_items = start + len(chunk)
+                job.save(update_fields=['processed_items', 'affected_items', 'updated_at'])
+        job.status = 'completed'
+    except Exception as e:
+        # Chunks already applied stay applied; processed_items shows how far it got
+        job.status = 'failed'
+        job.error_message = str(e)
+
+    job.completed_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'completed_at', 'updated_at'])
+    return job
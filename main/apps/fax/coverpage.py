@@ -0,0 +1,519 @@
+"""
+Fax Cover Pages
+Render CoverPage templates into bilevel fax pages and put them in front of TX documents without re-encoding them
+"""
+
+import io
+import os
+import glob
+import json
+import struct
+import uuid as uuid_lib
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+from PIL.PngImagePlugin import PngInfo
+from main.apps.core.vars import TXFAX_DIR
+from .models_complete import OutboundFaxSettings
+
+# Cover+document files of single sends; the transports read them, so they live with the TX files
+COVER_DIR = getattr(settings, 'FAX_COVER_DIR', os.path.join(TXFAX_DIR, 'covers'))
+COVER_LAYER_DIR = os.path.join(COVER_DIR, 'layers')
+COVER_RETENTION_DAYS = getattr(settings, 'FAX_COVER_RETENTION_DAYS', 7)
+# Static layers kept decoded in memory, per process
+COVER_LAYER_CACHE_SIZE = getattr(settings, 'FAX_COVER_LAYER_CACHE_SIZE', 32)
+
+# Letter size: 1728 dots per line, 11 inch pages (same as FileConverter)
+PAGE_WIDTH = 1728
+RESOLUTIONS = {'standard': (204, 98), 'fine': (204, 196)}
+# Layouts are drawn at fine resolution and scaled down vertically for standard pages
+GRID_HEIGHT = 2156
+MARGIN = 110
+
+STYLES = {
+    'professional': {'align': 'left', 'size': 96, 'inverse': False, 'rule': 8, 'double': False, 'row_lines': True},
+    'simple': {'align': 'left', 'size': 80, 'inverse': False, 'rule': 3, 'double': False, 'row_lines': False},
+    'modern': {'align': 'left', 'size': 88, 'inverse': True, 'rule': 0, 'double': False, 'row_lines': False},
+    'classic': {'align': 'center', 'size': 96, 'inverse': False, 'rule': 4, 'double': True, 'row_lines': True},
+}
+FIELD_ROWS = (
+    ('date', 'Date', 'show_date'),
+    ('time', 'Time', 'show_time'),
+    ('to', 'To', 'show_to'),
+    ('from', 'From', 'show_from'),
+    ('pages', 'Pages', 'show_pages'),
+    ('subject', 'Subject', 'show_subject'),
+)
+TEXT_SIZE = 44
+ROW_HEIGHT = 92
+LABEL_WIDTH = 360
+FOOTER_SIZE = 32
+LOGO_MAX_SIZE = (600, 220)
+GENERIC_FONTS = {'sans-serif': 'DejaVuSans', 'serif': 'DejaVuSerif', 'monospace': 'DejaVuSansMono'}
+
+_THRESHOLD = [0] * 128 + [255] * 128
+
+# TIFF field types: struct format of one value and its size
+TIFF_TYPES = {
+    1: (None, 1), 2: (None, 1), 3: ('H', 2), 4: ('L', 4), 5: ('LL', 8), 6: (None, 1),
+    7: (None, 1), 8: ('h', 2), 9: ('l', 4), 10: ('ll', 8), 11: ('f', 4), 12: ('d', 8),
+}
+STRIP_TAGS = ((273, 279), (324, 325))  # StripOffsets/StripByteCounts, TileOffsets/TileByteCounts
+# Tags pointing at other parts of the file that a page copy can't carry along
+DROPPED_TAGS = {288, 289, 330, 513, 514, 34665, 34853, 40965}
+COMPRESSION, PAGE_NUMBER, Y_RESOLUTION, RESOLUTION_UNIT = 259, 297, 283, 296
+PIL_COMPRESSION = {3: 'group3', 4: 'group4'}
+
+# (layer key -> CoverLayer), per process
+_layers = OrderedDict()
+
+
+class CoverPageError(ValueError):
+    pass
+
+
+def default_cover_page(user):
+    """The active default CoverPage of a user's outbound settings, or None"""
+    if user is None:
+        return None
+    outbound = (
+        OutboundFaxSettings.objects.filter(user=user, is_active=True)
+        .select_related('default_cover_page__tenant').first()
+    )
+    cover = outbound and outbound.default_cover_page
+    return cover if cover and cover.is_active else None
+
+
+def cover_fields(user, sender, recipient, variables=None, when=None):
+    """
+    Variable field values of one send
+
+    `variables` are the cover page variables of an API request or batch
+    row: to_name, to_company, from_name, subject, message and custom_1..3.
+    Page counts are filled in by CoverRenderer.render.
+    """
+    variables = variables or {}
+    when = timezone.localtime(when or timezone.now())
+    to_name = ', '.join(v for v in (variables.get('to_name'), variables.get('to_company')) if v)
+    from_name = variables.get('from_name') or (user.get_full_name() or user.username if user else '')
+    fields = {
+        'date': when.strftime('%Y-%m-%d'),
+        'time': when.strftime('%H:%M'),
+        'to': f"{to_name} ({recipient})" if to_name else recipient,
+        'from': f"{from_name} ({sender})" if from_name else sender,
+        'subject': variables.get('subject', ''),
+        'message': variables.get('message', ''),
+    }
+    for n in (1, 2, 3):
+        fields[f'custom_{n}'] = variables.get(f'custom_{n}', '')
+    return fields
+
+
+@lru_cache(maxsize=64)
+def get_font(family, size, bold=False):
+    """First loadable font of a CSS font-family list; DejaVu, then Pillow's own font as fallbacks"""
+    names = [name.strip().strip('"\'') for name in family.split(',') if name.strip()]
+    for name in names + ['sans-serif']:
+        name = GENERIC_FONTS.get(name.lower(), name)
+        for candidate in ([f"{name}-Bold", f"{name} Bold"] if bold else []) + [name]:
+            try:
+                return ImageFont.truetype(f"{candidate}.ttf", size)
+            except OSError:
+                continue
+    try:
+        return ImageFont.load_default(size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def _bilevel(image):
+    return image.point(_THRESHOLD).convert('1', dither=Image.Dither.NONE)
+
+
+def _fit(text, font, width):
+    """`text` on one line, cut short with '...' to fit `width`"""
+    text = ' '.join(str(text).split())
+    if font.getlength(text) <= width:
+        return text
+    while text and font.getlength(text + '...') > width:
+        text = text[:-1]
+    return text + '...' if text else ''
+
+
+def _wrap(text, font, width):
+    lines = []
+    for paragraph in str(text).splitlines() or ['']:
+        line = ''
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if line and font.getlength(candidate) > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(_fit(line, font, width))
+    return lines
+
+
+def _load_logo(tenant):
+    if not tenant.logo:
+        return None
+    try:
+        with Image.open(tenant.logo.path) as source:
+            rgba = source.convert('RGBA')
+    except (OSError, ValueError, NotImplementedError):
+        return None
+    logo = Image.new('RGBA', rgba.size, 'white')
+    logo.alpha_composite(rgba)
+    logo = logo.convert('L')
+    logo.thumbnail(LOGO_MAX_SIZE)
+    return logo
+
+
+def _y_scale(resolution):
+    return RESOLUTIONS[resolution][1] / RESOLUTIONS['fine'][1]
+
+
+class CoverLayer:
+    """
+    The static part of a cover page at one resolution
+
+    `slots` maps each variable field to its (x, y, width, height) box on
+    the fine-resolution layout grid.
+    """
+
+    def __init__(self, image, slots, family, resolution):
+        self.image = image
+        self.slots = slots
+        self.family = family
+        self.resolution = resolution
+
+    @classmethod
+    def load(cls, path):
+        with Image.open(path) as source:
+            source.load()
+            meta = json.loads(source.text['cover'])
+            return cls(source.copy(), meta['slots'], meta['family'], meta['resolution'])
+
+    def save(self, path):
+        info = PngInfo()
+        info.add_text('cover', json.dumps({'slots': self.slots, 'family': self.family, 'resolution': self.resolution}))
+        tmp_path = f"{path}.{uuid_lib.uuid4().hex}.tmp"
+        self.image.save(tmp_path, format='PNG', pnginfo=info)
+        os.replace(tmp_path, path)
+
+    def _stamp(self, page, text, font, x, y, width):
+        text = _fit(text, font, width)
+        if not text:
+            return
+        # Drawn on the layout grid, then scaled like the rest of the page
+        # The bitmap fallback font of older Pillow has no size
+        strip = Image.new('L', (int(font.getlength(text)) + 2, int(getattr(font, 'size', TEXT_SIZE) * 1.3)), 255)
+        ImageDraw.Draw(strip).text((0, 0), text, font=font, fill=0)
+        scale = _y_scale(self.resolution)
+        if scale != 1:
+            strip = strip.resize((strip.width, max(round(strip.height * scale), 1)), Image.Resampling.BOX)
+        page.paste(_bilevel(strip), (x, round(y * scale)))
+
+    def compose(self, fields):
+        """A copy of the layer with the variable fields filled in"""
+        page = self.image.copy()
+        font = get_font(self.family, TEXT_SIZE)
+        for name, (x, y, width, height) in self.slots.items():
+            value = fields.get(name)
+            if not value:
+                continue
+            if name == 'message':
+                line_height = int(TEXT_SIZE * 1.4)
+                for i, line in enumerate(_wrap(value, font, width)[:max(height // line_height, 1)]):
+                    self._stamp(page, line, font, x, y + i * line_height, width)
+            else:
+                self._stamp(page, value, font, x, y, width)
+        return page
+
+
+def render_layer(cover, resolution):
+    """
+    Draw the static part of a cover page: logo, header, field labels, footer
+
+    Colours are dropped (fax pages are black and white) and 'custom' HTML
+    templates are laid out like 'professional' ones.
+    """
+    style = STYLES.get(cover.template_type, STYLES['professional'])
+    family = cover.font_family or 'sans-serif'
+    canvas = Image.new('L', (PAGE_WIDTH, GRID_HEIGHT), 255)
+    draw = ImageDraw.Draw(canvas)
+    right = PAGE_WIDTH - MARGIN
+    y = MARGIN
+
+    logo = _load_logo(cover.tenant) if cover.show_logo else None
+    logo_at = None
+    if logo:
+        x = {'center': (PAGE_WIDTH - logo.width) // 2, 'right': right - logo.width}.get(cover.logo_position, MARGIN)
+        logo_at = (x, y)
+        y += logo.height + 40
+
+    header_font = get_font(family, style['size'], bold=True)
+    header_height = int(style['size'] * 1.3) + 60
+    ink = 0
+    if style['inverse']:
+        draw.rectangle((0, y, PAGE_WIDTH, y + header_height), fill=0)
+        ink = 255
+    header = _fit(cover.header_text, header_font, right - MARGIN)
+    x = (PAGE_WIDTH - int(header_font.getlength(header))) // 2 if style['align'] == 'center' else MARGIN
+    draw.text((x, y + 30), header, font=header_font, fill=ink)
+    y += header_height + 20
+    if style['rule']:
+        draw.rectangle((MARGIN, y, right, y + style['rule'] - 1), fill=0)
+        if style['double']:
+            y += style['rule'] + 10
+            draw.rectangle((MARGIN, y, right, y + style['rule'] - 1), fill=0)
+    y += 70
+
+    label_font = get_font(family, TEXT_SIZE, bold=True)
+    rows = [(name, label) for name, label, flag in FIELD_ROWS if getattr(cover, flag)]
+    custom_labels = (cover.custom_field_1_label, cover.custom_field_2_label, cover.custom_field_3_label)
+    rows += [(f'custom_{n}', label) for n, label in enumerate(custom_labels, 1) if label]
+    slots = {}
+    for name, label in rows:
+        draw.text((MARGIN, y), _fit(f"{label}:", label_font, LABEL_WIDTH - 20), font=label_font, fill=0)
+        slots[name] = [MARGIN + LABEL_WIDTH, y, right - MARGIN - LABEL_WIDTH, ROW_HEIGHT]
+        if style['row_lines']:
+            draw.line((MARGIN, y + ROW_HEIGHT - 20, right, y + ROW_HEIGHT - 20), fill=0, width=2)
+        y += ROW_HEIGHT
+
+    footer_font = get_font(family, FOOTER_SIZE)
+    footer_line = int(FOOTER_SIZE * 1.4)
+    footer = _wrap(cover.footer_text, footer_font, right - MARGIN) if cover.footer_text.strip() else []
+    footer_top = GRID_HEIGHT - MARGIN - len(footer) * footer_line
+    if cover.show_message and footer_top - 40 - (y + 40 + ROW_HEIGHT) >= ROW_HEIGHT:
+        y += 40
+        draw.text((MARGIN, y), "Message:", font=label_font, fill=0)
+        y += ROW_HEIGHT
+        slots['message'] = [MARGIN, y, right - MARGIN, footer_top - 40 - y]
+    if footer:
+        draw.line((MARGIN, footer_top - 24, right, footer_top - 24), fill=0, width=2)
+        for i, line in enumerate(footer):
+            draw.text((MARGIN, footer_top + i * footer_line), line, font=footer_font, fill=0)
+
+    scale = _y_scale(resolution)
+    if scale != 1:
+        canvas = canvas.resize((PAGE_WIDTH, round(GRID_HEIGHT * scale)), Image.Resampling.BOX)
+    image = _bilevel(canvas)
+    if logo:
+        # Dithered rather than thresholded so photos and shading survive
+        logo = logo.resize((logo.width, max(round(logo.height * scale), 1)), Image.Resampling.LANCZOS)
+        image.paste(logo.convert('1'), (logo_at[0], round(logo_at[1] * scale)))
+    return CoverLayer(image, slots, family, resolution)
+
+
+def layer_key(cover, resolution):
+    updated_at = cover.updated_at
+    if cover.show_logo:
+        # The logo belongs to the tenant
+        updated_at = max(updated_at, cover.tenant.updated_at)
+    return f"{cover.pk}-{updated_at.strftime('%Y%m%d%H%M%S%f')}-{resolution}"
+
+
+def get_layer(cover, resolution):
+    """
+    The static layer of a cover page, rendered at most once per version
+
+    Looked up in memory, then on disk under COVER_LAYER_DIR; a new
+    version replaces the files of older ones.
+    """
+    key = layer_key(cover, resolution)
+    layer = _layers.get(key)
+    if layer is not None:
+        _layers.move_to_end(key)
+        return layer
+
+    path = os.path.join(COVER_LAYER_DIR, f"{key}.png")
+    try:
+        layer = CoverLayer.load(path)
+    except (OSError, KeyError, ValueError):
+        layer = render_layer(cover, resolution)
+        try:
+            os.makedirs(COVER_LAYER_DIR, exist_ok=True)
+            layer.save(path)
+        except OSError as e:
+            # The disk copy is only a cache; keep the layer in memory
+            print(f"[WARNING] Can't cache cover layer {path}: {e}")
+        for old in glob.glob(os.path.join(COVER_LAYER_DIR, f"{cover.pk}-*-{resolution}.png")):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+    _layers[key] = layer
+    while len(_layers) > COVER_LAYER_CACHE_SIZE:
+        _layers.popitem(last=False)
+    return layer
+
+
+def read_tiff(data):
+    """
+    Pages of a TIFF as (tags, strips)
+
+    `tags` maps tag -> (type, values), with BYTE/ASCII/UNDEFINED values
+    as raw bytes. `strips` are the page's compressed strips (or tiles),
+    as memoryviews into `data`.
+    """
+    order = {b'II': '<', b'MM': '>'}.get(bytes(data[:2]))
+    if order is None or struct.unpack_from(f'{order}H', data, 2)[0] != 42:
+        raise CoverPageError('Not a TIFF file')
+
+    view = memoryview(data)
+    pages = []
+    seen = set()
+    (offset,) = struct.unpack_from(f'{order}L', data, 4)
+    while offset and offset not in seen:
+        seen.add(offset)
+        (count,) = struct.unpack_from(f'{order}H', data, offset)
+        tags = {}
+        for i in range(count):
+            tag, kind, n, value = struct.unpack_from(f'{order}HHL4s', data, offset + 2 + 12 * i)
+            if kind not in TIFF_TYPES or tag in DROPPED_TAGS:
+                continue
+            fmt, size = TIFF_TYPES[kind]
+            if size * n > 4:
+                (start,) = struct.unpack(f'{order}L', value)
+                raw = bytes(view[start:start + size * n])
+            else:
+                raw = value[:size * n]
+            tags[tag] = (kind, raw if fmt is None else struct.unpack(f'{order}{fmt * n}', raw))
+
+        for offsets_tag, counts_tag in STRIP_TAGS:
+            if offsets_tag in tags and counts_tag in tags:
+                strips = [view[o:o + c] for o, c in zip(tags[offsets_tag][1], tags[counts_tag][1])]
+                break
+        else:
+            raise CoverPageError(f'TIFF page {len(pages) + 1} has no image strips')
+        pages.append((tags, strips))
+        (offset,) = struct.unpack_from(f'{order}L', data, offset + 2 + 12 * count)
+
+    if not pages:
+        raise CoverPageError('TIFF file has no pages')
+    return pages
+
+
+def write_tiff(pages):
+    """
+    A little-endian TIFF of (tags, strips) pages, strips copied byte for byte
+
+    Strip offsets/counts are rewritten and PageNumber is set; every other
+    tag is kept as it was.
+    """
+    out = bytearray(b'II*\x00\x00\x00\x00\x00')
+    next_ifd_at = 4
+    total = len(pages)
+    for index, (tags, strips) in enumerate(pages):
+        tags = dict(tags)
+        offsets = []
+        for strip in strips:
+            offsets.append(len(out))
+            out += strip
+            if len(out) % 2:
+                out += b'\x00'
+        offsets_tag, counts_tag = STRIP_TAGS[0] if STRIP_TAGS[0][0] in tags else STRIP_TAGS[1]
+        tags[offsets_tag] = (4, tuple(offsets))
+        tags[counts_tag] = (4, tuple(len(strip) for strip in strips))
+        tags[PAGE_NUMBER] = (3, (index, total))
+
+        entries = []
+        for tag in sorted(tags):
+            kind, values = tags[tag]
+            fmt, size = TIFF_TYPES[kind]
+            raw = values if fmt is None else struct.pack(f"<{fmt * (len(values) // len(fmt))}", *values)
+            if len(raw) <= 4:
+                field = raw.ljust(4, b'\x00')
+            else:
+                field = struct.pack('<L', len(out))
+                out += raw
+                if len(out) % 2:
+                    out += b'\x00'
+            entries.append(struct.pack('<HHL', tag, kind, len(raw) // size) + field)
+
+        struct.pack_into('<L', out, next_ifd_at, len(out))
+        out += struct.pack('<H', len(entries)) + b''.join(entries)
+        next_ifd_at = len(out)
+        out += b'\x00\x00\x00\x00'
+    return bytes(out)
+
+
+def page_resolution(tags, default='standard'):
+    """'fine' or 'standard' from a page's YResolution"""
+    if Y_RESOLUTION not in tags:
+        return default
+    numerator, denominator = tags[Y_RESOLUTION][1][:2]
+    dpi = numerator / (denominator or 1)
+    if tags.get(RESOLUTION_UNIT, (3, (2,)))[1][0] == 3:
+        dpi *= 2.54
+    return 'fine' if dpi > 150 else 'standard'
+
+
+def encode_page(image, resolution, compression=4):
+    """One bilevel page as a parsed TIFF page, compressed like the document it goes with"""
+    buffer = io.BytesIO()
+    image.save(buffer, format='TIFF', compression=PIL_COMPRESSION.get(compression, 'group4'),
+               dpi=RESOLUTIONS[resolution])
+    return read_tiff(buffer.getvalue())[0]
+
+
+class CoverRenderer:
+    """
+    Put a CoverPage in front of TX documents
+
+    The static layer is cached per (cover, updated_at, resolution), so a
+    send only draws its variable fields on a copy and encodes that one
+    page. The document's pages are copied into the output as they are,
+    compressed strips and all, and each document is read once per
+    renderer, so a broadcast costs one small page encode per recipient.
+    """
+
+    def __init__(self, cover, output_dir=COVER_DIR):
+        self.cover = cover
+        self.output_dir = output_dir
+        self._documents = {}
+
+    def _document(self, path):
+        if path not in self._documents:
+            with open(path, 'rb') as f:
+                self._documents[path] = read_tiff(f.read())
+        return self._documents[path]
+
+    def render(self, document_path, fields, fine=False):
+        """
+        Write the cover page plus the document to a new TIFF; returns its path
+
+        The cover matches the resolution of the document's first page
+        (`fine` is used when the document doesn't say). Raises
+        CoverPageError for documents that aren't readable TIFFs and for
+        covers that can't be drawn or written (fonts, logo, disk).
+        """
+        try:
+            pages = self._document(document_path)
+        except (OSError, struct.error) as e:
+            raise CoverPageError(f"Can't read {document_path}: {e}")
+
+        try:
+            first = pages[0][0]
+            resolution = page_resolution(first, 'fine' if fine else 'standard')
+            layer = get_layer(self.cover, resolution)
+            fields = dict(fields, pages=f"{len(pages) + 1} (including this page)")
+            cover = encode_page(layer.compose(fields), resolution, first.get(COMPRESSION, (3, (4,)))[1][0])
+
+            os.makedirs(self.output_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(document_path))[0]
+            output_path = os.path.join(self.output_dir, f"{name}-{uuid_lib.uuid4().hex[:12]}.tiff")
+            with open(output_path, 'wb') as f:
+                f.write(write_tiff([cover] + pages))
+        except CoverPageError:
+            raise
+        except (OSError, ValueError, TypeError, AttributeError, struct.error, Image.DecompressionBombError) as e:
+            raise CoverPageError(f"Can't add cover page to {document_path}: {e}")
+        return output_path
@@ -1,31 +1,35 @@
-import main.utils.esl.ESL_py3 as ESL
-from main.apps.core.vars import FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD, RXFAX_DIR, TXFAX_DIR
+from main.apps.core.vars import RXFAX_DIR, TXFAX_DIR
 import os
 import uuid as uuid_lib
 from .models import FaxTransaction, FaxQueue
+from .transports import TransportRouter
+from .search import index_transactions
+from .coverpage import CoverRenderer, CoverPageError, default_cover_page, cover_fields
 from main.apps.service.views.utils.converter import FileConverter
+from main.apps.service.views.utils.inbox import index_received_fax
 
 
 class FaxHandler:
-    def __init__(self):
-        self.connection = None
+    def __init__(self, router=None):
+        self._router = router
+    
+    @property
+    def router(self):
+        # Built on first use so status lookups never touch the transports
+        if self._router is None:
+            self._router = TransportRouter()
+        return self._router
         
     def connect(self):
-        """Establish connection to FreeSWITCH"""
-        self.connection = ESL.ESLconnection(
-            FREESWITCH_IP_ADDRESS, 
-            FREESWITCH_PORT, 
-            FREESWITCH_PASSWORD
-        )
-        return self.connection.connected()
+        """Open the outbound transports; False if none is reachable"""
+        return self.router.open()
     
     def disconnect(self):
-        """Disconnect from FreeSWITCH"""
-        if self.connection:
-            self.connection.disconnect()
+        """Close the outbound transports"""
+        self.router.close()
     
-    def send_fax(self, username, file_path, numbers, is_enhanced=False, user=None):
-        """Send fax to multiple recipients"""
+    def send_fax(self, username, file_path, numbers, is_enhanced=False, user=None, variables=None):
+        """Send fax to multiple recipients, behind the user's default cover page if one is set"""
         results = {
             'success': False,
             'message': '',
@@ -33,25 +37,12 @@ class FaxHandler:
             'details': []
         }
         
-        # Check if file exists
-        full_path = os.path.join(TXFAX_DIR, file_path) if not file_path.startswith('/') else file_path
-        if not os.path.isfile(full_path):
-            results['message'] = f"File not found: {full_path}"
+        try:
+            converted_path = self.prepare_file(file_path, is_enhanced)
+        except ValueError as e:
+            results['message'] = str(e)
             return results
         
-        # Convert file to TIFF format if needed
-        converted_path = full_path
-        if not full_path.lower().endswith(('.tif', '.tiff')):
-            try:
-                converter = FileConverter(filename=full_path, is_enhanced=is_enhanced, DEBUG=False)
-                converted_path = converter.convert()
-            except Exception as e:
-                results['message'] = f"File conversion failed: {str(e)}"
-                return results
-        else:
-            # File is already TIFF, use as-is
-            print(f"Using TIFF file directly: {full_path}")
-        
         # Create transaction record
         transaction = FaxTransaction.objects.create(
             direction='outbound',
@@ -63,16 +54,20 @@ class FaxHandler:
             converted_filename=os.path.basename(converted_path),
             user=user
         )
+        self._index_search(transaction)
+        
+        cover = default_cover_page(user)
+        renderer = CoverRenderer(cover) if cover else None
         
         # Parse recipient numbers
         numbers_list = [num.strip() for num in numbers.split(',')]
         
-        # Connect to FreeSWITCH
+        # Open the outbound transports
         if not self.connect():
             transaction.status = 'failed'
-            transaction.error_message = "Failed to connect to FreeSWITCH"
+            transaction.error_message = "No fax transport available"
             transaction.save()
-            results['message'] = "Failed to connect to FreeSWITCH"
+            results['message'] = "No fax transport available"
             results['transaction'] = transaction
             return results
         
@@ -85,27 +80,24 @@ class FaxHandler:
                     recipient_number=number
                 )
                 
-                # Generate UUID for this call
-                core_uuid = self.connection.api("create_uuid").getBody()
-                
-                # Build originate command
-                originate_cmd = self._build_originate_command(
-                    core_uuid, username, number, converted_path
-                )
-                
-                # Execute command
-                res = self.connection.bgapi("originate", originate_cmd)
+                send_path = converted_path
+                if renderer:
+                    fields = cover_fields(user, username, number, variables)
+                    send_path = self.add_cover(renderer, converted_path, fields, is_enhanced)
+                dispatch = self.dispatch(username, number, send_path)
                 
                 # Update queue item
-                queue_item.job_uuid = core_uuid
-                queue_item.event_name = res.getHeader("Event-Name")
+                queue_item.job_uuid = dispatch.job_id
+                queue_item.event_name = dispatch.event_name
+                queue_item.transport = dispatch.transport
                 queue_item.attempts += 1
                 queue_item.save()
                 
                 # Add to results
                 results['details'].append({
                     'recipient': number,
-                    'job_uuid': core_uuid,
+                    'job_uuid': dispatch.job_id,
+                    'transport': dispatch.transport,
                     'status': 'initiated'
                 })
             
@@ -127,25 +119,44 @@ class FaxHandler:
         
         return results
     
-    def _build_originate_command(self, uuid, sender, recipient, file_path):
-        """Build FreeSWITCH originate command for fax"""
-        params = {
-            'origination_uuid': uuid,
-            'ignore_early_media': 'true',
-            'absolute_codec_string': 'PCMU,PCMA',
-            'fax_enable_t38': 'true',
-            'fax_verbose': 'true',
-            'fax_use_ecm': 'false',
-            'fax_enable_t38_request': 'false',
-            'fax_ident': sender
-        }
+    def prepare_file(self, file_path, is_enhanced=False):
+        """Resolve a TX file and convert it to TIFF if needed; raises ValueError"""
+        # Check if file exists
+        full_path = os.path.join(TXFAX_DIR, file_path) if not file_path.startswith('/') else file_path
+        if not os.path.isfile(full_path):
+            raise ValueError(f"File not found: {full_path}")
         
-        param_string = ','.join([f"{k}={v}" for k, v in params.items()])
-        command = f"{{{param_string}}}sofia/gateway/{sender}/{recipient} &txfax({file_path})"
+        # Convert file to TIFF format if needed
+        if full_path.lower().endswith(('.tif', '.tiff')):
+            # File is already TIFF, use as-is
+            return full_path
         
-        return command
+        try:
+            converter = FileConverter(filename=full_path, is_enhanced=is_enhanced, DEBUG=False)
+            return converter.convert()
+        except Exception as e:
+            raise ValueError(f"File conversion failed: {str(e)}")
     
-    def receive_fax(self, caller_number, called_number, file_path):
+    def _index_search(self, transaction):
+        # The fax matters more than its search entry; rebuild_search_index can fill gaps
+        try:
+            index_transactions([transaction])
+        except Exception as e:
+            print(f"[WARNING] Search indexing failed for {transaction.uuid}: {e}")
+    
+    def add_cover(self, renderer, file_path, fields, is_enhanced=False):
+        """The TIFF with its cover page in front; the TIFF alone if the cover can't be added"""
+        try:
+            return renderer.render(file_path, fields, fine=is_enhanced)
+        except (CoverPageError, OSError) as e:
+            print(f"[WARNING] Sending {file_path} without cover page: {e}")
+            return file_path
+    
+    def dispatch(self, sender, recipient, file_path):
+        """Start one fax on the best transport; returns a transports.Dispatch"""
+        return self.router.send(sender, recipient, file_path)
+    
+    def receive_fax(self, caller_number, called_number, file_path, call_uuid=None, pages=0):
         """Process received fax"""
         transaction = FaxTransaction.objects.create(
             direction='inbound',
@@ -153,33 +164,80 @@ class FaxHandler:
             sender_number=caller_number,
             recipient_number=called_number,
             file_path=file_path,
-            original_filename=os.path.basename(file_path)
+            original_filename=os.path.basename(file_path),
+            pages=pages
         )
+        self._index_search(transaction)
+        
+        try:
+            index_received_fax(
+                callid=call_uuid or str(transaction.uuid),
+                caller_id_number=caller_number,
+                destination_number=called_number,
+                starting_date=transaction.created_at,
+                file_path=file_path,
+                pages=pages
+            )
+        except Exception as e:
+            print(f"[WARNING] Inbox indexing failed for {file_path}: {e}")
         
         return transaction
     
     def get_fax_status(self, transaction_uuid):
         """Get status of a fax transaction"""
-        try:
-            transaction = FaxTransaction.objects.get(uuid=transaction_uuid)
-            queue_items = FaxQueue.objects.filter(transaction=transaction)
-            
-            return {
-                'uuid': str(transaction.uuid),
-                'status': transaction.status,
-                'direction': transaction.direction,
-                'sender': transaction.sender_number,
-                'recipient': transaction.recipient_number,
-                'created': transaction.created_at,
-                'queue_items': [
-                    {
-                        'recipient': item.recipient_number,
-                        'attempts': item.attempts,
-                        'processed': item.is_processed,
-                        'job_uuid': item.job_uuid
-                    }
-                    for item in queue_items
-                ]
-            }
-        except FaxTransaction.DoesNotExist:
-            return None
\ No newline at end of file
+        transaction = FaxTransaction.objects.prefetch_related('queue_items').filter(uuid=transaction_uuid).first()
+        if transaction is None:
+            return None
+        return self._status_dict(transaction)
+    
+    def get_fax_statuses(self, transaction_uuids, user=None, include_items=False):
+        """
+        Resolve many transactions at once
+        
+        Two queries regardless of how many UUIDs are asked for: the
+        transactions and their prefetched queue items. Returns
+        ({uuid: status}, [uuids not found]).
+        """
+        queryset = FaxTransaction.objects.filter(uuid__in=transaction_uuids).prefetch_related('queue_items')
+        if user is not None:
+            queryset = queryset.filter(user=user)
+        
+        found = {}
+        for transaction in queryset:
+            if include_items:
+                found[str(transaction.uuid)] = self._status_dict(transaction)
+            else:
+                found[str(transaction.uuid)] = self._compact_status_dict(transaction)
+        
+        missing = [str(u) for u in transaction_uuids if str(u) not in found]
+        return found, missing
+    
+    def _status_dict(self, transaction):
+        return {
+            'uuid': str(transaction.uuid),
+            'status': transaction.status,
+            'direction': transaction.direction,
+            'sender': transaction.sender_number,
+            'recipient': transaction.recipient_number,
+            'created': transaction.created_at,
+            'queue_items': [
+                {
+                    'recipient': item.recipient_number,
+                    'attempts': item.attempts,
+                    'processed': item.is_processed,
+                    'job_uuid': item.job_uuid
+                }
+                for item in transaction.queue_items.all()
+            ]
+        }
+    
+    def _compact_status_dict(self, transaction):
+        items = transaction.queue_items.all()
+        return {
+            'status': transaction.status,
+            'direction': transaction.direction,
+            'updated': transaction.updated_at,
+            'recipients': len(items),
+            'processed': sum(1 for item in items if item.is_processed),
+            'attempts': sum(item.attempts for item in items),
+        }
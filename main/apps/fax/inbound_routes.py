@@ -0,0 +1,167 @@
+"""
+Inbound Fax Routing
+Destination number -> account/settings/delivery map built from DID, FaxAccount and InboundFaxSettings
+"""
+
+from django.core.cache import cache
+from .models_extended import FaxAccount
+from .models_complete import DID, InboundFaxSettings
+from .inbound_rules import compile_rules, normalize_e164, RuleError, ACCEPT
+
+
+INBOUND_ROUTES_VERSION_KEY = 'fax:inbound_routes:version'
+
+ACCOUNT_FIELDS = tuple(field.attname for field in FaxAccount._meta.concrete_fields)
+SETTINGS_FIELDS = (
+    'id', 'user_id', 'tenant_id', 'email_enabled', 'email_address', 'cc_addresses',
+    'email_format', 'ocr_enabled', 'ocr_language', 'searchable_pdf', 'archive_enabled',
+    'routing_enabled', 'routing_rules', 'allowed_senders', 'blocked_senders',
+)
+
+# (version, {number: InboundRoute}), per process
+_table = (None, {})
+
+
+class InboundRoute:
+    """Everything the RX pipeline needs to know about one destination number"""
+
+    __slots__ = (
+        'number', 'account_row', 'user_id', 'tenant_id', 'did_id', 'settings_id',
+        'emails', 'email_format', 'ocr_enabled', 'ocr_language', 'searchable_pdf', 'rules',
+    )
+
+    def __init__(self, number, account_row, user_id, tenant_id=None, did_id=None, settings_id=None,
+                 emails=(), email_format='pdf', ocr_enabled=False, ocr_language='eng', searchable_pdf=False,
+                 rules=None):
+        self.number = number
+        self.account_row = account_row
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self.did_id = did_id
+        self.settings_id = settings_id
+        self.emails = emails
+        self.email_format = email_format
+        self.ocr_enabled = ocr_enabled
+        self.ocr_language = ocr_language
+        self.searchable_pdf = searchable_pdf
+        self.rules = rules
+
+    def screen(self, sender, when=None):
+        """Decision for a fax from `sender` under the user's compiled rules"""
+        if self.rules is None:
+            return ACCEPT
+        return self.rules.evaluate(sender, when)
+
+    def get_account(self):
+        """A fresh FaxAccount instance (the route itself is shared between threads)"""
+        return FaxAccount.from_db('default', ACCOUNT_FIELDS, self.account_row)
+
+    def __repr__(self):
+        return f"<InboundRoute {self.number} account={self.account_row[0]} did={self.did_id}>"
+
+
+def get_routes_version():
+    version = cache.get(INBOUND_ROUTES_VERSION_KEY)
+    if version is None:
+        cache.add(INBOUND_ROUTES_VERSION_KEY, 1, timeout=None)
+        version = cache.get(INBOUND_ROUTES_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_inbound_routes():
+    """Drop the routing map everywhere; called when a DID, account or settings row changes"""
+    global _table
+    try:
+        cache.incr(INBOUND_ROUTES_VERSION_KEY)
+    except ValueError:
+        cache.set(INBOUND_ROUTES_VERSION_KEY, 1, timeout=None)
+    _table = (None, {})
+
+
+def _delivery(account, inbound, did_email):
+    """(emails, email_format) from the user's inbound settings, else the account"""
+    if inbound:
+        emails = [inbound['email_address']] if inbound['email_enabled'] and inbound['email_address'] else []
+        if inbound['email_enabled']:
+            emails += [line.strip() for line in inbound['cc_addresses'].splitlines() if line.strip()]
+        email_format = inbound['email_format']
+    else:
+        emails = [account['notification_email']] if account['send_fax_to_email'] else []
+        email_format = account['email_format']
+    if did_email:
+        emails.append(did_email)
+    return tuple(dict.fromkeys(emails)), email_format
+
+
+def _compile(inbound):
+    try:
+        return compile_rules(inbound)
+    except RuleError as e:
+        # Keep screening on the sender lists; clean() rejects bad rules on save
+        print(f"[WARNING] Ignoring routing_rules of inbound settings {inbound['id']}: {e}")
+        return compile_rules(dict(inbound, routing_enabled=False))
+
+
+def build_inbound_routes():
+    """
+    Load the whole routing map in three queries
+
+    Active fax-enabled DIDs route to the FaxAccount of the user they are
+    assigned to. FaxAccount.fax_number is used for numbers without such a
+    DID. Numbers that resolve to no active account are left out.
+    """
+    accounts = {
+        row[ACCOUNT_FIELDS.index('user_id')]: row
+        for row in FaxAccount.objects.filter(is_active=True).values_list(*ACCOUNT_FIELDS)
+    }
+    inbound = {
+        row['user_id']: row
+        for row in InboundFaxSettings.objects.filter(is_active=True).values(*SETTINGS_FIELDS)
+    }
+    # Compiled once per user and shared by all of the user's numbers
+    rules = {user_id: _compile(row) for user_id, row in inbound.items()}
+
+    def route(number, user_id, tenant_id=None, did_id=None, did_email=''):
+        account_row = accounts[user_id]
+        account = dict(zip(ACCOUNT_FIELDS, account_row))
+        user_settings = inbound.get(user_id)
+        emails, email_format = _delivery(account, user_settings, did_email)
+        return InboundRoute(
+            number=number,
+            account_row=account_row,
+            user_id=user_id,
+            tenant_id=tenant_id or (user_settings and user_settings['tenant_id']),
+            did_id=did_id,
+            settings_id=user_settings and user_settings['id'],
+            emails=emails,
+            email_format=email_format,
+            ocr_enabled=bool(user_settings and user_settings['ocr_enabled']),
+            ocr_language=user_settings['ocr_language'] if user_settings else 'eng',
+            searchable_pdf=bool(user_settings and user_settings['searchable_pdf']),
+            rules=rules.get(user_id),
+        )
+
+    routes = {}
+    for account_row in accounts.values():
+        account = dict(zip(ACCOUNT_FIELDS, account_row))
+        routes[normalize_e164(account['fax_number'])] = route(account['fax_number'], account['user_id'])
+
+    dids = DID.objects.filter(
+        is_active=True, is_fax_enabled=True, tenant__is_active=True, assigned_to__isnull=False
+    ).values_list('id', 'number', 'tenant_id', 'assigned_to_id', 'route_to_email')
+    # DIDs come second so their tenant and routing override the account number
+    for did_id, number, tenant_id, user_id, did_email in dids:
+        if user_id in accounts:
+            routes[normalize_e164(number)] = route(number, user_id, tenant_id, did_id, did_email)
+    return routes
+
+
+def get_inbound_route(number):
+    """Route for a destination number, or None; one cache read when the map is current"""
+    global _table
+    version = get_routes_version()
+    cached_version, routes = _table
+    if cached_version != version:
+        routes = build_inbound_routes()
+        _table = (version, routes)
+    return routes.get(normalize_e164(number))
@@ -0,0 +1,213 @@
+"""
+Inbound Fax Screening
+Compiles InboundFaxSettings allow/block lists and routing_rules into fast matchers
+
+routing_rules format (evaluated in order, first match wins):
+
+    {"rules": [
+        {"senders": ["18005550100", "1888*"], "action": "reject"},
+        {"days": ["sat", "sun"], "hours": "18:00-08:00", "action": "forward", "email": "oncall@example.com"},
+        {"senders": ["1415*"], "action": "accept"}
+    ]}
+
+Sender entries are E.164 digits; a trailing '*' makes a prefix and
+'anonymous' matches calls without caller ID. senders, days and email take
+a list or a single string. Every condition is optional.
+"""
+
+from collections import namedtuple
+from django.utils import timezone
+from django.conf import settings
+from .rating import PrefixTrie
+
+# Prepended to national numbers (10 digits) so every key is E.164 without the '+'
+DEFAULT_COUNTRY_CODE = getattr(settings, 'FAX_DEFAULT_COUNTRY_CODE', '1')
+DAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+ACTIONS = ('accept', 'reject', 'forward')
+
+Decision = namedtuple('Decision', ['accepted', 'reason', 'emails'])
+ACCEPT = Decision(True, '', ())
+
+
+def normalize_e164(number):
+    """'+1 (212) 555-0100', '12125550100' and '2125550100' all become '12125550100'"""
+    digits = ''.join(ch for ch in (number or '') if ch.isdigit())
+    if digits.startswith('00'):
+        digits = digits[2:]
+    elif len(digits) == 10:
+        digits = DEFAULT_COUNTRY_CODE + digits
+    return digits
+
+
+class RuleError(ValueError):
+    """routing_rules or a sender list could not be compiled"""
+
+
+class SenderMatcher:
+    """Exact numbers in a set, 'prefix*' entries in a digit trie"""
+
+    __slots__ = ('exact', 'prefixes', 'anonymous')
+
+    def __init__(self, entries):
+        self.exact = set()
+        self.prefixes = None
+        self.anonymous = False
+        for entry in entries:
+            entry = str(entry).strip()
+            if not entry or entry.startswith('#'):
+                continue
+            if entry.lower() == 'anonymous':
+                self.anonymous = True
+            elif entry.endswith('*'):
+                prefix = ''.join(ch for ch in entry if ch.isdigit())
+                if not prefix:
+                    raise RuleError(f"Invalid sender prefix: {entry!r}")
+                if self.prefixes is None:
+                    self.prefixes = PrefixTrie()
+                self.prefixes.insert(prefix, True)
+            else:
+                number = normalize_e164(entry)
+                if not number:
+                    raise RuleError(f"Invalid sender number: {entry!r}")
+                self.exact.add(number)
+
+    def __bool__(self):
+        return bool(self.exact or self.prefixes or self.anonymous)
+
+    def matches(self, number):
+        """`number` is already normalized; '' means no caller ID"""
+        if not number:
+            return self.anonymous
+        if number in self.exact:
+            return True
+        return self.prefixes is not None and self.prefixes.longest_match(number) is not None
+
+
+class TimeWindow:
+    """Weekdays and/or a daily 'HH:MM-HH:MM' range (may wrap past midnight)"""
+
+    __slots__ = ('days', 'start', 'end')
+
+    def __init__(self, days=None, hours=None):
+        self.days = None
+        if days:
+            try:
+                self.days = frozenset(DAYS.index(str(day).lower()[:3]) for day in days)
+            except ValueError:
+                raise RuleError(f"Invalid days: {days!r}")
+        self.start = self.end = None
+        if hours:
+            try:
+                start, end = str(hours).split('-')
+                self.start, self.end = self._minutes(start), self._minutes(end)
+            except ValueError:
+                raise RuleError(f"Invalid hours (expected HH:MM-HH:MM): {hours!r}")
+
+    @staticmethod
+    def _minutes(value):
+        hour, minute = value.strip().split(':')
+        hour, minute = int(hour), int(minute)
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(value)
+        return hour * 60 + minute
+
+    def matches(self, when):
+        weekday = when.weekday()
+        if self.start is not None:
+            minute = when.hour * 60 + when.minute
+            if self.start <= self.end:
+                inside = self.start <= minute < self.end
+            else:
+                inside = minute >= self.start or minute < self.end
+            if not inside:
+                return False
+            if self.start > self.end and minute < self.end:
+                # The early-morning part of an overnight window belongs to the day it started
+                weekday = (weekday - 1) % 7
+        return self.days is None or weekday in self.days
+
+
+def _entries(index, rule, key):
+    """A rule's list field; a lone string is one entry (so "1800555" isn't read digit by digit)"""
+    value = rule.get(key) or []
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        raise RuleError(f"Rule {index + 1}: {key!r} must be a list or a string")
+    return value
+
+
+class CompiledRule:
+    __slots__ = ('index', 'senders', 'window', 'action', 'emails')
+
+    def __init__(self, index, rule):
+        if not isinstance(rule, dict):
+            raise RuleError(f"Rule {index + 1} must be an object")
+        self.index = index
+        self.action = rule.get('action', 'accept')
+        if self.action not in ACTIONS:
+            raise RuleError(f"Rule {index + 1}: unknown action {self.action!r}")
+        self.senders = SenderMatcher(_entries(index, rule, 'senders')) or None
+        days = _entries(index, rule, 'days')
+        self.window = TimeWindow(days, rule.get('hours')) if days or rule.get('hours') else None
+        self.emails = tuple(_entries(index, rule, 'email'))
+        if self.action == 'forward' and not self.emails:
+            raise RuleError(f"Rule {index + 1}: 'forward' needs an 'email'")
+
+    def matches(self, sender, when):
+        if self.senders is not None and not self.senders.matches(sender):
+            return False
+        return self.window is None or self.window.matches(when)
+
+
+class CompiledRules:
+    """Block list, allow list, then the first matching routing rule"""
+
+    __slots__ = ('blocked', 'allowed', 'rules')
+
+    def __init__(self, blocked, allowed, rules):
+        self.blocked = blocked
+        self.allowed = allowed
+        self.rules = rules
+
+    def evaluate(self, sender, when=None):
+        sender = normalize_e164(sender)
+        if self.blocked and self.blocked.matches(sender):
+            return Decision(False, 'blocked sender', ())
+        if self.allowed and not self.allowed.matches(sender):
+            return Decision(False, 'sender not on allow list', ())
+
+        if self.rules:
+            when = timezone.localtime(when)
+            for rule in self.rules:
+                if rule.matches(sender, when):
+                    if rule.action == 'reject':
+                        return Decision(False, f'routing rule {rule.index + 1}', ())
+                    return Decision(True, f'routing rule {rule.index + 1}', rule.emails)
+        return ACCEPT
+
+
+def compile_rules(inbound):
+    """
+    Compile one user's screening settings; None when nothing is configured
+
+    `inbound` is an InboundFaxSettings instance or a values() dict with
+    routing_enabled, routing_rules, allowed_senders and blocked_senders.
+    Raises RuleError on malformed input.
+    """
+    get = inbound.get if isinstance(inbound, dict) else lambda name: getattr(inbound, name)
+
+    blocked = SenderMatcher((get('blocked_senders') or '').splitlines())
+    allowed = SenderMatcher((get('allowed_senders') or '').splitlines())
+
+    rules = []
+    if get('routing_enabled'):
+        spec = get('routing_rules') or {}
+        entries = spec.get('rules', []) if isinstance(spec, dict) else spec
+        if not isinstance(entries, list):
+            raise RuleError("routing_rules must be a list or an object with a 'rules' list")
+        rules = [CompiledRule(index, rule) for index, rule in enumerate(entries)]
+
+    if not (blocked or allowed or rules):
+        return None
+    return CompiledRules(blocked or None, allowed or None, rules)
@@ -0,0 +1,219 @@
+"""
+Fax Email Outbox
+Notification emails are queued by the fax pipelines and sent in batches over one SMTP connection
+"""
+
+import os
+import time
+import smtplib
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.core.mail import EmailMessage, get_connection
+from django.urls import reverse
+from django.utils import timezone
+from .models_extended import FaxEmail
+
+EMAIL_BATCH_SIZE = getattr(settings, 'FAX_EMAIL_BATCH_SIZE', 100)
+EMAIL_MAX_ATTEMPTS = getattr(settings, 'FAX_EMAIL_MAX_ATTEMPTS', 5)
+# First retry after this many seconds, doubling with every attempt
+EMAIL_RETRY_DELAY = getattr(settings, 'FAX_EMAIL_RETRY_DELAY', 60)
+# Attachments larger than this (together) are sent as download links instead
+EMAIL_ATTACHMENT_LIMIT = getattr(settings, 'FAX_EMAIL_ATTACHMENT_LIMIT', 10 * 1024 * 1024)
+EMAIL_LINK_DAYS = getattr(settings, 'FAX_EMAIL_LINK_DAYS', 7)
+# Public base URL of this server ("https://fax.example.com"); large faxes stay attached without it
+FAX_PUBLIC_URL = getattr(settings, 'FAX_PUBLIC_URL', '')
+# Sending emails older than this are assumed to belong to a dead worker
+EMAIL_STALE_AFTER = timedelta(minutes=getattr(settings, 'FAX_EMAIL_STALE_MINUTES', 15))
+
+DOWNLOAD_SALT = 'fax.download'
+
+
+def _in_media(path):
+    return os.path.realpath(path).startswith(os.path.realpath(settings.MEDIA_ROOT) + os.sep)
+
+
+def download_url(path):
+    """Signed link to a file under MEDIA_ROOT, valid for EMAIL_LINK_DAYS"""
+    token = signing.dumps(os.path.relpath(path, settings.MEDIA_ROOT), salt=DOWNLOAD_SALT, compress=True)
+    return FAX_PUBLIC_URL.rstrip('/') + reverse('fax:fax-download', kwargs={'token': token})
+
+
+def download_path(token):
+    """
+    File of a download token, or None if it is not under MEDIA_ROOT
+
+    Raises signing.BadSignature (or its subclass SignatureExpired).
+    """
+    path = os.path.join(settings.MEDIA_ROOT, signing.loads(token, salt=DOWNLOAD_SALT, max_age=EMAIL_LINK_DAYS * 86400))
+    return path if _in_media(path) else None
+
+
+def queue_email(to, subject, body, cc=(), attachments=(), transmission=None, kind=''):
+    """
+    Queue one email; a single INSERT, safe on the fax pipelines
+
+    `attachments` are (path, filename, mimetype) tuples and are only read
+    when the email is sent. When together they are larger than
+    FAX_EMAIL_ATTACHMENT_LIMIT (and FAX_PUBLIC_URL is set), they are
+    replaced by signed download links at the end of the body (files
+    outside MEDIA_ROOT are always attached).
+    """
+    attachments = [list(attachment) for attachment in attachments if os.path.isfile(attachment[0])]
+    size = sum(os.path.getsize(path) for path, _, _ in attachments)
+    linkable = FAX_PUBLIC_URL and all(_in_media(path) for path, _, _ in attachments)
+    if attachments and size > EMAIL_ATTACHMENT_LIMIT and linkable:
+        links = '\n'.join(f"{filename}: {download_url(path)}" for path, filename, _ in attachments)
+        body = (f"{body.rstrip()}\n\nThe fax is too large to attach. "
+                f"Download it within {EMAIL_LINK_DAYS} days:\n{links}\n")
+        attachments = []
+
+    return FaxEmail.objects.create(
+        transmission=transmission,
+        kind=kind,
+        to_addresses=list(to),
+        cc_addresses=list(cc),
+        subject=subject,
+        body=body,
+        attachments=attachments,
+        max_attempts=EMAIL_MAX_ATTEMPTS
+    )
+
+
+class Mailer:
+    """
+    Send due outbox emails over one reused SMTP connection
+
+    The connection is opened when there is mail to send and kept across
+    batches while the outbox has work; it is closed when a poll finds
+    nothing. A dropped connection is reopened once per message. Failed
+    sends are retried with exponential backoff up to max_attempts;
+    refused recipients and missing attachment files fail at once.
+    """
+
+    def __init__(self, batch_size=EMAIL_BATCH_SIZE, stdout=None):
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.connection = None
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0}
+
+    def _write(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def requeue_stale(self):
+        return FaxEmail.objects.filter(
+            status='sending', updated_at__lt=timezone.now() - EMAIL_STALE_AFTER
+        ).update(status='pending')
+
+    def claim(self):
+        """Claim up to batch_size due emails, oldest first"""
+        now = timezone.now()
+        due = FaxEmail.objects.filter(status='pending', next_attempt_at__lte=now).order_by('next_attempt_at')
+        claimed = []
+        for email in due[:self.batch_size]:
+            if FaxEmail.objects.filter(pk=email.pk, status='pending').update(status='sending', updated_at=now):
+                email.status = 'sending'
+                claimed.append(email)
+        return claimed
+
+    def open(self):
+        if self.connection is None:
+            connection = get_connection(fail_silently=False)
+            connection.open()
+            self.connection = connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+
+    def build(self, email):
+        message = EmailMessage(
+            subject=email.subject,
+            body=email.body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=email.to_addresses,
+            cc=email.cc_addresses,
+            connection=self.connection
+        )
+        for path, filename, mimetype in email.attachments:
+            with open(path, 'rb') as f:
+                message.attach(filename, f.read(), mimetype)
+        return message
+
+    def _deliver(self, message):
+        try:
+            self.connection.send_messages([message])
+        except smtplib.SMTPServerDisconnected:
+            # Idle connections get dropped by the server; reconnect once
+            self.close()
+            self.open()
+            message.connection = self.connection
+            self.connection.send_messages([message])
+
+    def send(self, email):
+        email.attempts += 1
+        try:
+            self._deliver(self.build(email))
+        except (FileNotFoundError, smtplib.SMTPRecipientsRefused) as e:
+            self._failed(email, e, retry=False)
+        except Exception as e:
+            self._failed(email, e, retry=email.attempts < email.max_attempts)
+        else:
+            email.status = 'sent'
+            email.sent_at = timezone.now()
+            email.last_error = ''
+            self.stats['sent'] += 1
+        email.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'updated_at'])
+
+    def _failed(self, email, error, retry):
+        email.last_error = str(error)
+        if retry:
+            email.status = 'pending'
+            email.next_attempt_at = timezone.now() + timedelta(seconds=EMAIL_RETRY_DELAY * 2 ** (email.attempts - 1))
+            self.stats['retried'] += 1
+        else:
+            email.status = 'failed'
+            self.stats['failed'] += 1
+        self._write(f"Email #{email.pk} to {', '.join(email.to_addresses)}: {error}")
+
+    def send_batch(self):
+        """Send one batch of due emails; returns how many were claimed"""
+        emails = self.claim()
+        if not emails:
+            return 0
+        for index, email in enumerate(emails):
+            try:
+                # Opens the first time, and again if a reconnect in _deliver failed
+                self.open()
+            except Exception as e:
+                self._put_back(emails[index:], e)
+                break
+            self.send(email)
+        return len(emails)
+
+    def _put_back(self, emails, error):
+        """SMTP server unreachable: return the rest of the batch for a later attempt"""
+        for email in emails:
+            email.attempts += 1
+            self._failed(email, error, retry=email.attempts < email.max_attempts)
+        FaxEmail.objects.bulk_update(emails, ['status', 'attempts', 'next_attempt_at', 'last_error'])
+        self.close()
+
+    def run(self, loop=False, interval=5):
+        try:
+            while True:
+                # Every poll, so a --loop worker picks up emails a dead worker left in 'sending'
+                self.requeue_stale()
+                if self.send_batch():
+                    continue
+                self.close()
+                if not loop:
+                    break
+                time.sleep(interval)
+        finally:
+            self.close()
+        self._write(f"Emails sent: {self.stats['sent']}, retried: {self.stats['retried']}, failed: {self.stats['failed']}")
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from main.apps.fax.batch import BatchDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Dispatch pending batch fax jobs through the fax transports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--job', help='Only dispatch this job UUID')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Items per dispatch chunk')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            job = BatchDispatcher.claim(options['job'])
+            if job is None:
+                if not options['loop'] or options['job']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Dispatching batch {job.uuid} ({job.total_items} items)")
+            progress = BatchDispatcher(job, chunk_size=options['chunk_size']).run()
+            self.stdout.write(f"Batch {job.uuid} {job.status}: {progress}")
+
+            if options['job']:
+                return
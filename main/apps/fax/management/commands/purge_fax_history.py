@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from main.apps.fax.retention import RetentionJob, LOG_RETENTION_DAYS, TRANSMISSION_RETENTION_DAYS, EMAIL_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = 'Delete old fax logs, transmissions and stored files in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log-days', type=int, default=LOG_RETENTION_DAYS,
+                            help='Keep fax_log rows this many days')
+        parser.add_argument('--email-days', type=int, default=EMAIL_RETENTION_DAYS,
+                            help='Keep sent/failed fax_email rows this many days')
+        parser.add_argument('--transmission-days', type=int, default=TRANSMISSION_RETENTION_DAYS,
+                            help='Keep fax_transmission rows this many days (0 keeps them forever)')
+        parser.add_argument('--skip-files', action='store_true',
+                            help="Don't remove files past each account's archive_days or old cover page files")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per DELETE')
+        parser.add_argument('--sleep', type=float, default=0.5, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be removed')
+
+    def handle(self, *args, **options):
+        job = RetentionJob(
+            batch_size=options['batch_size'],
+            sleep=options['sleep'],
+            dry_run=options['dry_run'],
+            stdout=self.stdout
+        )
+        stats = job.run(
+            log_days=options['log_days'],
+            transmission_days=options['transmission_days'],
+            files=not options['skip_files'],
+            email_days=options['email_days']
+        )
+        prefix = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(
+            f"{prefix} {stats['logs']} logs, {stats['emails']} emails, {stats['transmissions']} transmissions, "
+            f"files of {stats['files']} transmissions, {stats['covers']} cover page files"
+        )
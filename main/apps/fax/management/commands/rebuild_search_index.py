@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from main.apps.fax.search import reindex, SOURCES
+
+
+class Command(BaseCommand):
+    help = 'Build or refresh the fax search index from existing transactions and transmissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=SOURCES, help='Only reindex this kind of record')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records per batch')
+
+    def handle(self, *args, **options):
+        for source in [options['source']] if options['source'] else SOURCES:
+            count = reindex(source, options['batch_size'])
+            self.stdout.write(f"{source}: {count} records indexed")
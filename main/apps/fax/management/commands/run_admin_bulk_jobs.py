@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from main.apps.fax.bulk_actions import claim_job, run_job, JOB_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Run admin bulk actions that were queued because the selection was large'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=JOB_CHUNK_SIZE, help='Rows per UPDATE')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_job()
+            if job is None:
+                if not options['loop']:
+                    return
+                time.sleep(options['interval'])
+                continue
+
+            self.stdout.write(f"Running {job.action} over {job.total_items} rows (job #{job.pk})")
+            run_job(job, chunk_size=options['chunk_size'])
+            self.stdout.write(f"Job #{job.pk} {job.status}: {job.affected_items} rows changed")
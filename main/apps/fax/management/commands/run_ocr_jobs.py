@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from main.apps.fax.ocr import OCRRunner, OCR_WORKERS, OCR_TENANT_CONCURRENCY
+
+
+class Command(BaseCommand):
+    help = 'OCR received faxes in a process pool (one page per task)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=OCR_WORKERS, help='OCR processes')
+        parser.add_argument('--tenant-limit', type=int, default=OCR_TENANT_CONCURRENCY,
+                            help='Jobs per tenant in progress at once')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new jobs')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        runner = OCRRunner(workers=options['workers'], tenant_limit=options['tenant_limit'], stdout=self.stdout)
+        runner.run(loop=options['loop'], interval=options['interval'])
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from main.apps.fax.notifications import DigestRunner
+
+
+class Command(BaseCommand):
+    help = 'Send the summary email and webhook of accounts in digest notification mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep checking for due digests')
+        parser.add_argument('--interval', type=float, default=30, help='Seconds between checks with --loop')
+
+    def handle(self, *args, **options):
+        DigestRunner(stdout=self.stdout).run(loop=options['loop'], interval=options['interval'])
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from main.apps.fax.mailer import Mailer, EMAIL_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Send queued fax notification emails over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=EMAIL_BATCH_SIZE, help='Emails claimed per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for new emails')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        Mailer(batch_size=options['batch_size'], stdout=self.stdout).run(loop=options['loop'], interval=options['interval'])
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from main.apps.fax.telnyx_integration import TelnyxDIDManager
+
+
+class Command(BaseCommand):
+    help = 'Complete Telnyx number orders the webhook missed and configure new numbers for fax'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60, help='Seconds to wait for the webhook before polling an order')
+        parser.add_argument('--loop', action='store_true', help='Keep polling')
+        parser.add_argument('--interval', type=float, default=15, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        manager = TelnyxDIDManager()
+        while True:
+            completed = manager.sync_pending_orders(grace_seconds=options['grace'])
+            configured = manager.configure_pending_numbers()
+            if completed or configured:
+                self.stdout.write(f"Orders completed for {completed} DIDs, {configured} DIDs configured for fax")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
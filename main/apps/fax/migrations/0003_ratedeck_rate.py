@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:29
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0002_coverpage_did_tenant_userprofile_outboundfaxsettings_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateDeck',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('default_rate', models.DecimalField(decimal_places=4, default=0.2, help_text='Per-page rate when no prefix matches', max_digits=10)),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(blank=True, help_text='Leave empty for the global deck used by every tenant', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rate_decks', to='fax.tenant')),
+            ],
+            options={
+                'verbose_name': 'Rate Deck',
+                'verbose_name_plural': 'Rate Decks',
+                'db_table': 'fax_rate_deck',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Rate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(help_text='E.164 destination prefix without "+", e.g. 1, 44, 4420', max_length=15, validators=[django.core.validators.RegexValidator(message='Prefix must contain digits only', regex='^\\d+$')])),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('rate_per_page', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('deck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='fax.ratedeck')),
+            ],
+            options={
+                'db_table': 'fax_rate',
+                'ordering': ['prefix'],
+                'unique_together': {('deck', 'prefix')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('fax', '0004_faxbatchjob_faxbatchitem'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdminBulkJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(max_length=50)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('object_ids', models.JSONField(default=list, help_text='Primary keys selected in the admin')),
+                ('total_items', models.IntegerField(default=0)),
+                ('processed_items', models.IntegerField(default=0)),
+                ('affected_items', models.IntegerField(default=0, help_text='Rows actually changed')),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'fax_admin_bulk_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,169 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('fax', '0005_adminbulkjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaxAccount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fax_number', models.CharField(max_length=20, unique=True)),
+                ('company_name', models.CharField(blank=True, max_length=255)),
+                ('plan', models.CharField(choices=[('basic', 'Basic - 150 pages/month'), ('plus', 'Plus - 300 pages/month'), ('pro', 'Pro - 500 pages/month'), ('enterprise', 'Enterprise - Unlimited')], default='basic', max_length=20)),
+                ('pages_sent_this_month', models.IntegerField(default=0)),
+                ('pages_received_this_month', models.IntegerField(default=0)),
+                ('notification_email', models.EmailField(max_length=254)),
+                ('send_fax_to_email', models.BooleanField(default=True)),
+                ('email_format', models.CharField(choices=[('pdf', 'PDF'), ('tiff', 'TIFF')], default='pdf', max_length=10)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'fax_account',
+            },
+        ),
+        migrations.CreateModel(
+            name='FaxWebhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField()),
+                ('on_received', models.BooleanField(default=True)),
+                ('on_sent', models.BooleanField(default=True)),
+                ('on_failed', models.BooleanField(default=True)),
+                ('secret_key', models.CharField(default=uuid.uuid4, max_length=64)),
+                ('is_active', models.BooleanField(default=True)),
+                ('last_triggered', models.DateTimeField(blank=True, null=True)),
+                ('failure_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='webhooks', to='fax.faxaccount')),
+            ],
+            options={
+                'db_table': 'fax_webhook',
+            },
+        ),
+        migrations.CreateModel(
+            name='FaxTransmission',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('direction', models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound')], max_length=10)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('dialing', 'Dialing'), ('negotiating', 'Negotiating'), ('transmitting', 'Transmitting'), ('completed', 'Completed'), ('failed', 'Failed'), ('busy', 'Busy'), ('no_answer', 'No Answer'), ('cancelled', 'Cancelled')], default='queued', max_length=20)),
+                ('sender_number', models.CharField(max_length=20)),
+                ('sender_name', models.CharField(blank=True, max_length=255)),
+                ('recipient_number', models.CharField(max_length=20)),
+                ('recipient_name', models.CharField(blank=True, max_length=255)),
+                ('file_path', models.CharField(max_length=500)),
+                ('file_size', models.IntegerField(default=0)),
+                ('file_hash', models.CharField(blank=True, max_length=64)),
+                ('pages', models.IntegerField(default=0)),
+                ('duration', models.IntegerField(default=0)),
+                ('baud_rate', models.IntegerField(default=14400)),
+                ('resolution', models.CharField(default='standard', max_length=20)),
+                ('ecm_used', models.BooleanField(default=False)),
+                ('call_uuid', models.CharField(blank=True, max_length=80)),
+                ('sip_call_id', models.CharField(blank=True, max_length=255)),
+                ('queued_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('error_code', models.CharField(blank=True, max_length=20)),
+                ('error_message', models.TextField(blank=True)),
+                ('retry_count', models.IntegerField(default=0)),
+                ('max_retries', models.IntegerField(default=3)),
+                ('cost', models.DecimalField(decimal_places=4, default=0, max_digits=10)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transmissions', to='fax.faxaccount')),
+            ],
+            options={
+                'db_table': 'fax_transmission',
+                'ordering': ['-queued_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FaxPage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('page_number', models.IntegerField()),
+                ('file_path', models.CharField(max_length=500)),
+                ('transmitted_at', models.DateTimeField(blank=True, null=True)),
+                ('transmission_time', models.IntegerField(default=0)),
+                ('quality_score', models.IntegerField(default=100)),
+                ('error_count', models.IntegerField(default=0)),
+                ('transmission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fax_pages', to='fax.faxtransmission')),
+            ],
+            options={
+                'db_table': 'fax_page',
+                'ordering': ['page_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FaxLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('level', models.CharField(choices=[('debug', 'Debug'), ('info', 'Info'), ('warning', 'Warning'), ('error', 'Error')], max_length=10)),
+                ('message', models.TextField()),
+                ('details', models.JSONField(blank=True, null=True)),
+                ('transmission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='fax.faxtransmission')),
+            ],
+            options={
+                'db_table': 'fax_log',
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FaxContact',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('fax_number', models.CharField(max_length=20)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('company', models.CharField(blank=True, max_length=255)),
+                ('notes', models.TextField(blank=True)),
+                ('last_used', models.DateTimeField(blank=True, null=True)),
+                ('usage_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contacts', to='fax.faxaccount')),
+            ],
+            options={
+                'db_table': 'fax_contact',
+                'ordering': ['-last_used', 'name'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='faxtransmission',
+            index=models.Index(fields=['account', 'direction', 'status'], name='fax_transmi_account_5687a5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransmission',
+            index=models.Index(fields=['sender_number', 'recipient_number'], name='fax_transmi_sender__32097c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransmission',
+            index=models.Index(fields=['queued_at'], name='fax_transmi_queued__0ffbf9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='faxpage',
+            unique_together={('transmission', 'page_number')},
+        ),
+        migrations.AddIndex(
+            model_name='faxlog',
+            index=models.Index(fields=['transmission', 'timestamp'], name='fax_log_transmi_4f86d4_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='faxcontact',
+            unique_together={('account', 'fax_number')},
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0006_faxaccount_faxtransmission_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='faxqueue',
+            index=models.Index(fields=['job_uuid'], name='fax_queue_job_uuid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxqueue',
+            index=models.Index(condition=models.Q(('is_processed', False)), fields=['created_at'], name='fax_queue_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransaction',
+            index=models.Index(fields=['user', 'direction', 'status', '-created_at'], name='fax_txn_user_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransaction',
+            index=models.Index(fields=['direction', 'status', '-created_at'], name='fax_txn_list_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransaction',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'processing'])), fields=['created_at'], name='fax_txn_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransmission',
+            index=models.Index(fields=['call_uuid'], name='fax_tx_call_uuid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='faxtransmission',
+            index=models.Index(condition=models.Q(('status__in', ['queued', 'dialing', 'negotiating', 'transmitting'])), fields=['queued_at'], name='fax_tx_inflight_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0007_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='did',
+            name='provider_order_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='did',
+            name='provisioning_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='did',
+            name='provisioning_status',
+            field=models.CharField(choices=[('active', 'Active'), ('pending', 'Order pending'), ('configuring', 'Configuring'), ('failed', 'Failed')], default='active', max_length=20),
+        ),
+    ]
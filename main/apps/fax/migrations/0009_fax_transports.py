@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0008_did_provisioning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='did',
+            name='fax_transport',
+            field=models.CharField(blank=True, choices=[('', 'Automatic'), ('freeswitch', 'FreeSWITCH'), ('telnyx', 'Telnyx'), ('fake', 'Fake (testing)')], help_text='Overrides the tenant transport for faxes sent from this number', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='faxqueue',
+            name='transport',
+            field=models.CharField(blank=True, help_text='Engine that sent this item', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='fax_transport',
+            field=models.CharField(blank=True, choices=[('', 'Automatic'), ('freeswitch', 'FreeSWITCH'), ('telnyx', 'Telnyx'), ('fake', 'Fake (testing)')], help_text='Preferred outbound transport; others are used on failover or overload', max_length=20),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0009_fax_transports'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faxpage',
+            name='ocr_text',
+            field=models.TextField(blank=True),
+        ),
+        migrations.CreateModel(
+            name='FaxOCRJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('language', models.CharField(default='eng', max_length=10)),
+                ('searchable_pdf', models.BooleanField(default=True)),
+                ('total_pages', models.IntegerField(default=0)),
+                ('processed_pages', models.IntegerField(default=0)),
+                ('output_path', models.CharField(blank=True, help_text='Searchable PDF', max_length=500)),
+                ('error_message', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='fax.tenant')),
+                ('transmission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ocr_jobs', to='fax.faxtransmission')),
+            ],
+            options={
+                'db_table': 'fax_ocr_job',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='fax_ocr_job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE fax_search_fts USING fts5(
+        numbers, names, dates, body,
+        content='fax_search_entry', content_rowid='id', tokenize='unicode61'
+    )""",
+    """CREATE TRIGGER fax_search_entry_ai AFTER INSERT ON fax_search_entry BEGIN
+        INSERT INTO fax_search_fts(rowid, numbers, names, dates, body)
+        VALUES (new.id, new.numbers, new.names, new.dates, new.body);
+    END""",
+    """CREATE TRIGGER fax_search_entry_ad AFTER DELETE ON fax_search_entry BEGIN
+        INSERT INTO fax_search_fts(fax_search_fts, rowid, numbers, names, dates, body)
+        VALUES ('delete', old.id, old.numbers, old.names, old.dates, old.body);
+    END""",
+    """CREATE TRIGGER fax_search_entry_au AFTER UPDATE ON fax_search_entry BEGIN
+        INSERT INTO fax_search_fts(fax_search_fts, rowid, numbers, names, dates, body)
+        VALUES ('delete', old.id, old.numbers, old.names, old.dates, old.body);
+        INSERT INTO fax_search_fts(rowid, numbers, names, dates, body)
+        VALUES (new.id, new.numbers, new.names, new.dates, new.body);
+    END""",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS fax_search_entry_au",
+    "DROP TRIGGER IF EXISTS fax_search_entry_ad",
+    "DROP TRIGGER IF EXISTS fax_search_entry_ai",
+    "DROP TABLE IF EXISTS fax_search_fts",
+]
+
+# Weights: numbers A, names B, OCR text C, dates D
+POSTGRES_FORWARD = [
+    """ALTER TABLE fax_search_entry ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', numbers), 'A') ||
+        setweight(to_tsvector('simple', names), 'B') ||
+        setweight(to_tsvector('simple', body), 'C') ||
+        setweight(to_tsvector('simple', dates), 'D')
+    ) STORED""",
+    "CREATE INDEX fax_search_document_idx ON fax_search_entry USING gin (document)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS fax_search_document_idx",
+    "ALTER TABLE fax_search_entry DROP COLUMN IF EXISTS document",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+create_fulltext = _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+drop_fulltext = _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('fax', '0010_ocr_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaxSearchEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('direction', models.CharField(max_length=10)),
+                ('faxed_at', models.DateTimeField()),
+                ('numbers', models.TextField(blank=True)),
+                ('names', models.TextField(blank=True)),
+                ('dates', models.CharField(blank=True, max_length=100)),
+                ('body', models.TextField(blank=True, help_text='OCR text')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tenant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='fax.tenant')),
+                ('transaction', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_entry', to='fax.faxtransaction')),
+                ('transmission', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_entry', to='fax.faxtransmission')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'fax_search_entry',
+                'indexes': [models.Index(fields=['user', '-faxed_at'], name='fax_search_user_idx'), models.Index(fields=['tenant', '-faxed_at'], name='fax_search_tenant_idx'), models.Index(fields=['faxed_at'], name='fax_search_date_idx')],
+            },
+        ),
+        # Other backends have no full-text index; search.py falls back to LIKE there
+        migrations.RunPython(create_fulltext, drop_fulltext),
+    ]
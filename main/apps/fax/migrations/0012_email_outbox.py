@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0011_fax_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaxEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(blank=True, help_text='received / confirmation', max_length=20)),
+                ('to_addresses', models.JSONField(default=list)),
+                ('cc_addresses', models.JSONField(blank=True, default=list)),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('attachments', models.JSONField(blank=True, default=list)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=5)),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('transmission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='emails', to='fax.faxtransmission')),
+            ],
+            options={
+                'db_table': 'fax_email',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='fax_email_outbox_idx')],
+            },
+        ),
+    ]
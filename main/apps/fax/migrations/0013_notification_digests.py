@@ -0,0 +1,42 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0012_email_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faxaccount',
+            name='digest_minutes',
+            field=models.IntegerField(default=5, help_text='Digest mode: results are collected this long before one summary goes out'),
+        ),
+        migrations.AddField(
+            model_name='faxaccount',
+            name='notification_mode',
+            field=models.CharField(choices=[('immediate', 'One notification per fax'), ('digest', 'Periodic digest')], default='immediate', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='FaxDigestItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(help_text='fax.sent / fax.failed', max_length=20)),
+                ('data', models.JSONField(default=dict, help_text='Same fields as the per-fax webhook payload')),
+                ('claim', models.UUIDField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_items', to='fax.faxaccount')),
+                ('transmission', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='fax.faxtransmission')),
+            ],
+            options={
+                'db_table': 'fax_digest_item',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['claim', 'account', 'created_at'], name='fax_digest_pending_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0013_notification_digests'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='faxbatchitem',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('dispatching', 'Dispatching'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+    ]
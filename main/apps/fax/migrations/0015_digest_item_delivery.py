@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0014_batch_item_dispatching'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faxdigestitem',
+            name='delivered_to',
+            field=models.JSONField(blank=True, default=list, help_text='Ids of webhooks that accepted the item'),
+        ),
+        migrations.AddField(
+            model_name='faxdigestitem',
+            name='emailed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
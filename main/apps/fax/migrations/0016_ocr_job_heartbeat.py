@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fax', '0015_digest_item_delivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='faxocrjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -5,6 +5,7 @@ try:
     from .models_complete import *
 except ImportError:
     pass
+from .models_extended import FaxAccount, FaxTransmission, FaxPage, FaxOCRJob, FaxContact, FaxWebhook, FaxEmail, FaxDigestItem, FaxLog
 from django.contrib.auth.models import User
 import uuid
 
@@ -46,6 +47,15 @@ class FaxTransaction(models.Model):
     class Meta:
         db_table = 'fax_transaction'
         ordering = ['-created_at']
+        indexes = [
+            # FaxListView: per-user listing, optionally narrowed by direction/status
+            models.Index(fields=['user', 'direction', 'status', '-created_at'], name='fax_txn_user_list_idx'),
+            models.Index(fields=['direction', 'status', '-created_at'], name='fax_txn_list_idx'),
+            models.Index(
+                fields=['created_at'], name='fax_txn_active_idx',
+                condition=models.Q(status__in=['pending', 'processing'])
+            ),
+        ]
         
     def __str__(self):
         return f"{self.direction} Fax {self.uuid} - {self.status}"
@@ -62,6 +72,7 @@ class FaxQueue(models.Model):
     
     job_uuid = models.CharField(max_length=80, blank=True, null=True)
     event_name = models.CharField(max_length=80, blank=True, null=True)
+    transport = models.CharField(max_length=20, blank=True, help_text='Engine that sent this item')
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -69,6 +80,160 @@ class FaxQueue(models.Model):
     class Meta:
         db_table = 'fax_queue'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['job_uuid'], name='fax_queue_job_uuid_idx'),
+            models.Index(
+                fields=['created_at'], name='fax_queue_pending_idx',
+                condition=models.Q(is_processed=False)
+            ),
+        ]
         
     def __str__(self):
-        return f"Queue for {self.transaction.uuid} to {self.recipient_number}"
\ No newline at end of file
+        return f"Queue for {self.transaction.uuid} to {self.recipient_number}"
+
+class FaxBatchJob(models.Model):
+    """Mail-merge style job: many (document, recipient) rows sent in one go"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    sender_number = models.CharField(max_length=20)
+    is_enhanced = models.BooleanField(default=False)
+    total_items = models.IntegerField(default=0)
+    
+    error_message = models.TextField(blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        db_table = 'fax_batch_job'
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"Batch {self.uuid} - {self.status} ({self.total_items} items)"
+    
+    def progress(self):
+        """Item counts per status, computed with a single aggregate query"""
+        counts = dict(self.items.values_list('status').annotate(n=models.Count('id')))
+        progress = {status: counts.get(status, 0) for status, _ in FaxBatchItem.STATUS_CHOICES}
+        progress['total'] = self.total_items
+        return progress
+
+
+class FaxBatchItem(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dispatching', 'Dispatching'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    job = models.ForeignKey(FaxBatchJob, on_delete=models.CASCADE, related_name='items')
+    row_number = models.IntegerField()
+    
+    filename = models.CharField(max_length=500)
+    recipient_number = models.CharField(max_length=20)
+    variables = models.JSONField(default=dict, blank=True, help_text='Cover page variables for this row')
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error_message = models.TextField(blank=True, null=True)
+    transaction = models.ForeignKey(FaxTransaction, on_delete=models.SET_NULL, null=True, blank=True, related_name='batch_items')
+    dispatched_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        db_table = 'fax_batch_item'
+        ordering = ['row_number']
+        indexes = [
+            models.Index(fields=['job', 'status', 'row_number']),
+        ]
+        
+    def __str__(self):
+        return f"Row {self.row_number} of {self.job.uuid} to {self.recipient_number}"
+
+
+class AdminBulkJob(models.Model):
+    """Admin action over a selection too large to run inside the request"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    action = models.CharField(max_length=50)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    object_ids = models.JSONField(default=list, help_text='Primary keys selected in the admin')
+    total_items = models.IntegerField(default=0)
+    processed_items = models.IntegerField(default=0)
+    affected_items = models.IntegerField(default=0, help_text='Rows actually changed')
+    
+    error_message = models.TextField(blank=True, null=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    completed_at = models.DateTimeField(blank=True, null=True)
+    
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        db_table = 'fax_admin_bulk_job'
+        ordering = ['-created_at']
+        
+    def __str__(self):
+        return f"{self.action} - {self.status} ({self.processed_items}/{self.total_items})"
+    
+    def progress(self):
+        if not self.total_items:
+            return 100
+        return int(self.processed_items * 100 / self.total_items)
+
+
+class FaxSearchEntry(models.Model):
+    """
+    Search document for one fax (a FaxTransaction or a FaxTransmission)
+    
+    The full-text index over numbers/names/dates/body is maintained by the
+    database itself: an FTS5 table kept in sync by triggers on SQLite, a
+    generated tsvector column with a GIN index on PostgreSQL (see the
+    0011_fax_search migration and search.py).
+    """
+    transaction = models.OneToOneField(FaxTransaction, on_delete=models.CASCADE, null=True, blank=True, related_name='search_entry')
+    transmission = models.OneToOneField(FaxTransmission, on_delete=models.CASCADE, null=True, blank=True, related_name='search_entry')
+    
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    tenant = models.ForeignKey('fax.Tenant', on_delete=models.SET_NULL, null=True, blank=True)
+    direction = models.CharField(max_length=10)
+    faxed_at = models.DateTimeField()
+    
+    numbers = models.TextField(blank=True)
+    names = models.TextField(blank=True)
+    dates = models.CharField(max_length=100, blank=True)
+    body = models.TextField(blank=True, help_text='OCR text')
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'fax_search_entry'
+        indexes = [
+            models.Index(fields=['user', '-faxed_at'], name='fax_search_user_idx'),
+            models.Index(fields=['tenant', '-faxed_at'], name='fax_search_tenant_idx'),
+            models.Index(fields=['faxed_at'], name='fax_search_date_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Search entry {self.transaction_id or self.transmission_id} ({self.direction})"
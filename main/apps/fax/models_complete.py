@@ -1,9 +1,26 @@
+from django.conf import settings
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
+from django.core.exceptions import ValidationError
 import uuid
 from datetime import datetime
 
+# Outbound engines a tenant or DID can be pinned to (see transports.py)
+FAX_TRANSPORT_CHOICES = [
+    ('', 'Automatic'),
+    ('freeswitch', 'FreeSWITCH'),
+    ('telnyx', 'Telnyx'),
+    ('fake', 'Fake (testing)'),
+]
+
+
+def fax_transport_choices():
+    """Choices offered in forms; the fake transport only with FAX_FAKE_TRANSPORT (defaults to DEBUG)"""
+    if getattr(settings, 'FAX_FAKE_TRANSPORT', settings.DEBUG):
+        return FAX_TRANSPORT_CHOICES
+    return [choice for choice in FAX_TRANSPORT_CHOICES if choice[0] != 'fake']
+
 
 class Tenant(models.Model):
     """Multi-tenant support for enterprise deployments"""
@@ -28,6 +45,8 @@ class Tenant(models.Model):
     max_users = models.IntegerField(default=10)
     max_dids = models.IntegerField(default=5)
     max_pages_per_month = models.IntegerField(default=1000)
+    fax_transport = models.CharField(max_length=20, choices=FAX_TRANSPORT_CHOICES, blank=True,
+                                     help_text='Preferred outbound transport; others are used on failover or overload')
     
     # Branding
     logo = models.ImageField(upload_to='tenant_logos/', blank=True, null=True)
@@ -70,6 +89,17 @@ class DID(models.Model):
     provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES, default='telnyx')
     provider_sid = models.CharField(max_length=100, blank=True, help_text='Provider-specific ID')
     
+    # Provisioning (number orders complete asynchronously)
+    PROVISIONING_CHOICES = [
+        ('active', 'Active'),
+        ('pending', 'Order pending'),
+        ('configuring', 'Configuring'),
+        ('failed', 'Failed'),
+    ]
+    provisioning_status = models.CharField(max_length=20, choices=PROVISIONING_CHOICES, default='active')
+    provider_order_id = models.CharField(max_length=100, blank=True, db_index=True)
+    provisioning_error = models.TextField(blank=True)
+    
     # Configuration
     description = models.CharField(max_length=255, blank=True)
     is_fax_enabled = models.BooleanField(default=True)
@@ -79,6 +109,8 @@ class DID(models.Model):
     # Routing
     route_to_email = models.EmailField(blank=True, help_text='Forward faxes to this email')
     route_to_extension = models.CharField(max_length=10, blank=True, help_text='Forward calls to extension')
+    fax_transport = models.CharField(max_length=20, choices=FAX_TRANSPORT_CHOICES, blank=True,
+                                     help_text='Overrides the tenant transport for faxes sent from this number')
     
     # Status
     is_active = models.BooleanField(default=True)
@@ -243,6 +275,13 @@ class InboundFaxSettings(models.Model):
     
     def __str__(self):
         return f"Inbound settings for {self.user.username}"
+    
+    def clean(self):
+        from .inbound_rules import compile_rules, RuleError
+        try:
+            compile_rules(self)
+        except RuleError as e:
+            raise ValidationError({'routing_rules': str(e)})
 
 
 class OutboundFaxSettings(models.Model):
@@ -344,4 +383,52 @@ class UserProfile(models.Model):
         ordering = ['user__username']
     
     def __str__(self):
-        return f"{self.user.get_full_name() or self.user.username} ({self.tenant.name})"
\ No newline at end of file
+        return f"{self.user.get_full_name() or self.user.username} ({self.tenant.name})"
+
+class RateDeck(models.Model):
+    """Per-destination pricing for outbound faxes"""
+    name = models.CharField(max_length=255)
+    tenant = models.ForeignKey(
+        Tenant, on_delete=models.CASCADE, null=True, blank=True, related_name='rate_decks',
+        help_text='Leave empty for the global deck used by every tenant'
+    )
+    
+    default_rate = models.DecimalField(
+        max_digits=10, decimal_places=4, default=0.20,
+        help_text='Per-page rate when no prefix matches'
+    )
+    currency = models.CharField(max_length=3, default='USD')
+    
+    # Status
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'fax_rate_deck'
+        verbose_name = 'Rate Deck'
+        verbose_name_plural = 'Rate Decks'
+        ordering = ['name']
+    
+    def __str__(self):
+        return f"{self.name} ({self.tenant.name if self.tenant else 'Global'})"
+
+
+class Rate(models.Model):
+    """Per-page rate for a destination prefix"""
+    deck = models.ForeignKey(RateDeck, on_delete=models.CASCADE, related_name='rates')
+    prefix = models.CharField(
+        max_length=15,
+        validators=[RegexValidator(regex=r'^\d+$', message='Prefix must contain digits only')],
+        help_text='E.164 destination prefix without "+", e.g. 1, 44, 4420'
+    )
+    description = models.CharField(max_length=255, blank=True)
+    rate_per_page = models.DecimalField(max_digits=10, decimal_places=4)
+    
+    class Meta:
+        db_table = 'fax_rate'
+        unique_together = ['deck', 'prefix']
+        ordering = ['prefix']
+    
+    def __str__(self):
+        return f"{self.prefix} @ {self.rate_per_page}"
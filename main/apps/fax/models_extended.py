@@ -1,5 +1,8 @@
-from django.db import models
+from collections import Counter
+from django.db import models, connection
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
 import uuid
 import hashlib
 from datetime import datetime
@@ -28,6 +31,14 @@ class FaxAccount(models.Model):
     send_fax_to_email = models.BooleanField(default=True)
     email_format = models.CharField(max_length=10, choices=[('pdf', 'PDF'), ('tiff', 'TIFF')], default='pdf')
     
+    # Outbound result notifications (confirmation email and sent/failed webhooks)
+    NOTIFICATION_MODE_CHOICES = [
+        ('immediate', 'One notification per fax'),
+        ('digest', 'Periodic digest'),
+    ]
+    notification_mode = models.CharField(max_length=10, choices=NOTIFICATION_MODE_CHOICES, default='immediate')
+    digest_minutes = models.IntegerField(default=5, help_text='Digest mode: results are collected this long before one summary goes out')
+    
     # Account status
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -109,6 +120,13 @@ class FaxTransmission(models.Model):
             models.Index(fields=['account', 'direction', 'status']),
             models.Index(fields=['sender_number', 'recipient_number']),
             models.Index(fields=['queued_at']),
+            # Event scripts resolve the transmission from the FreeSWITCH call UUID
+            models.Index(fields=['call_uuid'], name='fax_tx_call_uuid_idx'),
+            # Only in-flight rows, for the dispatcher/stuck-call scans
+            models.Index(
+                fields=['queued_at'], name='fax_tx_inflight_idx',
+                condition=models.Q(status__in=['queued', 'dialing', 'negotiating', 'transmitting'])
+            ),
         ]
     
     def calculate_cost(self):
@@ -116,16 +134,10 @@ class FaxTransmission(models.Model):
         if self.direction == 'inbound':
             return 0
         
-        # Basic pricing model
-        base_rate = 0.10  # $0.10 per page
-        if self.recipient_number.startswith('1'):  # US/Canada
-            rate = base_rate
-        elif self.recipient_number.startswith('44'):  # UK
-            rate = base_rate * 1.5
-        else:  # International
-            rate = base_rate * 2
-        
-        return self.pages * rate
+        # Longest-prefix match against the tenant's rate deck
+        from .rating import get_rate_table, tenant_id_for_account
+        table = get_rate_table(tenant_id_for_account(self.account))
+        return table.cost(self.recipient_number, self.pages)
     
     def generate_file_hash(self):
         """Generate SHA256 hash of the fax file"""
@@ -155,12 +167,122 @@ class FaxPage(models.Model):
     quality_score = models.IntegerField(default=100)  # 0-100
     error_count = models.IntegerField(default=0)
     
+    # Filled in by run_ocr_jobs when the account has OCR enabled
+    ocr_text = models.TextField(blank=True)
+    
     class Meta:
         db_table = 'fax_page'
         unique_together = ['transmission', 'page_number']
         ordering = ['page_number']
 
 
+class FaxOCRJob(models.Model):
+    """OCR of a received fax, run by run_ocr_jobs outside the RX pipeline"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    transmission = models.ForeignKey(FaxTransmission, on_delete=models.CASCADE, related_name='ocr_jobs')
+    tenant = models.ForeignKey('fax.Tenant', on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    language = models.CharField(max_length=10, default='eng')
+    searchable_pdf = models.BooleanField(default=True)
+    
+    total_pages = models.IntegerField(default=0)
+    processed_pages = models.IntegerField(default=0)
+    output_path = models.CharField(max_length=500, blank=True, help_text='Searchable PDF')
+    error_message = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the runner while the job is in flight
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'fax_ocr_job'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='fax_ocr_job_status_idx'),
+        ]
+    
+    def __str__(self):
+        return f"OCR {self.transmission_id} - {self.status} ({self.processed_pages}/{self.total_pages})"
+
+
+class FaxContactManager(models.Manager):
+    
+    def record_usage(self, account, numbers, names=None, create_missing=True):
+        """
+        Count one use of each number in `numbers` for `account`
+        
+        All recipients of a broadcast are written with a single
+        INSERT ... ON CONFLICT DO UPDATE (ON DUPLICATE KEY UPDATE on MySQL),
+        so concurrent completions can't race the (account, fax_number)
+        unique constraint. With create_missing=False only existing
+        contacts are touched. `names` optionally maps number -> name for
+        contacts that get created.
+        """
+        counts = Counter(n for n in numbers if n)
+        if not counts:
+            return
+        now = timezone.now()
+        
+        if not create_missing:
+            by_count = {}
+            for number, count in counts.items():
+                by_count.setdefault(count, []).append(number)
+            for count, batch in by_count.items():
+                self.filter(account=account, fax_number__in=batch).update(
+                    usage_count=F('usage_count') + count,
+                    last_used=now,
+                    updated_at=now
+                )
+            return
+        
+        names = names or {}
+        if connection.vendor not in ('postgresql', 'sqlite', 'mysql'):
+            for number, count in counts.items():
+                updated = self.filter(account=account, fax_number=number).update(
+                    usage_count=F('usage_count') + count, last_used=now, updated_at=now
+                )
+                if not updated:
+                    self.create(account=account, fax_number=number, name=names.get(number) or 'Auto-added',
+                                last_used=now, usage_count=count)
+            return
+        
+        qn = connection.ops.quote_name
+        table = qn(self.model._meta.db_table)
+        columns = ['account_id', 'name', 'fax_number', 'email', 'company', 'notes',
+                   'last_used', 'usage_count', 'created_at', 'updated_at']
+        stamp = connection.ops.adapt_datetimefield_value(now)
+        row_sql = '(%s)' % ', '.join(['%s'] * len(columns))
+        
+        params = []
+        for number, count in counts.items():
+            params.extend([account.pk, names.get(number) or 'Auto-added', number, '', '', '',
+                           stamp, count, stamp, stamp])
+        
+        sql = 'INSERT INTO %s (%s) VALUES %s' % (
+            table, ', '.join(qn(c) for c in columns), ', '.join([row_sql] * len(counts))
+        )
+        if connection.vendor == 'mysql':
+            sql += (' ON DUPLICATE KEY UPDATE usage_count = usage_count + VALUES(usage_count),'
+                    ' last_used = VALUES(last_used), updated_at = VALUES(updated_at)')
+        else:
+            sql += (' ON CONFLICT (account_id, fax_number) DO UPDATE SET'
+                    ' usage_count = %s.usage_count + EXCLUDED.usage_count,'
+                    ' last_used = EXCLUDED.last_used, updated_at = EXCLUDED.updated_at' % table)
+        
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+
+
 class FaxContact(models.Model):
     """Address book for frequently used fax numbers"""
     account = models.ForeignKey(FaxAccount, on_delete=models.CASCADE, related_name='contacts')
@@ -177,6 +299,8 @@ class FaxContact(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = FaxContactManager()
+    
     class Meta:
         db_table = 'fax_contact'
         unique_together = ['account', 'fax_number']
@@ -207,6 +331,69 @@ class FaxWebhook(models.Model):
         db_table = 'fax_webhook'
 
 
+class FaxEmail(models.Model):
+    """Outgoing notification email, sent by send_fax_emails outside the fax pipelines"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    transmission = models.ForeignKey(FaxTransmission, on_delete=models.CASCADE, null=True, blank=True, related_name='emails')
+    kind = models.CharField(max_length=20, blank=True, help_text='received / confirmation')
+    
+    to_addresses = models.JSONField(default=list)
+    cc_addresses = models.JSONField(default=list, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    # [[path, filename, mimetype], ...]; files are read when the email is sent
+    attachments = models.JSONField(default=list, blank=True)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'fax_email'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='fax_email_outbox_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to_addresses)} ({self.status})"
+
+
+class FaxDigestItem(models.Model):
+    """One outbound result waiting for its account's next digest (see send_fax_digests)"""
+    account = models.ForeignKey(FaxAccount, on_delete=models.CASCADE, related_name='digest_items')
+    transmission = models.ForeignKey(FaxTransmission, on_delete=models.CASCADE, null=True, blank=True)
+    event = models.CharField(max_length=20, help_text='fax.sent / fax.failed')
+    data = models.JSONField(default=dict, help_text='Same fields as the per-fax webhook payload')
+    
+    # Set when a digest run takes the item; the item is deleted once the digest is out
+    claim = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    # What already went out, so a retried digest doesn't repeat it
+    emailed = models.BooleanField(default=False)
+    delivered_to = models.JSONField(default=list, blank=True, help_text='Ids of webhooks that accepted the item')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'fax_digest_item'
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['claim', 'account', 'created_at'], name='fax_digest_pending_idx'),
+        ]
+
+
 class FaxLog(models.Model):
     """Detailed logging for troubleshooting"""
     transmission = models.ForeignKey(FaxTransmission, on_delete=models.CASCADE, related_name='logs')
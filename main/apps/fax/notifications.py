@@ -0,0 +1,228 @@
+"""
+Fax Notifications
+Signed webhook delivery and per-account digests of outbound fax results
+"""
+
+import json
+import hmac
+import time
+import hashlib
+import uuid as uuid_lib
+from datetime import timedelta
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+from .models_extended import FaxAccount, FaxWebhook, FaxDigestItem
+from .mailer import queue_email
+
+# A digest goes out early once this many results are waiting
+DIGEST_MAX_ITEMS = getattr(settings, 'FAX_DIGEST_MAX_ITEMS', 500)
+# Claimed items older than this are assumed to belong to a dead runner, or
+# are waiting for a webhook that failed; either way they are taken again
+DIGEST_STALE_AFTER = timedelta(minutes=getattr(settings, 'FAX_DIGEST_STALE_MINUTES', 15))
+# Results a webhook still hasn't accepted after this are dropped
+DIGEST_RETRY_WINDOW = timedelta(hours=getattr(settings, 'FAX_DIGEST_RETRY_HOURS', 24))
+WEBHOOK_TIMEOUT = 10
+
+
+def post_webhook(webhook, payload):
+    """
+    POST `payload` to a webhook, signed with its secret in X-Fax-Signature
+
+    Returns True on HTTP 200. last_triggered/failure_count are updated
+    either way; request errors are re-raised after counting the failure.
+    """
+    body = json.dumps(payload)
+    signature = hmac.new(str(webhook.secret_key).encode(), body.encode(), hashlib.sha256).hexdigest()
+    ok = False
+    try:
+        response = requests.post(
+            webhook.url,
+            data=body,
+            headers={'Content-Type': 'application/json', 'X-Fax-Signature': signature},
+            timeout=WEBHOOK_TIMEOUT
+        )
+        ok = response.status_code == 200
+    finally:
+        if ok:
+            webhook.last_triggered = timezone.now()
+            webhook.failure_count = 0
+        else:
+            webhook.failure_count += 1
+        webhook.save(update_fields=['last_triggered', 'failure_count'])
+    return ok
+
+
+def buffer_result(account, transmission, event, data):
+    """Hold one result for the account's next digest; a single INSERT"""
+    return FaxDigestItem.objects.create(account=account, transmission=transmission, event=event, data=data)
+
+
+def digest_email_body(account, items):
+    sent = [item for item in items if item.event == 'fax.sent']
+    failed = [item for item in items if item.event != 'fax.sent']
+    since = timezone.localtime(items[0].created_at).strftime('%Y-%m-%d %H:%M')
+    lines = [
+        f"Fax results for {account.fax_number} since {since}",
+        "",
+        f"Sent: {len(sent)}",
+        f"Failed: {len(failed)}",
+        f"Pages: {sum(item.data.get('pages', 0) for item in items)}",
+        f"Cost: ${sum(item.data.get('cost', 0) for item in items):.2f}",
+    ]
+    for title, group in (("Failed", failed), ("Sent", sent)):
+        if group:
+            lines += ["", f"{title}:"]
+            for item in group:
+                data = item.data
+                line = f"  {data.get('to', ''):<16} {data.get('pages', 0):>3} pages  ${data.get('cost', 0):.2f}  {data.get('uuid', '')}"
+                if data.get('error'):
+                    line += f"  {data['error']}"
+                lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+class DigestRunner:
+    """
+    Flush digest buffers of accounts in digest notification mode
+
+    An account is due once its oldest waiting result is digest_minutes
+    old, or DIGEST_MAX_ITEMS results are waiting. Each flush sends one
+    summary email (through the outbox) and one 'fax.digest' webhook call
+    per active webhook, carrying the results that webhook subscribes to.
+    
+    Items are deleted once emailed and accepted by every webhook that
+    subscribes to them. Items a webhook didn't accept stay claimed and are
+    retried, for that webhook only, when the claim goes stale.
+    """
+
+    def __init__(self, stdout=None):
+        self.stdout = stdout
+        self.stats = {'digests': 0, 'results': 0}
+
+    def _write(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def requeue_stale(self):
+        return FaxDigestItem.objects.filter(
+            claim__isnull=False, claimed_at__lt=timezone.now() - DIGEST_STALE_AFTER
+        ).update(claim=None, claimed_at=None)
+
+    def due_accounts(self):
+        """Account ids with a digest due, from one aggregate query"""
+        now = timezone.now()
+        rows = (
+            FaxDigestItem.objects.filter(claim__isnull=True)
+            .values('account_id', 'account__digest_minutes')
+            .annotate(oldest=Min('created_at'), waiting=Count('id'))
+        )
+        return [
+            row['account_id'] for row in rows
+            if row['waiting'] >= DIGEST_MAX_ITEMS
+            or row['oldest'] <= now - timedelta(minutes=row['account__digest_minutes'])
+        ]
+
+    def claim(self, account_id):
+        token = uuid_lib.uuid4()
+        pks = list(
+            FaxDigestItem.objects.filter(account_id=account_id, claim__isnull=True)
+            .order_by('created_at').values_list('pk', flat=True)[:DIGEST_MAX_ITEMS]
+        )
+        FaxDigestItem.objects.filter(pk__in=pks, claim__isnull=True).update(claim=token, claimed_at=timezone.now())
+        return token, list(FaxDigestItem.objects.filter(claim=token).order_by('created_at'))
+
+    @staticmethod
+    def subscribes(webhook, item):
+        return webhook.on_sent if item.event == 'fax.sent' else webhook.on_failed
+
+    def flush(self, account, items):
+        """Email and post the items not sent yet; returns the items a webhook still has to accept"""
+        unsent = [item for item in items if not item.emailed]
+        if unsent:
+            sent = sum(1 for item in unsent if item.event == 'fax.sent')
+            failed = len(unsent) - sent
+            with transaction.atomic():
+                if account.send_fax_to_email and account.notification_email:
+                    queue_email(
+                        to=[account.notification_email],
+                        subject=f"Fax summary: {sent} sent, {failed} failed",
+                        body=digest_email_body(account, unsent),
+                        kind='digest'
+                    )
+                FaxDigestItem.objects.filter(pk__in=[item.pk for item in unsent]).update(emailed=True)
+            for item in unsent:
+                item.emailed = True
+
+        webhooks = list(FaxWebhook.objects.filter(account=account, is_active=True))
+        delivered = {}
+        for webhook in webhooks:
+            waiting = [
+                item for item in items
+                if self.subscribes(webhook, item) and webhook.pk not in item.delivered_to
+            ]
+            if not waiting:
+                continue
+            results = [item.data for item in waiting]
+            payload = {
+                'event': 'fax.digest',
+                'timestamp': timezone.now().isoformat(),
+                'data': {
+                    'count': len(results),
+                    'sent': sum(1 for data in results if data.get('status') == 'completed'),
+                    'failed': sum(1 for data in results if data.get('status') != 'completed'),
+                    'results': results,
+                }
+            }
+            try:
+                ok = post_webhook(webhook, payload)
+            except Exception as e:
+                ok = False
+                self._write(f"Digest webhook {webhook.url} failed: {e}")
+            if not ok:
+                continue
+            for item in waiting:
+                item.delivered_to.append(webhook.pk)
+                delivered[item.pk] = item
+        if delivered:
+            FaxDigestItem.objects.bulk_update(delivered.values(), ['delivered_to'])
+
+        return [
+            item for item in items
+            if any(self.subscribes(webhook, item) and webhook.pk not in item.delivered_to for webhook in webhooks)
+        ]
+
+    def run_once(self):
+        """Flush every due account; returns the number of digests sent"""
+        self.requeue_stale()
+        flushed = 0
+        for account_id in self.due_accounts():
+            try:
+                token, items = self.claim(account_id)
+                if not items:
+                    continue
+                undelivered = self.flush(FaxAccount.objects.get(pk=account_id), items)
+                expired = timezone.now() - DIGEST_RETRY_WINDOW
+                keep = [item.pk for item in undelivered if item.created_at > expired]
+                if len(keep) < len(undelivered):
+                    self._write(f"Dropping {len(undelivered) - len(keep)} digest results no webhook of account {account_id} accepted")
+                # The rest keep their claim and are retried once it goes stale
+                FaxDigestItem.objects.filter(claim=token).exclude(pk__in=keep).delete()
+            except Exception as e:
+                # Claimed items are retried once the claim goes stale
+                self._write(f"Digest for account {account_id} failed: {e}")
+                continue
+            flushed += 1
+            self.stats['digests'] += 1
+            self.stats['results'] += len(items)
+        return flushed
+
+    def run(self, loop=False, interval=30):
+        while True:
+            self.run_once()
+            if not loop:
+                break
+            time.sleep(interval)
+        self._write(f"Digests sent: {self.stats['digests']} covering {self.stats['results']} results")
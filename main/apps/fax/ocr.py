@@ -0,0 +1,207 @@
+"""
+Inbound Fax OCR
+Queue OCR for received faxes and run it in a bounded process pool, one page per task
+"""
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+from .models_extended import FaxPage, FaxOCRJob
+from .ocr_engine import ocr_page, merge_pdfs
+from .search import index_transmissions
+
+OCR_WORKERS = getattr(settings, 'FAX_OCR_WORKERS', max((os.cpu_count() or 2) - 1, 1))
+# Jobs of one tenant processed at the same time, across all runners
+OCR_TENANT_CONCURRENCY = getattr(settings, 'FAX_OCR_TENANT_CONCURRENCY', 2)
+OCR_PAGE_TIMEOUT = getattr(settings, 'FAX_OCR_PAGE_TIMEOUT', 120)
+TESSERACT_CMD = getattr(settings, 'FAX_TESSERACT_CMD', 'tesseract')
+# Processing jobs without a heartbeat for this long are assumed to belong to a dead runner
+OCR_STALE_AFTER = timedelta(minutes=getattr(settings, 'FAX_OCR_STALE_MINUTES', 30))
+OCR_HEARTBEAT_INTERVAL = timedelta(minutes=1)
+
+
+def enqueue_ocr(transmission, route):
+    """Queue OCR for a received fax; a single INSERT, safe on the RX path"""
+    return FaxOCRJob.objects.create(
+        transmission=transmission,
+        tenant_id=route.tenant_id,
+        language=route.ocr_language or 'eng',
+        searchable_pdf=route.searchable_pdf,
+        total_pages=transmission.pages
+    )
+
+
+def searchable_pdf_path(transmission):
+    return os.path.join(os.path.dirname(transmission.file_path), 'searchable.pdf')
+
+
+class OCRRunner:
+    """
+    Feed OCR pages to a process pool, never exceeding the tenant cap
+
+    Up to `workers` jobs are in progress at once; every page of a claimed
+    job is submitted as its own task, so one long fax does not hold the
+    pool while short ones wait. A job finishes when all of its pages have
+    come back: page text is written with one bulk_update and, when asked
+    for, the page PDFs are merged into a searchable PDF. In-flight jobs get
+    a heartbeat every OCR_HEARTBEAT_INTERVAL, so only jobs of a dead
+    runner go stale, however long they take.
+    """
+
+    def __init__(self, workers=OCR_WORKERS, tenant_limit=OCR_TENANT_CONCURRENCY, stdout=None):
+        self.workers = workers
+        self.tenant_limit = tenant_limit
+        self.stdout = stdout
+        self.active = {}    # job pk -> {'job', 'pages', 'results', 'errors'}
+        self.futures = {}   # future -> (job pk, page)
+        self.last_beat = None
+
+    def _write(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def requeue_stale(self):
+        cutoff = timezone.now() - OCR_STALE_AFTER
+        return FaxOCRJob.objects.filter(status='processing').filter(
+            Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+        ).update(status='pending', started_at=None, heartbeat_at=None, processed_pages=0)
+
+    def heartbeat(self):
+        """Mark this runner's jobs alive (one UPDATE per interval), then requeue other runners' stale ones"""
+        now = timezone.now()
+        if self.last_beat and now - self.last_beat < OCR_HEARTBEAT_INTERVAL:
+            return
+        self.last_beat = now
+        if self.active:
+            FaxOCRJob.objects.filter(pk__in=list(self.active), status='processing').update(heartbeat_at=now)
+        self.requeue_stale()
+
+    def claim(self, limit):
+        """
+        Claim up to `limit` of the oldest pending jobs whose tenant is under its cap
+
+        Capped tenants are excluded in the query, so one tenant's backlog
+        can't fill the window and starve the others.
+        """
+        busy = dict(
+            FaxOCRJob.objects.filter(status='processing')
+            .values_list('tenant_id').annotate(count=Count('id'))
+        )
+        claimed = []
+        while len(claimed) < limit:
+            capped = [tenant_id for tenant_id, count in busy.items() if count >= self.tenant_limit]
+            pending = FaxOCRJob.objects.filter(status='pending').exclude(
+                tenant_id__in=[tenant_id for tenant_id in capped if tenant_id is not None]
+            )
+            if None in capped:
+                pending = pending.exclude(tenant__isnull=True)
+            jobs = list(pending.select_related('transmission').order_by('created_at')[:limit - len(claimed)])
+            if not jobs:
+                break
+            for job in jobs:
+                if busy.get(job.tenant_id, 0) >= self.tenant_limit:
+                    # Capped by an earlier job of this batch; the next query skips the tenant
+                    continue
+                now = timezone.now()
+                if FaxOCRJob.objects.filter(pk=job.pk, status='pending').update(
+                    status='processing', started_at=now, heartbeat_at=now
+                ):
+                    busy[job.tenant_id] = busy.get(job.tenant_id, 0) + 1
+                    job.status = 'processing'
+                    claimed.append(job)
+        return claimed
+
+    def _submit(self, pool, job):
+        pages = list(FaxPage.objects.filter(transmission_id=job.transmission_id).order_by('page_number'))
+        self.active[job.pk] = {'job': job, 'pages': pages, 'results': {}, 'errors': []}
+        if not pages:
+            self._finish(job.pk)
+            return
+        for page in pages:
+            future = pool.submit(
+                ocr_page, page.file_path, job.language, job.searchable_pdf, TESSERACT_CMD, OCR_PAGE_TIMEOUT
+            )
+            self.futures[future] = (job.pk, page)
+
+    def _collect(self, future):
+        job_pk, page = self.futures.pop(future)
+        state = self.active[job_pk]
+        try:
+            state['results'][page.page_number] = future.result()
+        except Exception as e:
+            state['errors'].append(f"page {page.page_number}: {e}")
+        if len(state['results']) + len(state['errors']) == len(state['pages']):
+            self._finish(job_pk)
+
+    def _finish(self, job_pk):
+        state = self.active.pop(job_pk)
+        job, pages, results = state['job'], state['pages'], state['results']
+
+        # Errors here fail this job only; the runner keeps going
+        for page in pages:
+            if page.page_number in results:
+                page.ocr_text = results[page.page_number][0]
+        saved, index_error = True, None
+        try:
+            FaxPage.objects.bulk_update([page for page in pages if page.page_number in results], ['ocr_text'])
+        except Exception as e:
+            saved = False
+            state['errors'].append(f"save: {e}")
+        if results and saved:
+            try:
+                index_transmissions([job.transmission])
+            except Exception as e:
+                index_error = f"index: {e}"
+
+        page_pdfs = [results[number][1] for number in sorted(results) if results[number][1]]
+        if job.searchable_pdf and page_pdfs:
+            if state['errors'] or not saved:
+                # A PDF missing pages would be worse than none; keep the plain one
+                for path in page_pdfs:
+                    os.remove(path)
+            else:
+                try:
+                    job.output_path = merge_pdfs(page_pdfs, searchable_pdf_path(job.transmission))
+                except Exception as e:
+                    state['errors'].append(f"merge: {e}")
+        if index_error:
+            state['errors'].append(index_error)
+
+        job.processed_pages = len(results) if saved else 0
+        job.error_message = "; ".join(state['errors'])
+        job.status = 'failed' if pages and not job.processed_pages else 'completed'
+        job.completed_at = timezone.now()
+        try:
+            job.save(update_fields=[
+                'status', 'processed_pages', 'output_path', 'error_message', 'completed_at', 'updated_at'
+            ])
+        except Exception as e:
+            # Left processing without a heartbeat, so it is retried once stale
+            self._write(f"OCR job #{job.pk} could not be saved: {e}")
+            return
+        self._write(f"OCR job #{job.pk} {job.status}: {job.processed_pages}/{len(pages)} pages")
+
+    def run(self, loop=False, interval=10):
+        # Spawned workers never inherit the parent's database connections
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            while True:
+                self.heartbeat()
+                if len(self.active) < self.workers:
+                    for job in self.claim(self.workers - len(self.active)):
+                        self._submit(pool, job)
+
+                if not self.futures:
+                    if not loop:
+                        return
+                    time.sleep(interval)
+                    continue
+
+                done, _ = wait(list(self.futures), timeout=interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._collect(future)
@@ -0,0 +1,50 @@
+"""
+OCR Engine
+Tesseract calls run inside the OCR process pool; no Django imports so spawned workers start fast
+"""
+
+import os
+import subprocess
+
+
+def ocr_page(image_path, language='eng', searchable=True, command='tesseract', timeout=120):
+    """
+    OCR one page image
+
+    Returns (text, pdf_path). With `searchable`, Tesseract also renders the
+    page as a PDF with an invisible text layer next to the image;
+    pdf_path is None otherwise. Raises on Tesseract errors or timeouts.
+    """
+    base = os.path.splitext(image_path)[0] + '.ocr'
+    outputs = ['txt', 'pdf'] if searchable else ['txt']
+    subprocess.run(
+        [command, image_path, base, '-l', language] + outputs,
+        check=True,
+        timeout=timeout,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+    with open(base + '.txt', encoding='utf-8', errors='replace') as f:
+        text = f.read().strip()
+    os.remove(base + '.txt')
+    return text, (base + '.pdf' if searchable else None)
+
+
+def merge_pdfs(page_paths, output_path):
+    """Concatenate single-page PDFs in order and remove them afterwards"""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for path in page_paths:
+        for page in PdfReader(path).pages:
+            writer.add_page(page)
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        writer.write(f)
+    os.replace(tmp_path, output_path)
+
+    for path in page_paths:
+        os.remove(path)
+    return output_path
@@ -0,0 +1,206 @@
+"""
+Destination Rating for Outbound Faxes
+Longest-prefix-match rate lookup built from RateDeck/Rate records
+"""
+
+import csv
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection, transaction
+from .models_complete import RateDeck, Rate
+
+
+RATE_VERSION_KEY = 'fax:rates:version'
+
+# Used when no active deck exists at all (previous hard-coded pricing)
+FALLBACK_RATES = {
+    '1': Decimal('0.10'),   # US/Canada
+    '44': Decimal('0.15'),  # UK
+}
+FALLBACK_DEFAULT_RATE = Decimal('0.20')
+
+# tenant_id -> (version, RateTable), per process
+_tables = {}
+
+
+class PrefixTrie:
+    """Digit trie returning the value stored at the longest matching prefix"""
+
+    __slots__ = ('root',)
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prefix, value):
+        node = self.root
+        for digit in prefix:
+            node = node.setdefault(digit, {})
+        node[None] = value
+
+    def longest_match(self, number):
+        node = self.root
+        match = node.get(None)
+        for digit in number:
+            node = node.get(digit)
+            if node is None:
+                break
+            if None in node:
+                match = node[None]
+        return match
+
+
+class RateTable:
+    """Compiled rates for one tenant (global deck overlaid with tenant decks)"""
+
+    def __init__(self, default_rate=FALLBACK_DEFAULT_RATE):
+        self.trie = PrefixTrie()
+        self.default_rate = default_rate
+
+    def rate_for(self, number):
+        """Per-page rate for a destination number"""
+        rate = self.trie.longest_match(normalize_number(number))
+        return self.default_rate if rate is None else rate
+
+    def cost(self, number, pages):
+        return self.rate_for(number) * pages
+
+
+def normalize_number(number):
+    """Strip everything but digits so '+44 20 ...' matches prefix '4420'"""
+    return ''.join(ch for ch in (number or '') if ch.isdigit())
+
+
+def get_rate_version():
+    version = cache.get(RATE_VERSION_KEY)
+    if version is None:
+        cache.add(RATE_VERSION_KEY, 1, timeout=None)
+        version = cache.get(RATE_VERSION_KEY, 1)
+    return version
+
+
+def invalidate_rates():
+    """Drop compiled tables everywhere; called when a deck or rate changes"""
+    try:
+        cache.incr(RATE_VERSION_KEY)
+    except ValueError:
+        cache.set(RATE_VERSION_KEY, 1, timeout=None)
+    _tables.clear()
+
+
+def build_rate_table(tenant_id=None):
+    """Load the global deck(s) and, when given, the tenant's overrides into a trie"""
+    decks = list(
+        RateDeck.objects.filter(is_active=True, tenant__isnull=True)
+    ) + list(
+        RateDeck.objects.filter(is_active=True, tenant_id=tenant_id) if tenant_id else []
+    )
+
+    if not decks:
+        table = RateTable()
+        for prefix, rate in FALLBACK_RATES.items():
+            table.trie.insert(prefix, rate)
+        return table
+
+    # Tenant decks come last so their rates and default win
+    table = RateTable(default_rate=decks[-1].default_rate)
+    deck_order = {deck.pk: index for index, deck in enumerate(decks)}
+    rates = Rate.objects.filter(deck_id__in=list(deck_order)).values_list('deck_id', 'prefix', 'rate_per_page')
+    for deck_id, prefix, rate in sorted(rates, key=lambda row: deck_order[row[0]]):
+        table.trie.insert(prefix, rate)
+    return table
+
+
+def get_rate_table(tenant_id=None):
+    """Cached RateTable for a tenant, rebuilt when the rate version changes"""
+    version = get_rate_version()
+    cached = _tables.get(tenant_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    table = build_rate_table(tenant_id)
+    _tables[tenant_id] = (version, table)
+    return table
+
+
+def import_rates(deck, rows, replace=True):
+    """
+    Load (prefix, rate_per_page[, description]) rows into a deck
+
+    `rows` may be any iterable of sequences, e.g. csv.reader over an upload.
+    Rows whose prefix is not numeric (headers, blanks) are skipped.
+    Returns the number of rates written.
+    """
+    rates = {}
+    for row in rows:
+        if len(row) < 2:
+            continue
+        prefix = normalize_number(row[0])
+        if not prefix or prefix != row[0].strip().lstrip('+'):
+            continue
+        rates[prefix] = Rate(
+            deck=deck,
+            prefix=prefix,
+            rate_per_page=Decimal(row[1].strip()),
+            description=row[2].strip() if len(row) > 2 else ''
+        )
+
+    with transaction.atomic():
+        if replace:
+            deck.rates.all().delete()
+            Rate.objects.bulk_create(rates.values(), batch_size=5000)
+        else:
+            Rate.objects.bulk_create(
+                rates.values(), batch_size=5000,
+                update_conflicts=True,
+                # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+                unique_fields=['deck', 'prefix'] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=['rate_per_page', 'description']
+            )
+        # bulk_create bypasses post_save, so invalidate explicitly
+        transaction.on_commit(invalidate_rates)
+
+    return len(rates)
+
+
+def import_rates_csv(deck, path, replace=True):
+    """Load a prefix,rate[,description] CSV file into a deck"""
+    with open(path, newline='') as f:
+        return import_rates(deck, csv.reader(f), replace=replace)
+
+
+def tenant_id_for_account(account):
+    """Tenant of a FaxAccount's user, if the user has a fax profile"""
+    profile = getattr(account.user, 'fax_profile', None) if account else None
+    return profile.tenant_id if profile else None
+
+
+def recalculate_costs(queryset, batch_size=2000):
+    """
+    Re-rate outbound transmissions in bulk
+
+    Streams (pk, number, pages, tenant) tuples and writes costs back with
+    bulk_update, so a month of records costs a handful of queries per batch.
+    Returns the number of transmissions updated.
+    """
+    model = queryset.model
+    rows = queryset.filter(direction='outbound').values_list(
+        'pk', 'recipient_number', 'pages', 'account__user__fax_profile__tenant_id'
+    ).iterator(chunk_size=batch_size)
+
+    tables = {}
+    updated = 0
+    batch = []
+    for pk, number, pages, tenant_id in rows:
+        if tenant_id not in tables:
+            tables[tenant_id] = get_rate_table(tenant_id)
+        batch.append(model(pk=pk, cost=tables[tenant_id].cost(number, pages)))
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['cost'])
+            updated += len(batch)
+            batch = []
+
+    if batch:
+        model.objects.bulk_update(batch, ['cost'])
+        updated += len(batch)
+
+    return updated
@@ -0,0 +1,176 @@
+"""
+Fax History Retention
+Bounded batch deletes for fax_log/fax_transmission and per-account file cleanup
+"""
+
+import os
+import shutil
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import FaxSearchEntry
+from .models_extended import FaxTransmission, FaxPage, FaxLog, FaxEmail, FaxOCRJob
+from .models_complete import InboundFaxSettings
+from .coverpage import COVER_DIR, COVER_RETENTION_DAYS
+
+LOG_RETENTION_DAYS = getattr(settings, 'FAX_LOG_RETENTION_DAYS', 30)
+# Sent and failed outbox emails; pending ones are never purged
+EMAIL_RETENTION_DAYS = getattr(settings, 'FAX_EMAIL_RETENTION_DAYS', 30)
+TRANSMISSION_RETENTION_DAYS = getattr(settings, 'FAX_TRANSMISSION_RETENTION_DAYS', 365)
+# Used for accounts without InboundFaxSettings (same as the model default)
+DEFAULT_ARCHIVE_DAYS = getattr(settings, 'FAX_DEFAULT_ARCHIVE_DAYS', 90)
+
+
+def fax_file_dirs(transmission_uuid, completed_at=None):
+    """Directories the RX/TX processors create for a transmission"""
+    media = os.path.join(settings.MEDIA_ROOT, 'fax')
+    dirs = [os.path.join(media, 'rx', str(transmission_uuid))]
+    if completed_at:
+        # TXFaxProcessor archives under the local date the fax completed
+        day = timezone.localtime(completed_at).strftime('%Y/%m/%d')
+        dirs.append(os.path.join(media, 'archive', day, str(transmission_uuid)))
+    return dirs
+
+
+class RetentionJob:
+    """
+    Purge old fax history in bounded batches
+
+    Every batch is one SELECT of primary keys plus one DELETE (or UPDATE),
+    followed by `sleep` seconds so replicas and autovacuum can keep up.
+    Counters are collected in `self.stats`.
+    """
+
+    def __init__(self, batch_size=1000, sleep=0.5, dry_run=False, stdout=None):
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.dry_run = dry_run
+        self.stdout = stdout
+        self.stats = {'logs': 0, 'emails': 0, 'files': 0, 'covers': 0, 'transmissions': 0}
+
+    def _write(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def _batches(self, queryset):
+        """Yield lists of primary keys until the queryset is exhausted"""
+        last_pk = 0
+        while True:
+            pks = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:self.batch_size]
+            )
+            if not pks:
+                return
+            yield pks
+            last_pk = pks[-1]
+            if not self.dry_run and self.sleep:
+                time.sleep(self.sleep)
+
+    def purge_logs(self, days=LOG_RETENTION_DAYS):
+        """Delete fax_log rows older than `days`"""
+        cutoff = timezone.now() - timedelta(days=days)
+        for pks in self._batches(FaxLog.objects.filter(timestamp__lt=cutoff)):
+            if not self.dry_run:
+                # FaxLog has no dependents, so this is a single DELETE
+                FaxLog.objects.filter(pk__in=pks).delete()
+            self.stats['logs'] += len(pks)
+        self._write(f"fax_log: {self.stats['logs']} rows older than {days} days")
+
+    def purge_emails(self, days=EMAIL_RETENTION_DAYS):
+        """Delete sent/failed fax_email rows older than `days`"""
+        cutoff = timezone.now() - timedelta(days=days)
+        queryset = FaxEmail.objects.filter(status__in=['sent', 'failed'], created_at__lt=cutoff)
+        for pks in self._batches(queryset):
+            if not self.dry_run:
+                FaxEmail.objects.filter(pk__in=pks).delete()
+            self.stats['emails'] += len(pks)
+        self._write(f"fax_email: {self.stats['emails']} rows older than {days} days")
+
+    def purge_covers(self, days=COVER_RETENTION_DAYS):
+        """Remove cover+document TIFFs of sends older than `days` (cached cover layers are kept)"""
+        cutoff = time.time() - days * 86400
+        try:
+            entries = list(os.scandir(COVER_DIR))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                if not self.dry_run:
+                    os.remove(entry.path)
+                self.stats['covers'] += 1
+        self._write(f"cover pages: {self.stats['covers']} files older than {days} days")
+
+    def purge_files(self):
+        """
+        Remove stored fax files past each account's archive_days
+
+        Accounts are grouped by their InboundFaxSettings.archive_days so each
+        distinct retention period is one pass over fax_transmission. Cleaned
+        transmissions and their pages keep their rows but get an empty
+        file_path, so OCR text stays searchable until purge_transmissions.
+        """
+        periods = {}
+        for user_id, days in InboundFaxSettings.objects.filter(archive_enabled=True).values_list('user_id', 'archive_days'):
+            periods.setdefault(days, []).append(user_id)
+
+        with_settings = [user_id for user_ids in periods.values() for user_id in user_ids]
+        passes = [
+            (days, Q(account__user_id__in=user_ids)) for days, user_ids in sorted(periods.items())
+        ]
+        # Accounts whose user has no (enabled) settings fall back to the default
+        passes.append((DEFAULT_ARCHIVE_DAYS, ~Q(account__user_id__in=with_settings)))
+
+        for days, accounts in passes:
+            cutoff = timezone.now() - timedelta(days=days)
+            queryset = FaxTransmission.objects.filter(accounts, queued_at__lt=cutoff).exclude(file_path='')
+            for pks in self._batches(queryset):
+                self._remove_files(pks)
+                self.stats['files'] += len(pks)
+                if not self.dry_run:
+                    FaxPage.objects.filter(transmission_id__in=pks).exclude(file_path='').update(file_path='')
+                    FaxOCRJob.objects.filter(transmission_id__in=pks).exclude(output_path='').update(output_path='')
+                    FaxTransmission.objects.filter(pk__in=pks).update(file_path='', file_size=0)
+        self._write(f"files: {self.stats['files']} transmissions cleaned")
+
+    def purge_transmissions(self, days=TRANSMISSION_RETENTION_DAYS):
+        """Delete transmissions (with their pages, logs and files) older than `days`"""
+        cutoff = timezone.now() - timedelta(days=days)
+        queryset = FaxTransmission.objects.filter(queued_at__lt=cutoff)
+        for pks in self._batches(queryset):
+            self._remove_files(pks)
+            if not self.dry_run:
+                # Children first so the transmission DELETE doesn't collect them row by row
+                FaxLog.objects.filter(transmission_id__in=pks).delete()
+                FaxPage.objects.filter(transmission_id__in=pks).delete()
+                FaxSearchEntry.objects.filter(transmission_id__in=pks).delete()
+                FaxEmail.objects.filter(transmission_id__in=pks).delete()
+                FaxTransmission.objects.filter(pk__in=pks).delete()
+            self.stats['transmissions'] += len(pks)
+        self._write(f"fax_transmission: {self.stats['transmissions']} rows older than {days} days")
+
+    def _remove_files(self, pks):
+        if self.dry_run:
+            return
+
+        page_files = FaxPage.objects.filter(transmission_id__in=pks).values_list('file_path', flat=True)
+        rows = FaxTransmission.objects.filter(pk__in=pks).values_list('uuid', 'completed_at')
+        for transmission_uuid, completed_at in rows:
+            for path in fax_file_dirs(transmission_uuid, completed_at):
+                shutil.rmtree(path, ignore_errors=True)
+
+        for path in page_files:
+            if path and os.path.isfile(path):
+                os.remove(path)
+
+    def run(self, log_days=LOG_RETENTION_DAYS, transmission_days=TRANSMISSION_RETENTION_DAYS, files=True,
+            email_days=EMAIL_RETENTION_DAYS):
+        self.purge_logs(log_days)
+        self.purge_emails(email_days)
+        if files:
+            self.purge_files()
+            self.purge_covers()
+        if transmission_days:
+            self.purge_transmissions(transmission_days)
+        return self.stats
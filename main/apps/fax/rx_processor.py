@@ -5,16 +5,19 @@ Processes incoming faxes from FreeSWITCH
 
 import os
 import shutil
-import json
 from datetime import datetime
 from PIL import Image
 import PyPDF2
-from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db.models import F
 from .models_extended import FaxAccount, FaxTransmission, FaxPage, FaxLog, FaxWebhook
-import requests
+from .inbound_routes import get_inbound_route
+from .ocr import enqueue_ocr
+from .search import index_transmissions
+from .mailer import queue_email
+from .notifications import post_webhook
+from main.apps.service.views.utils.inbox import index_received_fax
 import hashlib
-import hmac
 
 
 class RXFaxProcessor:
@@ -35,8 +38,10 @@ class RXFaxProcessor:
         - transfer_rate: Baud rate
         """
         self.fax_data = fax_data
+        self.route = None
         self.account = None
         self.transmission = None
+        self.emails = ()
         
     def process(self):
         """Main processing pipeline"""
@@ -47,6 +52,13 @@ class RXFaxProcessor:
                 self._log_error("No account found for number: " + self.fax_data.get('destination_number'))
                 return False
             
+            # 1a. Screen the sender before any file work
+            decision = self.route.screen(self.fax_data.get('caller_id_number', ''))
+            if not decision.accepted:
+                self._reject(decision.reason)
+                return True
+            self.emails = tuple(dict.fromkeys(self.route.emails + decision.emails))
+            
             # 2. Create transmission record
             self.transmission = self._create_transmission_record()
             
@@ -56,21 +68,31 @@ class RXFaxProcessor:
             # 4. Extract individual pages
             self._extract_pages()
             
+            # 4a. Add to the inbox index
+            self._index_received_fax()
+            
             # 5. Convert to desired format
             output_file = self._convert_format()
             
-            # 6. Send email notification
-            if self.account.send_fax_to_email:
-                self._send_email_notification(output_file)
+            # 6. Queue the email notification (sent by send_fax_emails)
+            if self.emails:
+                self._queue_email_notification(output_file)
             
             # 7. Trigger webhooks
             self._trigger_webhooks()
             
+            # 7a. OCR runs later in run_ocr_jobs, never on the hangup path
+            if self.route.ocr_enabled:
+                self._queue_ocr()
+            
             # 8. Update transmission status
             self.transmission.status = 'completed'
             self.transmission.completed_at = datetime.now()
             self.transmission.save()
             
+            # 8a. Add to the fax search index (OCR text is added when run_ocr_jobs finishes)
+            self._index_search()
+            
             # 9. Update account usage
             self._update_account_usage()
             
@@ -86,14 +108,18 @@ class RXFaxProcessor:
             return False
     
     def _identify_account(self):
-        """Identify the receiving account based on destination number"""
-        try:
-            return FaxAccount.objects.get(
-                fax_number=self.fax_data.get('destination_number'),
-                is_active=True
-            )
-        except FaxAccount.DoesNotExist:
-            return None
+        """Identify the receiving account from the cached inbound routing map"""
+        self.route = get_inbound_route(self.fax_data.get('destination_number'))
+        return self.route.get_account() if self.route else None
+    
+    def _reject(self, reason):
+        """Record a screened-out fax; the spooled file is not copied or converted"""
+        self.transmission = self._create_transmission_record()
+        self.transmission.status = 'cancelled'
+        self.transmission.error_message = f"Rejected: {reason}"
+        self.transmission.completed_at = datetime.now()
+        self.transmission.save(update_fields=['status', 'error_message', 'completed_at'])
+        self._log_info(f"Fax from {self.transmission.sender_number} rejected: {reason}")
     
     def _create_transmission_record(self):
         """Create database record for received fax"""
@@ -177,11 +203,25 @@ class RXFaxProcessor:
         except Exception as e:
             self._log_warning(f"Page extraction failed: {str(e)}")
     
+    def _index_received_fax(self):
+        """Index the received file so inbox listings don't have to stat it"""
+        try:
+            index_received_fax(
+                callid=self.transmission.call_uuid or str(self.transmission.uuid),
+                caller_id_number=self.transmission.sender_number,
+                destination_number=self.transmission.recipient_number,
+                starting_date=self.transmission.started_at,
+                file_path=self.fax_data.get('fax_file'),
+                pages=self.transmission.pages
+            )
+        except Exception as e:
+            self._log_warning(f"Inbox indexing failed: {str(e)}")
+    
     def _convert_format(self):
         """Convert fax to user's preferred format"""
-        format_type = self.account.email_format
+        format_type = self.route.email_format
         
-        if format_type == 'pdf':
+        if format_type in ('pdf', 'both'):
             return self._convert_to_pdf()
         else:
             return self.transmission.file_path  # Return original TIFF
@@ -222,8 +262,21 @@ class RXFaxProcessor:
             self._log_error(f"PDF conversion failed: {str(e)}")
             return self.transmission.file_path
     
-    def _send_email_notification(self, attachment_path):
-        """Send email notification with fax attachment"""
+    def _index_search(self):
+        try:
+            index_transmissions([self.transmission])
+        except Exception as e:
+            self._log_warning(f"Search indexing failed: {str(e)}")
+    
+    def _queue_ocr(self):
+        try:
+            job = enqueue_ocr(self.transmission, self.route)
+            self._log_info(f"Queued OCR job #{job.pk}")
+        except Exception as e:
+            self._log_warning(f"OCR queueing failed: {str(e)}")
+    
+    def _queue_email_notification(self, attachment_path):
+        """Queue the email notification with the fax attached"""
         try:
             subject = f"Fax Received from {self.transmission.sender_number}"
             
@@ -241,21 +294,26 @@ Fax ID: {self.transmission.uuid}
 This fax has been automatically processed and is attached to this email.
             """
             
-            email = EmailMessage(
+            # Attach the fax ('both' also attaches the original TIFF)
+            paths = [attachment_path]
+            if self.route.email_format == 'both' and attachment_path != self.transmission.file_path:
+                paths.append(self.transmission.file_path)
+            attachments = []
+            for path in paths:
+                extension = 'pdf' if path.endswith('.pdf') else 'tiff'
+                attachments.append((path, f"fax_{self.transmission.uuid}.{extension}", f'application/{extension}'))
+            
+            email = queue_email(
+                to=self.emails[:1],
+                cc=self.emails[1:],
                 subject=subject,
                 body=body,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[self.account.notification_email],
+                attachments=attachments,
+                transmission=self.transmission,
+                kind='received'
             )
             
-            # Attach the fax
-            with open(attachment_path, 'rb') as f:
-                filename = f"fax_{self.transmission.uuid}.{self.account.email_format}"
-                email.attach(filename, f.read(), f'application/{self.account.email_format}')
-            
-            email.send()
-            
-            self._log_info(f"Email sent to {self.account.notification_email}")
+            self._log_info(f"Email #{email.pk} queued for {', '.join(self.emails)}")
             
         except Exception as e:
             self._log_error(f"Email notification failed: {str(e)}")
@@ -286,45 +344,18 @@ This fax has been automatically processed and is attached to this email.
                     'status': self.transmission.status,
                 }
             }
-            
-            # Calculate signature
-            signature = hmac.new(
-                webhook.secret_key.encode(),
-                json.dumps(payload).encode(),
-                hashlib.sha256
-            ).hexdigest()
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Fax-Signature': signature
-            }
-            
-            response = requests.post(
-                webhook.url,
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                webhook.last_triggered = datetime.now()
-                webhook.failure_count = 0
-            else:
-                webhook.failure_count += 1
-            
-            webhook.save()
-            
+            post_webhook(webhook, payload)
             self._log_info(f"Webhook triggered: {webhook.url}")
             
         except Exception as e:
-            webhook.failure_count += 1
-            webhook.save()
             self._log_error(f"Webhook failed: {str(e)}")
     
     def _update_account_usage(self):
         """Update account usage statistics"""
-        self.account.pages_received_this_month += self.transmission.pages
-        self.account.save()
+        # The account came from the routing map, so update the counter in place
+        FaxAccount.objects.filter(pk=self.account.pk).update(
+            pages_received_this_month=F('pages_received_this_month') + self.transmission.pages
+        )
     
     def _calculate_file_hash(self, file_path):
         """Calculate SHA256 hash of file"""
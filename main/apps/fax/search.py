@@ -0,0 +1,374 @@
+"""
+Fax Search
+Ranked full-text search over fax numbers, contact names, dates and OCR text
+(SQLite FTS5 or PostgreSQL tsvector, see the 0011_fax_search migration)
+"""
+
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from .models import FaxTransaction, FaxSearchEntry
+from .models_extended import FaxAccount, FaxTransmission, FaxPage, FaxContact
+from .models_complete import UserProfile
+from .inbound_rules import normalize_e164, DEFAULT_COUNTRY_CODE
+
+SEARCH_PAGE_SIZE = getattr(settings, 'FAX_SEARCH_PAGE_SIZE', 25)
+SEARCH_MAX_PAGE_SIZE = getattr(settings, 'FAX_SEARCH_MAX_PAGE_SIZE', 100)
+SOURCES = ('transaction', 'transmission')
+
+ENTRY_FIELDS = ['user', 'tenant', 'direction', 'faxed_at', 'numbers', 'names', 'dates', 'body', 'updated_at']
+# bm25() weights for the FTS5 columns (numbers, names, dates, body); same order as the tsvector weights
+FTS5_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+# "+1 (212) 555-0100" is one term, not four
+PHONE_RE = re.compile(r'\+?\d[\d\s().-]{5,}\d')
+TERM_RE = re.compile(r'[^\W_]+')
+
+
+def number_terms(*values):
+    """
+    Index terms for phone numbers
+
+    Each number is stored as E.164 digits, in national form and by its
+    last seven digits, so '12125550100', '2125550100' and '5550100' (or
+    any prefix of them) find it. Comma-separated lists are split.
+    """
+    terms = []
+    for value in values:
+        for number in (value or '').split(','):
+            digits = normalize_e164(number)
+            if not digits:
+                continue
+            terms.append(digits)
+            if digits.startswith(DEFAULT_COUNTRY_CODE) and len(digits) == 10 + len(DEFAULT_COUNTRY_CODE):
+                terms.append(digits[len(DEFAULT_COUNTRY_CODE):])
+            if len(digits) > 7:
+                terms.append(digits[-7:])
+    return ' '.join(dict.fromkeys(terms))
+
+
+def date_terms(when):
+    """'2026-10-19 October Oct Monday' in local time"""
+    when = timezone.localtime(when) if timezone.is_aware(when) else when
+    return when.strftime('%Y-%m-%d %B %b %A')
+
+
+def query_terms(query):
+    """Split a search string into index terms; phone numbers collapse to their digits"""
+    query = PHONE_RE.sub(lambda match: re.sub(r'\D', '', match.group()), query or '')
+    return [term.lower() for term in TERM_RE.findall(query)]
+
+
+def _number_forms(digits):
+    """The ways a normalized number is commonly stored in FaxContact.fax_number"""
+    forms = {digits, '+' + digits, '00' + digits}
+    if digits.startswith(DEFAULT_COUNTRY_CODE) and len(digits) == 10 + len(DEFAULT_COUNTRY_CODE):
+        forms.add(digits[len(DEFAULT_COUNTRY_CODE):])
+    return forms
+
+
+def _contact_names(pairs, raw_numbers=()):
+    """
+    {(account_id, digits): name} for the (account_id, number) pairs given
+
+    Only contacts stored under one of the numbers' forms (or as given in
+    `raw_numbers`) are read, so the cost doesn't grow with the address book.
+    """
+    account_ids = {account_id for account_id, _ in pairs if account_id}
+    numbers = {number for _, number in pairs if number}
+    if not account_ids or not numbers:
+        return {}
+    forms = {form for number in numbers for form in _number_forms(number)}
+    forms.update(number for number in raw_numbers if number)
+    rows = FaxContact.objects.filter(account_id__in=account_ids, fax_number__in=forms).values_list(
+        'account_id', 'fax_number', 'name', 'company'
+    )
+    names = {}
+    for account_id, fax_number, name, company in rows:
+        digits = normalize_e164(fax_number)
+        if (account_id, digits) in pairs:
+            names[(account_id, digits)] = ' '.join(part for part in (name, company) if part and part != 'Auto-added')
+    return names
+
+
+def _raw_numbers(*values):
+    return [number.strip() for value in values for number in (value or '').split(',')]
+
+
+def _split_numbers(*values):
+    return [normalize_e164(number) for number in _raw_numbers(*values)]
+
+
+def _upsert(entries, unique_field):
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target; Django rejects unique_fields there
+    unique_fields = [unique_field] if connection.features.supports_update_conflicts_with_target else None
+    FaxSearchEntry.objects.bulk_create(
+        entries, update_conflicts=True, unique_fields=unique_fields, update_fields=ENTRY_FIELDS
+    )
+
+
+def index_transactions(transactions):
+    """Add or refresh the search entries of FaxTransaction rows (already saved)"""
+    transactions = [fax for fax in transactions if fax.pk]
+    if not transactions:
+        return
+    user_ids = {fax.user_id for fax in transactions if fax.user_id}
+    accounts = dict(FaxAccount.objects.filter(user_id__in=user_ids).values_list('user_id', 'id'))
+    tenants = dict(UserProfile.objects.filter(user_id__in=user_ids).values_list('user_id', 'tenant_id'))
+    names = _contact_names({
+        (accounts.get(fax.user_id), number)
+        for fax in transactions for number in _split_numbers(fax.sender_number, fax.recipient_number)
+    }, [number for fax in transactions for number in _raw_numbers(fax.sender_number, fax.recipient_number)])
+
+    entries = []
+    for fax in transactions:
+        account_id = accounts.get(fax.user_id)
+        entries.append(FaxSearchEntry(
+            transaction=fax,
+            user_id=fax.user_id,
+            tenant_id=tenants.get(fax.user_id),
+            direction=fax.direction,
+            faxed_at=fax.created_at,
+            numbers=number_terms(fax.sender_number, fax.recipient_number),
+            names=' '.join(dict.fromkeys(
+                names[(account_id, number)]
+                for number in _split_numbers(fax.sender_number, fax.recipient_number)
+                if (account_id, number) in names
+            )),
+            dates=date_terms(fax.created_at),
+        ))
+    _upsert(entries, 'transaction')
+
+
+def index_transmissions(transmissions):
+    """Add or refresh the search entries of FaxTransmission rows, including OCR text"""
+    transmissions = [fax for fax in transmissions if fax.pk]
+    if not transmissions:
+        return
+    pks = [fax.pk for fax in transmissions]
+    accounts = dict(
+        FaxAccount.objects.filter(pk__in={fax.account_id for fax in transmissions}).values_list('id', 'user_id')
+    )
+    tenants = dict(UserProfile.objects.filter(user_id__in=set(accounts.values())).values_list('user_id', 'tenant_id'))
+    pages = {}
+    for transmission_id, text in (
+        FaxPage.objects.filter(transmission_id__in=pks).exclude(ocr_text='')
+        .order_by('transmission_id', 'page_number').values_list('transmission_id', 'ocr_text')
+    ):
+        pages.setdefault(transmission_id, []).append(text)
+    names = _contact_names({
+        (fax.account_id, number)
+        for fax in transmissions for number in _split_numbers(fax.sender_number, fax.recipient_number)
+    }, [number for fax in transmissions for number in _raw_numbers(fax.sender_number, fax.recipient_number)])
+
+    entries = []
+    for fax in transmissions:
+        user_id = accounts.get(fax.account_id)
+        contact_names = [
+            names[(fax.account_id, number)]
+            for number in _split_numbers(fax.sender_number, fax.recipient_number)
+            if (fax.account_id, number) in names
+        ]
+        entries.append(FaxSearchEntry(
+            transmission=fax,
+            user_id=user_id,
+            tenant_id=tenants.get(user_id),
+            direction=fax.direction,
+            faxed_at=fax.queued_at,
+            numbers=number_terms(fax.sender_number, fax.recipient_number),
+            names=' '.join(dict.fromkeys(n for n in [fax.sender_name, fax.recipient_name] + contact_names if n)),
+            dates=date_terms(fax.queued_at),
+            body='\n'.join(pages.get(fax.pk, [])),
+        ))
+    _upsert(entries, 'transmission')
+
+
+class FaxSearch:
+    """
+    One search over the fax index
+
+    Terms are ANDed and each matches as a prefix. Results are ranked
+    (numbers weigh most, then names, OCR text and dates), newest first
+    among equal ranks, and restricted to `user`/`tenant` when given.
+    `source` limits results to 'transaction' or 'transmission' records.
+    """
+
+    # ORM lookup -> SQL condition on fax_search_entry
+    FILTER_SQL = {
+        'user_id': 'e.user_id = %s',
+        'tenant_id': 'e.tenant_id = %s',
+        'direction': 'e.direction = %s',
+        'faxed_at__gte': 'e.faxed_at >= %s',
+        'faxed_at__lt': 'e.faxed_at < %s',
+    }
+
+    def __init__(self, query, user=None, tenant=None, direction=None, date_from=None, date_to=None, source=None):
+        self.terms = query_terms(query)
+        self.source = source if source in SOURCES else None
+        lookups = {
+            'user_id': user.pk if user else None,
+            'tenant_id': tenant.pk if tenant else None,
+            'direction': direction,
+            'faxed_at__gte': date_from,
+            'faxed_at__lt': date_to,
+        }
+        self.lookups = {key: value for key, value in lookups.items() if value is not None}
+
+    def _where(self, match):
+        """WHERE clause and its parameters for the raw full-text queries"""
+        conditions, params = [match], []
+        for key, value in self.lookups.items():
+            if key.startswith('faxed_at'):
+                value = connection.ops.adapt_datetimefield_value(value)
+            conditions.append(self.FILTER_SQL[key])
+            params.append(value)
+        if self.source:
+            conditions.append(f'e.{self.source}_id IS NOT NULL')
+        return ' AND '.join(conditions), params
+
+    def _fts5_sql(self):
+        where, params = self._where('fax_search_fts MATCH %s')
+        base = f'FROM fax_search_fts JOIN fax_search_entry e ON e.id = fax_search_fts.rowid WHERE {where}'
+        weights = ', '.join(str(weight) for weight in FTS5_WEIGHTS)
+        # bm25() is lower for better matches; negate it so a higher rank is better everywhere
+        rows_sql = (f'SELECT e.id, -bm25(fax_search_fts, {weights}) AS rank {base}'
+                    f' ORDER BY rank DESC, e.faxed_at DESC LIMIT %s OFFSET %s')
+        match = ' '.join(f'"{term}"*' for term in self.terms)
+        return base, rows_sql, [match] + params, []
+
+    def _tsvector_sql(self):
+        where, params = self._where("e.document @@ to_tsquery('simple', %s)")
+        base = f'FROM fax_search_entry e WHERE {where}'
+        rows_sql = (f"SELECT e.id, ts_rank_cd(e.document, to_tsquery('simple', %s)) AS rank {base}"
+                    f' ORDER BY rank DESC, e.faxed_at DESC LIMIT %s OFFSET %s')
+        tsquery = ' & '.join(f'{term}:*' for term in self.terms)
+        return base, rows_sql, [tsquery] + params, [tsquery]
+
+    def _like_queryset(self):
+        """Backends without a full-text index: ANDed LIKE over the entry columns"""
+        queryset = FaxSearchEntry.objects.filter(**self.lookups)
+        if self.source:
+            queryset = queryset.filter(**{f'{self.source}__isnull': False})
+        for term in self.terms:
+            queryset = queryset.filter(
+                Q(numbers__icontains=term) | Q(names__icontains=term) |
+                Q(dates__icontains=term) | Q(body__icontains=term)
+            )
+        return queryset
+
+    def _fetch_like(self, limit, offset):
+        queryset = self._like_queryset().order_by('-faxed_at')
+        return queryset.count(), [(pk, None) for pk in queryset.values_list('pk', flat=True)[offset:offset + limit]]
+
+    def _sql(self):
+        """(from_where_sql, rows_sql, params, rank_params), or None without a full-text index"""
+        if connection.vendor == 'sqlite':
+            return self._fts5_sql()
+        if connection.vendor == 'postgresql':
+            return self._tsvector_sql()
+        return None
+
+    def fetch(self, limit, offset=0):
+        """(total, [(entry_id, rank), ...]) for one page"""
+        if not self.terms:
+            return 0, []
+        sql = self._sql()
+        if sql is None:
+            return self._fetch_like(limit, offset)
+
+        base, rows_sql, params, rank_params = sql
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) {base}', params)
+            total = cursor.fetchone()[0]
+            if offset >= total:
+                return total, []
+            cursor.execute(rows_sql, rank_params + params + [limit, offset])
+            return total, cursor.fetchall()
+
+    def matching_ids(self):
+        """
+        Every matching entry id as a subquery, for a `__in` filter
+
+        Unranked and uncapped; the caller's ordering applies.
+        """
+        if not self.terms:
+            return FaxSearchEntry.objects.none().values('pk')
+        sql = self._sql()
+        if sql is None:
+            return self._like_queryset().values('pk')
+        base, _, params, _ = sql
+        return RawSQL(f'SELECT e.id {base}', params)
+
+    def explain(self, limit=SEARCH_PAGE_SIZE):
+        """Plan of the ranked page query, like QuerySet.explain()"""
+        sql = self._sql()
+        if sql is None or not self.terms:
+            return ''
+        _, rows_sql, params, rank_params = sql
+        prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else 'EXPLAIN'
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {rows_sql}', rank_params + params + [limit, 0])
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def page(self, page=1, page_size=SEARCH_PAGE_SIZE):
+        """
+        One page of results as dicts, best match first
+
+        Returns (total, results). The fax rows of the page are loaded in
+        two queries, so status and page counts are always current.
+        """
+        page_size = max(1, min(int(page_size), SEARCH_MAX_PAGE_SIZE))
+        page = max(1, int(page))
+        total, rows = self.fetch(page_size, (page - 1) * page_size)
+
+        entries = FaxSearchEntry.objects.in_bulk([entry_id for entry_id, _ in rows])
+        transactions = FaxTransaction.objects.in_bulk(
+            [entry.transaction_id for entry in entries.values() if entry.transaction_id]
+        )
+        transmissions = FaxTransmission.objects.in_bulk(
+            [entry.transmission_id for entry in entries.values() if entry.transmission_id]
+        )
+
+        results = []
+        for entry_id, rank in rows:
+            entry = entries.get(entry_id)
+            if entry is None:
+                continue
+            if entry.transaction_id:
+                fax, source = transactions.get(entry.transaction_id), 'transaction'
+            else:
+                fax, source = transmissions.get(entry.transmission_id), 'transmission'
+            if fax is None:
+                continue
+            results.append({
+                'source': source,
+                'uuid': str(fax.uuid),
+                'direction': fax.direction,
+                'status': fax.status,
+                'sender_number': fax.sender_number,
+                'recipient_number': fax.recipient_number,
+                'names': entry.names,
+                'pages': fax.pages,
+                'date': entry.faxed_at.isoformat(),
+                'rank': round(rank, 6) if rank is not None else None,
+            })
+        return total, results
+
+
+def reindex(source, batch_size=1000):
+    """Rebuild the entries of one source in primary-key batches; returns the number indexed"""
+    model, index = {
+        'transaction': (FaxTransaction, index_transactions),
+        'transmission': (FaxTransmission, index_transmissions),
+    }[source]
+    last_pk, done = 0, 0
+    while True:
+        batch = list(model.objects.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            return done
+        index(batch)
+        done += len(batch)
+        last_pk = batch[-1].pk
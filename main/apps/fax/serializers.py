@@ -1,5 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import FaxTransaction, FaxQueue
+from .models import FaxTransaction, FaxQueue, FaxBatchJob
+from .search import SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE, SOURCES
+from .batch import validate_recipient_number
+
+BULK_STATUS_LIMIT = getattr(settings, 'FAX_BULK_STATUS_LIMIT', 500)
+DID_PROVISION_LIMIT = getattr(settings, 'FAX_DID_PROVISION_LIMIT', 500)
 
 class FaxTransactionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,7 +26,73 @@ class SendFaxSerializer(serializers.Serializer):
     filename = serializers.CharField(required=True, help_text="File to send")
     numbers = serializers.CharField(required=True, help_text="Recipient numbers (comma-separated)")
     is_enhanced = serializers.BooleanField(required=False, default=False, help_text="Use enhanced fax quality")
+    variables = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False, default=dict, help_text="Cover page variables")
 
 
 class FaxStatusSerializer(serializers.Serializer):
-    uuid = serializers.UUIDField(required=True, help_text="Fax transaction UUID")
\ No newline at end of file
+    uuid = serializers.UUIDField(required=True, help_text="Fax transaction UUID")
+
+
+class BulkFaxStatusSerializer(serializers.Serializer):
+    uuids = serializers.ListField(
+        child=serializers.UUIDField(),
+        allow_empty=False,
+        max_length=BULK_STATUS_LIMIT,
+        help_text=f"Fax transaction UUIDs (at most {BULK_STATUS_LIMIT})"
+    )
+    include_items = serializers.BooleanField(required=False, default=False, help_text="Return per-recipient queue items")
+
+
+
+class BatchFaxItemSerializer(serializers.Serializer):
+    filename = serializers.CharField(required=True, help_text="Uploaded file to send")
+    number = serializers.CharField(required=True, max_length=20, validators=[validate_recipient_number],
+                                   help_text="Recipient number")
+    variables = serializers.DictField(child=serializers.CharField(allow_blank=True), required=False, default=dict, help_text="Cover page variables")
+
+
+class BatchFaxSerializer(serializers.Serializer):
+    username = serializers.CharField(required=True, help_text="Sender's phone number")
+    is_enhanced = serializers.BooleanField(required=False, default=False, help_text="Use enhanced fax quality")
+    items = BatchFaxItemSerializer(many=True, required=False, help_text="Manifest rows (JSON requests)")
+    manifest = serializers.FileField(required=False, help_text="CSV manifest with filename,number[,variables...] columns")
+    
+    def validate(self, data):
+        if not data.get('items') and not data.get('manifest'):
+            raise serializers.ValidationError("Provide either 'items' or a 'manifest' CSV file")
+        return data
+
+
+class DIDProvisionSerializer(serializers.Serializer):
+    tenant_id = serializers.IntegerField(required=True, help_text="Tenant to assign the numbers to")
+    area_codes = serializers.ListField(
+        child=serializers.RegexField(r'^\d{3}$'),
+        allow_empty=False,
+        max_length=50,
+        help_text="Area codes to search, most preferred first"
+    )
+    quantity = serializers.IntegerField(min_value=1, max_value=DID_PROVISION_LIMIT, help_text=f"Numbers to order (at most {DID_PROVISION_LIMIT})")
+    country = serializers.CharField(required=False, default='US', max_length=2, help_text="Country ISO code")
+
+
+class FaxSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200, help_text="Numbers, contact names, dates or words from the fax text")
+    direction = serializers.ChoiceField(choices=['inbound', 'outbound'], required=False)
+    source = serializers.ChoiceField(choices=SOURCES, required=False, help_text="Limit to API transactions or tracked transmissions")
+    date_from = serializers.DateField(required=False, help_text="First day to include")
+    date_to = serializers.DateField(required=False, help_text="Last day to include")
+    tenant_id = serializers.IntegerField(required=False, help_text="Staff only")
+    page = serializers.IntegerField(required=False, default=1, min_value=1)
+    page_size = serializers.IntegerField(required=False, default=SEARCH_PAGE_SIZE, min_value=1, max_value=SEARCH_MAX_PAGE_SIZE)
+
+
+class FaxBatchJobSerializer(serializers.ModelSerializer):
+    progress = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = FaxBatchJob
+        fields = ['uuid', 'status', 'sender_number', 'total_items', 'progress', 'error_message',
+                  'created_at', 'started_at', 'completed_at']
+    
+    def get_progress(self, obj):
+        return obj.progress()
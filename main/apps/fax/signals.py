@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models_complete import RateDeck, Rate, DID, Tenant, InboundFaxSettings, UserProfile
+from .models_extended import FaxAccount
+from .rating import invalidate_rates
+from .inbound_routes import invalidate_inbound_routes
+from .admin_counts import invalidate_admin_counts
+
+
+@receiver([post_save, post_delete], sender=RateDeck)
+@receiver([post_save, post_delete], sender=Rate)
+def rates_changed(sender, **kwargs):
+    """Compiled rate tables are stale once any deck or rate changes"""
+    invalidate_rates()
+
+
+@receiver([post_save, post_delete], sender=DID)
+@receiver([post_save, post_delete], sender=Tenant)
+@receiver([post_save, post_delete], sender=FaxAccount)
+@receiver([post_save, post_delete], sender=InboundFaxSettings)
+def inbound_routes_changed(sender, **kwargs):
+    """Rebuild the inbound routing map once the change is visible to other workers"""
+    transaction.on_commit(invalidate_inbound_routes)
+
+
+@receiver([post_save, post_delete], sender=DID)
+@receiver([post_save, post_delete], sender=UserProfile)
+def admin_counts_changed(sender, **kwargs):
+    """Tenant changelist counts are stale once a user or DID is added, moved or removed"""
+    transaction.on_commit(invalidate_admin_counts)
@@ -5,22 +5,92 @@ Purchase and manage phone numbers through Telnyx
 
 import requests
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from typing import List, Dict, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
 from .models_complete import DID, Tenant
+from .inbound_routes import invalidate_inbound_routes
+from .admin_counts import invalidate_admin_counts
+
+TELNYX_API_BASE = getattr(settings, 'TELNYX_API_BASE', 'https://api.telnyx.com/v2')
+TELNYX_TIMEOUT = getattr(settings, 'TELNYX_TIMEOUT', 30)
+TELNYX_MAX_RETRIES = getattr(settings, 'TELNYX_MAX_RETRIES', 4)
+FAX_CONNECTION_CACHE_KEY = 'telnyx:fax_connection_id'
+FAX_CONNECTION_CACHE_TIMEOUT = 24 * 3600
+# Concurrent area code searches; kept under the session's pool size
+SEARCH_WORKERS = 8
+# Most numbers one available_phone_numbers search returns
+SEARCH_PAGE_LIMIT = 100
+# Follow-up searches per area code when an order needs more than one page
+SEARCH_MAX_PAGES = 10
+
+
+class TelnyxRetry(Retry):
+    """
+    Retry 429 for every method, 5xx only for idempotent ones
+
+    A 429 means the request was rejected before it was processed, so even
+    a POST (number order, fax send) is safe to repeat. Retry-After is
+    honored; otherwise backoff is exponential.
+    """
+    
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session shared by all TelnyxDIDManager instances"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = TelnyxRetry(
+                    total=TELNYX_MAX_RETRIES,
+                    backoff_factor=0.5,
+                    status_forcelist=(500, 502, 503, 504),
+                    allowed_methods=frozenset(['GET', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS']),
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                )
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=retry)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
 
 
 class TelnyxDIDManager:
     """Manage DIDs through Telnyx API"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, session: requests.Session = None):
         self.api_key = api_key or getattr(settings, 'TELNYX_API_KEY', '')
-        self.base_url = 'https://api.telnyx.com/v2'
+        self.base_url = (base_url or TELNYX_API_BASE).rstrip('/')
+        self.session = session or get_session()
         self.headers = {
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         }
     
+    def _request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Send through the pooled session with auth headers and a timeout"""
+        kwargs.setdefault('timeout', TELNYX_TIMEOUT)
+        return self.session.request(method, endpoint, headers=self.headers, **kwargs)
+    
     def search_available_numbers(self, 
                                 area_code: str = None,
                                 country: str = 'US',
@@ -50,7 +120,7 @@ class TelnyxDIDManager:
             params['filter[national_destination_code]'] = area_code
         
         try:
-            response = requests.get(endpoint, headers=self.headers, params=params)
+            response = self._request('GET', endpoint, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -75,25 +145,84 @@ class TelnyxDIDManager:
             print(f"Error searching numbers: {e}")
             return []
     
+    def search_available_numbers_bulk(self,
+                                     area_codes: List[str],
+                                     country: str = 'US',
+                                     limit_per_area: int = 20,
+                                     features: List[str] = None) -> List[Dict]:
+        """
+        Search several area codes concurrently
+        
+        One search per area code runs on a small thread pool over the
+        shared session. Results are merged in area code order, and numbers
+        returned by more than one search are kept once.
+        """
+        area_codes = list(dict.fromkeys(area_codes or [None]))
+        workers = min(SEARCH_WORKERS, len(area_codes))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(
+                lambda area_code: self.search_available_numbers(
+                    area_code=area_code, country=country, limit=limit_per_area, features=features
+                ),
+                area_codes
+            )
+            merged = {}
+            for numbers in results:
+                for number in numbers:
+                    merged.setdefault(number['phone_number'], number)
+        return list(merged.values())
+    
     def purchase_number(self, phone_number: str, tenant: Tenant, 
                        messaging_profile_id: str = None,
                        connection_id: str = None) -> Optional[DID]:
         """
-        Purchase a phone number from Telnyx
+        Order a single phone number; see purchase_numbers()
+        
+        Returns:
+            Pending DID object if the order was placed, None otherwise
+        """
+        dids = self.purchase_numbers([phone_number], tenant, messaging_profile_id, connection_id)
+        return dids[0] if dids else None
+    
+    def purchase_numbers(self, phone_numbers: List[str], tenant: Tenant,
+                         messaging_profile_id: str = None,
+                         connection_id: str = None) -> List[DID]:
+        """
+        Order many phone numbers from Telnyx in one number order
+        
+        Returns without waiting for the order. The DIDs are written in
+        bulk, inactive and with provisioning_status='pending'. The
+        number_order.complete webhook (or sync_telnyx_orders as a fallback)
+        calls complete_order(), and the fax configuration runs afterwards
+        as a follow-up job.
         
         Args:
-            phone_number: The phone number to purchase (E.164 format)
-            tenant: The tenant to assign the number to
+            phone_numbers: Numbers to purchase (E.164 format)
+            tenant: The tenant to assign the numbers to
             messaging_profile_id: Optional messaging profile for SMS
             connection_id: Optional connection for voice/fax
         
+        Numbers that already belong to another tenant are left out of the
+        order.
+        
         Returns:
-            DID object if successful, None otherwise
+            Pending DID objects if the order was placed, empty list otherwise
         """
+        phone_numbers = list(dict.fromkeys(phone_numbers))
+        taken = set(
+            DID.objects.filter(number__in=[self._clean_number(number) for number in phone_numbers])
+            .exclude(tenant=tenant).values_list('number', flat=True)
+        )
+        if taken:
+            print(f"Skipping numbers owned by another tenant: {', '.join(sorted(taken))}")
+            phone_numbers = [number for number in phone_numbers if self._clean_number(number) not in taken]
+        if not phone_numbers:
+            return []
+        
         endpoint = f"{self.base_url}/number_orders"
         
         payload = {
-            'phone_numbers': [{'phone_number': phone_number}]
+            'phone_numbers': [{'phone_number': number} for number in phone_numbers]
         }
         
         if messaging_profile_id:
@@ -103,39 +232,164 @@ class TelnyxDIDManager:
             payload['connection_id'] = connection_id
         
         try:
-            response = requests.post(endpoint, headers=self.headers, json=payload)
+            response = self._request('POST', endpoint, json=payload)
             response.raise_for_status()
-            
-            data = response.json()
-            order_id = data['data']['id']
-            
-            # Wait for order to complete and get phone number ID
-            number_id = self._wait_for_order(order_id)
-            
-            if number_id:
-                # Create DID record
-                did = DID.objects.create(
-                    number=self._clean_number(phone_number),
-                    tenant=tenant,
-                    provider='telnyx',
-                    provider_sid=number_id,
-                    is_fax_enabled=True,
-                    is_voice_enabled=True,
-                    is_active=True,
-                    description=f"Purchased from Telnyx"
-                )
-                
-                # Configure the number for fax
-                self.configure_for_fax(number_id, connection_id)
-                
-                return did
-            
+            order = response.json()['data']
         except requests.exceptions.RequestException as e:
-            print(f"Error purchasing number: {e}")
+            print(f"Error purchasing numbers: {e}")
             if hasattr(e, 'response') and e.response:
                 print(f"Response: {e.response.text}")
+            return []
         
-        return None
+        numbers = [self._clean_number(number) for number in phone_numbers]
+        values = {
+            'tenant': tenant,
+            'provider': 'telnyx',
+            'provider_sid': '',
+            'provider_order_id': order['id'],
+            'provisioning_status': 'pending',
+            'provisioning_error': '',
+            'is_fax_enabled': True,
+            'is_voice_enabled': True,
+            'is_active': False,
+            'description': "Purchased from Telnyx",
+        }
+        with transaction.atomic():
+            # Numbers bought before (e.g. released and re-ordered) are reset in one UPDATE
+            existing = set(DID.objects.filter(number__in=numbers, tenant=tenant).values_list('number', flat=True))
+            if existing:
+                DID.objects.filter(number__in=existing, tenant=tenant).update(updated_at=timezone.now(), **values)
+                # They are inactive again; update() sends no signals
+                transaction.on_commit(invalidate_inbound_routes)
+            DID.objects.bulk_create(
+                [DID(number=number, **values) for number in numbers if number not in existing],
+                batch_size=500
+            )
+            # bulk_create sends no signals either
+            transaction.on_commit(invalidate_admin_counts)
+        
+        # Orders for available numbers often complete immediately
+        if order.get('status') != 'pending':
+            self.complete_order(order)
+        
+        return list(DID.objects.filter(number__in=numbers, tenant=tenant))
+    
+    def provision_numbers(self, tenant: Tenant, area_codes: List[str], quantity: int,
+                          country: str = 'US', features: List[str] = None) -> List[DID]:
+        """
+        Search the area codes and order up to `quantity` numbers in one order
+        
+        Numbers are taken in area code order, so the first area codes are
+        preferred. A search returns at most SEARCH_PAGE_LIMIT numbers, so
+        larger orders search the area codes again until the quantity is
+        met. Fewer DIDs are returned when the searches came up short.
+        """
+        # Ask each area code for enough numbers to fill the order on its own
+        limit_per_area = min(max(quantity, 1), SEARCH_PAGE_LIMIT)
+        available = self.search_available_numbers_bulk(
+            area_codes, country=country, limit_per_area=limit_per_area, features=features
+        )
+        chosen = dict.fromkeys(number['phone_number'] for number in available)
+        
+        # Only orders larger than a page can still be filled by searching again
+        if quantity > SEARCH_PAGE_LIMIT:
+            for area_code in dict.fromkeys(area_codes or [None]):
+                for _ in range(SEARCH_MAX_PAGES):
+                    if len(chosen) >= quantity:
+                        break
+                    numbers = self.search_available_numbers(
+                        area_code=area_code, country=country, limit=SEARCH_PAGE_LIMIT, features=features
+                    )
+                    new = [number['phone_number'] for number in numbers if number['phone_number'] not in chosen]
+                    chosen.update(dict.fromkeys(new))
+                    # A short page means the area code is exhausted; no new numbers means it keeps repeating
+                    if not new or len(numbers) < SEARCH_PAGE_LIMIT:
+                        break
+        return self.purchase_numbers(list(chosen)[:quantity], tenant)
+    
+    def get_order(self, order_id: str) -> Optional[Dict]:
+        """Fetch a number order; None if it can't be read right now"""
+        try:
+            response = self._request('GET', f"{self.base_url}/number_orders/{order_id}")
+            response.raise_for_status()
+            return response.json()['data']
+        except requests.exceptions.RequestException:
+            return None
+    
+    def complete_order(self, order: Dict) -> int:
+        """
+        Apply a finished number order to its pending DIDs
+        
+        Numbers that were provisioned move to 'configuring' with their
+        Telnyx ID; failed ones move to 'failed'. Orders still pending are
+        left alone. Returns the number of DIDs updated.
+        """
+        status = order.get('status')
+        if status == 'pending':
+            return 0
+        
+        provider_ids = {}
+        failed = {}
+        for entry in order.get('phone_numbers', []):
+            number_status = entry.get('status', status)
+            if number_status == 'pending':
+                continue
+            number = self._clean_number(entry['phone_number'])
+            if number_status == 'success' and entry.get('id'):
+                provider_ids[number] = entry['id']
+            else:
+                failed[number] = order.get('failure_reason') or number_status or 'Order failed'
+        
+        now = timezone.now()
+        pending = DID.objects.filter(provider_order_id=order['id'], provisioning_status='pending')
+        with transaction.atomic():
+            # Each number gets its own Telnyx ID, so successes go through bulk_update
+            dids = list(pending.filter(number__in=provider_ids))
+            for did in dids:
+                did.provider_sid = provider_ids[did.number]
+                did.provisioning_status = 'configuring'
+                did.updated_at = now
+            DID.objects.bulk_update(dids, ['provider_sid', 'provisioning_status', 'updated_at'], batch_size=500)
+            updated = len(dids)
+            
+            for reason in set(failed.values()):
+                numbers = [number for number, error in failed.items() if error == reason]
+                updated += pending.filter(number__in=numbers).update(
+                    provisioning_status='failed',
+                    provisioning_error=reason,
+                    updated_at=now
+                )
+        return updated
+    
+    def sync_pending_orders(self, grace_seconds: int = 60) -> int:
+        """
+        Poll orders the webhook hasn't completed within `grace_seconds`
+        
+        Returns the number of DIDs updated.
+        """
+        cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+        # order_by() drops DID's default ordering, which would otherwise make DISTINCT per number
+        order_ids = DID.objects.filter(
+            provider='telnyx', provisioning_status='pending', updated_at__lt=cutoff
+        ).order_by().values_list('provider_order_id', flat=True).distinct()
+        
+        updated = 0
+        for order_id in order_ids:
+            order = self.get_order(order_id)
+            if order:
+                updated += self.complete_order(order)
+        return updated
+    
+    def configure_pending_numbers(self, limit: int = 100) -> int:
+        """Follow-up job: configure ordered numbers for fax and activate them"""
+        configured = 0
+        for did in DID.objects.filter(provider='telnyx', provisioning_status='configuring')[:limit]:
+            if self.configure_for_fax(did.provider_sid):
+                did.provisioning_status = 'active'
+                did.is_active = True
+                did.save(update_fields=['provisioning_status', 'is_active', 'updated_at'])
+                configured += 1
+        return configured
     
     def configure_for_fax(self, phone_number_id: str, connection_id: str = None):
         """
@@ -144,6 +398,9 @@ class TelnyxDIDManager:
         Args:
             phone_number_id: Telnyx phone number ID
             connection_id: Connection ID for routing
+        
+        Returns:
+            True if the number was updated
         """
         endpoint = f"{self.base_url}/phone_numbers/{phone_number_id}"
         
@@ -158,36 +415,63 @@ class TelnyxDIDManager:
         }
         
         try:
-            response = requests.patch(endpoint, headers=self.headers, json=payload)
+            response = self._request('PATCH', endpoint, json=payload)
             response.raise_for_status()
             print(f"Number configured for fax: {phone_number_id}")
+            return True
             
         except requests.exceptions.RequestException as e:
             print(f"Error configuring number: {e}")
+            return False
     
     def get_or_create_fax_connection(self) -> Optional[str]:
         """
         Get existing fax connection or create a new one
         
+        TELNYX_FAX_CONNECTION_ID wins when set; otherwise the looked-up ID
+        is cached so sends don't list fax applications every time.
+        
         Returns:
             Connection ID
         """
+        connection_id = getattr(settings, 'TELNYX_FAX_CONNECTION_ID', None) or cache.get(FAX_CONNECTION_CACHE_KEY)
+        if connection_id:
+            return connection_id
+        
+        connection_id = self._find_or_create_fax_connection()
+        if connection_id:
+            cache.set(FAX_CONNECTION_CACHE_KEY, connection_id, FAX_CONNECTION_CACHE_TIMEOUT)
+        return connection_id
+    
+    def _fax_webhook_url(self) -> str:
+        """Public URL of the fax webhook, or '' when SITE_URL isn't configured"""
+        site_url = getattr(settings, 'SITE_URL', '')
+        if not site_url:
+            return ''
+        return f"{site_url.rstrip('/')}{reverse('fax:telnyx-fax-webhook')}"
+
+    def _find_or_create_fax_connection(self) -> Optional[str]:
         endpoint = f"{self.base_url}/fax_applications"
         
         # Check for existing fax application
         try:
-            response = requests.get(endpoint, headers=self.headers)
+            response = self._request('GET', endpoint)
             response.raise_for_status()
             
             data = response.json()
             if data['data']:
-                return data['data'][0]['id']
+                application = data['data'][0]
+                webhook_url = self._fax_webhook_url()
+                if webhook_url and application.get('webhook_event_url') != webhook_url:
+                    # Applications created before the fax webhook route posted to a URL that no longer exists
+                    self._request(
+                        'PATCH', f"{endpoint}/{application['id']}", json={'webhook_event_url': webhook_url}
+                    ).raise_for_status()
+                return application['id']
             
             # Create new fax application
             payload = {
                 'application_name': 'Django Fax Service',
-                'webhook_event_url': f"{settings.SITE_URL}/api/fax/webhook/telnyx/",
-                'webhook_event_failover_url': f"{settings.SITE_URL}/api/fax/webhook/telnyx/failover/",
                 'inbound': {
                     'sip_subdomain': 'fax',
                     'sip_subdomain_receive_settings': 'only_my_connections'
@@ -196,8 +480,11 @@ class TelnyxDIDManager:
                     'outbound_voice_profile_id': None
                 }
             }
-            
-            response = requests.post(endpoint, headers=self.headers, json=payload)
+            webhook_url = self._fax_webhook_url()
+            if webhook_url:
+                payload['webhook_event_url'] = webhook_url
+
+            response = self._request('POST', endpoint, json=payload)
             response.raise_for_status()
             
             return response.json()['data']['id']
@@ -225,7 +512,7 @@ class TelnyxDIDManager:
         endpoint = f"{self.base_url}/phone_numbers/{number_id}"
         
         try:
-            response = requests.delete(endpoint, headers=self.headers)
+            response = self._request('DELETE', endpoint)
             response.raise_for_status()
             
             # Update DID record
@@ -260,7 +547,7 @@ class TelnyxDIDManager:
         endpoint = f"{self.base_url}/phone_numbers/{number_id}"
         
         try:
-            response = requests.get(endpoint, headers=self.headers)
+            response = self._request('GET', endpoint)
             response.raise_for_status()
             
             data = response.json()['data']
@@ -311,7 +598,7 @@ class TelnyxDIDManager:
         }
         
         try:
-            response = requests.post(endpoint, headers=self.headers, json=payload)
+            response = self._request('POST', endpoint, json=payload)
             response.raise_for_status()
             
             data = response.json()
@@ -336,7 +623,7 @@ class TelnyxDIDManager:
         endpoint = f"{self.base_url}/faxes/{fax_id}"
         
         try:
-            response = requests.get(endpoint, headers=self.headers)
+            response = self._request('GET', endpoint)
             response.raise_for_status()
             
             data = response.json()['data']
@@ -390,7 +677,7 @@ class TelnyxDIDManager:
         }
         
         try:
-            response = requests.get(endpoint, headers=self.headers, params=params)
+            response = self._request('GET', endpoint, params=params)
             response.raise_for_status()
             
             data = response.json()
@@ -401,31 +688,3 @@ class TelnyxDIDManager:
             pass
         
         return None
-    
-    def _wait_for_order(self, order_id: str, max_attempts: int = 10) -> Optional[str]:
-        """Wait for number order to complete"""
-        import time
-        
-        endpoint = f"{self.base_url}/number_orders/{order_id}"
-        
-        for _ in range(max_attempts):
-            try:
-                response = requests.get(endpoint, headers=self.headers)
-                response.raise_for_status()
-                
-                data = response.json()['data']
-                
-                if data['status'] == 'success':
-                    # Get the phone number ID
-                    if data['phone_numbers']:
-                        return data['phone_numbers'][0]['id']
-                elif data['status'] == 'failed':
-                    print(f"Order failed: {data.get('failure_reason')}")
-                    return None
-                
-                time.sleep(2)
-                
-            except requests.exceptions.RequestException:
-                pass
-        
-        return None
\ No newline at end of file
@@ -0,0 +1,340 @@
+"""
+Fax Transports
+Pluggable outbound engines (FreeSWITCH ESL, Telnyx REST, fake) with failover and load-splitting
+"""
+
+import json
+import os
+import time
+import uuid as uuid_lib
+from collections import namedtuple
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+import main.utils.esl.ESL_py3 as ESL
+from main.apps.core.vars import FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD, TXFAX_DIR
+
+# Transports in order of preference for senders without an explicit choice
+FAX_TRANSPORTS = getattr(settings, 'FAX_TRANSPORTS', ['freeswitch', 'telnyx'])
+# Concurrent faxes each transport should carry before traffic spills to the next
+FAX_TRANSPORT_CAPACITY = getattr(settings, 'FAX_TRANSPORT_CAPACITY', {'freeswitch': 60, 'telnyx': 200})
+# A transport is skipped while its recent error rate is above this
+FAX_TRANSPORT_MAX_ERROR_RATE = getattr(settings, 'FAX_TRANSPORT_MAX_ERROR_RATE', 0.5)
+FAX_TRANSPORT_MIN_SAMPLES = getattr(settings, 'FAX_TRANSPORT_MIN_SAMPLES', 10)
+# Public URL that serves TXFAX_DIR; the Telnyx transport is disabled without it
+FAX_TELNYX_MEDIA_URL = getattr(settings, 'FAX_TELNYX_MEDIA_URL', '')
+
+HEALTH_BUCKET_SECONDS = 60
+DEPTH_TTL = 5
+# Telnyx faxes without a final webhook stop counting as in flight after this
+TELNYX_INFLIGHT_WINDOW = timedelta(hours=1)
+# Tags originated fax legs so queue_depth can tell them from other calls on the switch
+TXFAX_PRESENCE_DATA = 'txfax'
+
+Dispatch = namedtuple('Dispatch', ['transport', 'job_id', 'event_name'])
+
+
+class TransportError(Exception):
+    """A transport could not accept a fax"""
+
+
+class BaseTransport:
+    """
+    One way of getting a fax out
+
+    open() is called once before the first send and close() once at the
+    end, so connection-oriented transports can reuse one connection for
+    a whole batch.
+    """
+    name = None
+
+    @property
+    def capacity(self):
+        return FAX_TRANSPORT_CAPACITY.get(self.name) or 1
+
+    def is_configured(self):
+        return True
+
+    def open(self):
+        return True
+
+    def close(self):
+        pass
+
+    def send(self, sender, recipient, file_path):
+        """Start one fax; returns (job_id, event_name) or raises TransportError"""
+        raise NotImplementedError
+
+    def queue_depth(self):
+        """Faxes currently in flight on this transport"""
+        return 0
+
+
+class FreeSwitchTransport(BaseTransport):
+    """txfax calls originated over one ESL connection"""
+    name = 'freeswitch'
+
+    def __init__(self):
+        self.connection = None
+
+    def open(self):
+        self.connection = ESL.ESLconnection(FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD)
+        return self.connection.connected()
+
+    def close(self):
+        if self.connection:
+            self.connection.disconnect()
+            self.connection = None
+
+    def send(self, sender, recipient, file_path):
+        if not self.connection or not self.connection.connected():
+            raise TransportError("Not connected to FreeSWITCH")
+        core_uuid = self.connection.api("create_uuid").getBody()
+        res = self.connection.bgapi("originate", self.build_originate_command(core_uuid, sender, recipient, file_path))
+        if not res:
+            raise TransportError("FreeSWITCH did not accept the originate")
+        return core_uuid, res.getHeader("Event-Name")
+
+    def queue_depth(self):
+        if not self.connection:
+            return 0
+        res = self.connection.api("show", "channels as json")
+        body = res.getBody() if res else ''
+        try:
+            # {"row_count": 2, "rows": [{"uuid": ..., "presence_data": "txfax", ...}]}; no rows when idle
+            rows = json.loads(body or '{}').get('rows') or []
+        except (ValueError, AttributeError):
+            return 0
+        return sum(
+            1 for row in rows
+            if row.get('presence_data') == TXFAX_PRESENCE_DATA or row.get('application') == 'txfax'
+        )
+
+    @staticmethod
+    def build_originate_command(uuid, sender, recipient, file_path):
+        """Build FreeSWITCH originate command for fax"""
+        params = {
+            'origination_uuid': uuid,
+            'ignore_early_media': 'true',
+            'absolute_codec_string': 'PCMU,PCMA',
+            'fax_enable_t38': 'true',
+            'fax_verbose': 'true',
+            'fax_use_ecm': 'false',
+            'fax_enable_t38_request': 'false',
+            'fax_ident': sender,
+            'presence_data': TXFAX_PRESENCE_DATA
+        }
+
+        param_string = ','.join([f"{k}={v}" for k, v in params.items()])
+        return f"{{{param_string}}}sofia/gateway/{sender}/{recipient} &txfax({file_path})"
+
+
+class TelnyxTransport(BaseTransport):
+    """
+    Telnyx programmable fax
+
+    Telnyx fetches the document itself, so the file has to live under
+    TXFAX_DIR and FAX_TELNYX_MEDIA_URL must serve that directory.
+    """
+    name = 'telnyx'
+
+    def __init__(self, manager=None):
+        self._manager = manager
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            from .telnyx_integration import TelnyxDIDManager
+            self._manager = TelnyxDIDManager()
+        return self._manager
+
+    def is_configured(self):
+        return bool(FAX_TELNYX_MEDIA_URL and self.manager.api_key)
+
+    def media_url(self, file_path):
+        relative = os.path.relpath(file_path, TXFAX_DIR)
+        if relative.startswith('..'):
+            raise TransportError(f"{file_path} is not under {TXFAX_DIR}")
+        return FAX_TELNYX_MEDIA_URL.rstrip('/') + '/' + relative.replace(os.sep, '/')
+
+    def send(self, sender, recipient, file_path):
+        fax_id = self.manager.send_fax(sender, recipient, self.media_url(file_path))
+        if not fax_id:
+            raise TransportError("Telnyx rejected the fax")
+        return fax_id, 'TELNYX_FAX_QUEUED'
+
+    def queue_depth(self):
+        from .models import FaxQueue
+        return FaxQueue.objects.filter(
+            transport=self.name,
+            is_processed=False,
+            created_at__gte=timezone.now() - TELNYX_INFLIGHT_WINDOW
+        ).count()
+
+
+class FakeTransport(BaseTransport):
+    """
+    In-memory transport for tests and local development
+
+    Sends are recorded in `sent`; set `fail` to make every send raise,
+    and `depth` to report a queue depth. Several can be routed between by
+    giving them different names.
+    """
+
+    def __init__(self, name='fake', fail=False, depth=0, capacity=None):
+        self.name = name
+        self.fail = fail
+        self.depth = depth
+        self.sent = []
+        self._capacity = capacity
+
+    @property
+    def capacity(self):
+        return self._capacity or super().capacity
+
+    def send(self, sender, recipient, file_path):
+        if self.fail:
+            raise TransportError("Fake transport failure")
+        job_id = str(uuid_lib.uuid4())
+        self.sent.append((sender, recipient, file_path, job_id))
+        return job_id, 'FAKE_FAX_QUEUED'
+
+    def queue_depth(self):
+        return self.depth + len(self.sent)
+
+
+TRANSPORT_CLASSES = {
+    'freeswitch': FreeSwitchTransport,
+    'telnyx': TelnyxTransport,
+    'fake': FakeTransport,
+}
+
+
+def _health_keys(name, bucket):
+    return f"fax:transport:{name}:{bucket}:sent", f"fax:transport:{name}:{bucket}:errors"
+
+
+def record_result(name, ok):
+    """Count a send attempt in the shared per-minute health counters"""
+    bucket = int(time.time() // HEALTH_BUCKET_SECONDS)
+    sent_key, error_key = _health_keys(name, bucket)
+    for key in ((sent_key,) if ok else (sent_key, error_key)):
+        # Two buckets are read, so keep each one for two periods
+        if not cache.add(key, 1, HEALTH_BUCKET_SECONDS * 2):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, HEALTH_BUCKET_SECONDS * 2)
+
+
+def error_rate(name):
+    """Error rate over the current and previous minute; None with too few samples"""
+    bucket = int(time.time() // HEALTH_BUCKET_SECONDS)
+    keys = _health_keys(name, bucket) + _health_keys(name, bucket - 1)
+    counts = cache.get_many(keys)
+    sent = counts.get(keys[0], 0) + counts.get(keys[2], 0)
+    errors = counts.get(keys[1], 0) + counts.get(keys[3], 0)
+    if sent < FAX_TRANSPORT_MIN_SAMPLES:
+        return None
+    return errors / sent
+
+
+class TransportRouter:
+    """
+    Pick a transport per fax, spilling and failing over between them
+
+    The sender's DID (or its tenant) may name a transport; otherwise the
+    FAX_TRANSPORTS order applies. The preferred transport takes traffic
+    until it reaches its FAX_TRANSPORT_CAPACITY or its error rate passes
+    FAX_TRANSPORT_MAX_ERROR_RATE; then the next one does. When every
+    transport is full, the least loaded one is used. A send that fails
+    is retried on the remaining transports before the fax is failed.
+    """
+
+    def __init__(self, transports=None, order=None):
+        if transports is None:
+            transports = [TRANSPORT_CLASSES[name]() for name in (order or FAX_TRANSPORTS)]
+        self.transports = {transport.name: transport for transport in transports if transport.is_configured()}
+        self.order = [transport.name for transport in transports if transport.name in self.transports]
+        self._opened = {}
+        self._depth = {}
+        self._preferences = {}
+
+    def open(self):
+        """True if at least one transport can take faxes"""
+        return any(self._ensure_open(name) for name in self.order)
+
+    def close(self):
+        for name in list(self._opened):
+            if self._opened.pop(name):
+                self.transports[name].close()
+
+    def _ensure_open(self, name):
+        if name not in self._opened:
+            try:
+                self._opened[name] = bool(self.transports[name].open())
+            except Exception:
+                self._opened[name] = False
+            if not self._opened[name]:
+                record_result(name, False)
+        return self._opened[name]
+
+    def preference_for(self, sender):
+        """Transport named on the sender's DID, else on its tenant; '' for automatic"""
+        if sender not in self._preferences:
+            from .models_complete import DID
+            row = DID.objects.filter(number=sender).values_list('fax_transport', 'tenant__fax_transport').first()
+            self._preferences[sender] = (row[0] or row[1]) if row else ''
+        return self._preferences[sender]
+
+    def load(self, name):
+        """Queue depth as a fraction of capacity, refreshed every DEPTH_TTL seconds"""
+        if not self._ensure_open(name):
+            return float('inf')
+        depth, fetched = self._depth.get(name, (0, 0))
+        if time.monotonic() - fetched > DEPTH_TTL:
+            try:
+                depth = self.transports[name].queue_depth()
+            except Exception:
+                pass
+            self._depth[name] = (depth, time.monotonic())
+        return depth / self.transports[name].capacity
+
+    def healthy(self, name):
+        rate = error_rate(name)
+        return rate is None or rate <= FAX_TRANSPORT_MAX_ERROR_RATE
+
+    def candidates(self, preferred=''):
+        """Transports to try for one fax, best first"""
+        order = list(self.order)
+        if preferred in self.transports:
+            order.remove(preferred)
+            order.insert(0, preferred)
+
+        healthy = [name for name in order if self.healthy(name)] or order
+        if not healthy:
+            return []
+        loads = {name: self.load(name) for name in healthy}
+        under = [name for name in healthy if loads[name] < 1]
+        first = under[0] if under else min(healthy, key=loads.get)
+        return [first] + [name for name in order if name != first]
+
+    def send(self, sender, recipient, file_path):
+        """Send over the best transport, failing over; returns a Dispatch or raises TransportError"""
+        errors = []
+        for name in self.candidates(self.preference_for(sender)):
+            if not self._ensure_open(name):
+                errors.append(f"{name}: unavailable")
+                continue
+            try:
+                job_id, event_name = self.transports[name].send(sender, recipient, file_path)
+            except Exception as e:
+                record_result(name, False)
+                errors.append(f"{name}: {e}")
+                continue
+            record_result(name, True)
+            depth, fetched = self._depth.get(name, (0, time.monotonic()))
+            self._depth[name] = (depth + 1, fetched)
+            return Dispatch(name, job_id, event_name)
+        raise TransportError("; ".join(errors) or "No fax transport configured")
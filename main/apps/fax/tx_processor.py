@@ -4,14 +4,15 @@ Processes outgoing faxes after FreeSWITCH transmission
 """
 
 import os
-import json
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from .models_extended import FaxAccount, FaxTransmission, FaxPage, FaxLog, FaxWebhook, FaxContact
-import requests
-import hashlib
-import hmac
+from .mailer import queue_email
+from .notifications import post_webhook, buffer_result
 import main.utils.esl.ESL_py3 as ESL
 from main.apps.core.vars import FREESWITCH_IP_ADDRESS, FREESWITCH_PORT, FREESWITCH_PASSWORD
 
@@ -21,9 +22,18 @@ class TXFaxProcessor:
     
     def __init__(self, transmission_uuid):
         """Initialize with transmission UUID"""
-        self.transmission = FaxTransmission.objects.get(uuid=transmission_uuid)
+        self.transmission = FaxTransmission.objects.select_related('account').get(uuid=transmission_uuid)
         self.account = self.transmission.account
         
+        # Unit of work: changed columns and log rows are written once in _commit()
+        self._dirty_fields = set()
+        self._pending_logs = []
+        self._buffer_logs = False
+        self._pages_sent = 0
+        self.result_status = None
+        self.retry_scheduled = False
+        self.timings = {}
+        
     def process_completion(self, freeswitch_data):
         """
         Process fax completion data from FreeSWITCH
@@ -36,51 +46,108 @@ class TXFaxProcessor:
         - fax_transfer_rate: Actual baud rate
         - fax_ecm: Whether ECM was used
         """
+        self._buffer_logs = True
+        self.timings = {}
+        started = time.perf_counter()
         try:
-            # 1. Update transmission status
-            self._update_transmission_status(freeswitch_data)
-            
-            # 2. Log transmission details
-            self._log_transmission_details(freeswitch_data)
+            # Stages 1-5 only change in-memory state and queue log rows
+            with self._stage('status'):
+                self._update_transmission_status(freeswitch_data)
             
-            # 3. Update contact if exists
-            self._update_contact_usage()
+            with self._stage('details'):
+                self._log_transmission_details(freeswitch_data)
             
-            # 4. Calculate and apply costs
-            self._calculate_costs()
+            with self._stage('costs'):
+                self._calculate_costs()
             
-            # 5. Send confirmation email
-            if self.account.send_fax_to_email:
-                self._send_confirmation_email()
+            with self._stage('retry'):
+                if self.transmission.status == 'failed':
+                    self._handle_retry()
             
-            # 6. Trigger webhooks
-            self._trigger_webhooks()
+            with self._stage('usage'):
+                self._update_account_usage()
             
-            # 7. Handle retries if failed
-            if self.transmission.status == 'failed':
-                self._handle_retry()
+            # 6. Write everything in one transaction
+            with self._stage('commit'):
+                self._commit()
             
-            # 8. Update account usage
-            self._update_account_usage()
+            # 7. Side effects once the data is durable
+            if self.account.notification_mode == 'digest':
+                # One summary email/webhook per account per window (send_fax_digests)
+                with self._stage('digest'):
+                    buffer_result(self.account, self.transmission, self._event_name(), self._result_data())
+            else:
+                with self._stage('email'):
+                    if self.account.send_fax_to_email:
+                        self._queue_confirmation_email()
+                
+                with self._stage('webhooks'):
+                    self._trigger_webhooks()
             
-            # 9. Archive if successful
-            if self.transmission.status == 'completed':
-                self._archive_transmission()
+            with self._stage('archive'):
+                if self.transmission.status == 'completed':
+                    self._archive_transmission()
             
-            self._log_info("Post-processing completed")
+            self.timings['total'] = self._elapsed_ms(started)
+            self._log_info("Post-processing completed", details={'timings_ms': self.timings})
+            self._flush_logs()
             return True
             
         except Exception as e:
             self._log_error(f"Post-processing failed: {str(e)}")
+            self._flush_logs()
             return False
+        finally:
+            self._buffer_logs = False
+    
+    @contextmanager
+    def _stage(self, name):
+        """Record wall time of a pipeline stage in self.timings (ms)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self._elapsed_ms(started)
+    
+    @staticmethod
+    def _elapsed_ms(started):
+        return round((time.perf_counter() - started) * 1000, 3)
+    
+    def _mark_dirty(self, *fields):
+        self._dirty_fields.update(fields)
+    
+    def _commit(self):
+        """Persist accumulated changes: one UPDATE per touched row plus one log INSERT"""
+        with transaction.atomic():
+            if self._dirty_fields:
+                self.transmission.save(update_fields=sorted(self._dirty_fields))
+                self._dirty_fields.clear()
+            
+            self._update_contact_usage()
+            
+            if self._pages_sent:
+                FaxAccount.objects.filter(pk=self.account.pk).update(
+                    pages_sent_this_month=F('pages_sent_this_month') + self._pages_sent
+                )
+                self.account.pages_sent_this_month += self._pages_sent
+                self._pages_sent = 0
+            
+            self._flush_logs()
+    
+    def _flush_logs(self):
+        if self._pending_logs:
+            FaxLog.objects.bulk_create(self._pending_logs)
+            self._pending_logs = []
     
     def _update_transmission_status(self, data):
         """Update transmission status based on FreeSWITCH result"""
         result = data.get('fax_result', 'FAILURE')
         
+        self._mark_dirty('status', 'pages', 'duration', 'baud_rate', 'ecm_used')
         if result == 'SUCCESS':
             self.transmission.status = 'completed'
             self.transmission.completed_at = datetime.now()
+            self._mark_dirty('completed_at')
             self._log_info("Transmission completed successfully")
         else:
             error = data.get('fax_error', 'Unknown error')
@@ -93,6 +160,7 @@ class TXFaxProcessor:
             
             self.transmission.error_code = data.get('fax_error_code', '')
             self.transmission.error_message = error
+            self._mark_dirty('error_code', 'error_message')
             self._log_error(f"Transmission failed: {error}")
         
         # Update transmission details
@@ -101,7 +169,7 @@ class TXFaxProcessor:
         self.transmission.baud_rate = data.get('fax_transfer_rate', 14400)
         self.transmission.ecm_used = data.get('fax_ecm', 'false').lower() == 'true'
         
-        self.transmission.save()
+        self.result_status = self.transmission.status
     
     def _log_transmission_details(self, data):
         """Log detailed transmission information"""
@@ -115,45 +183,29 @@ class TXFaxProcessor:
             'local_station_id': data.get('fax_local_station_id'),
         }
         
-        FaxLog.objects.create(
-            transmission=self.transmission,
-            level='info',
-            message='Transmission details',
-            details=details
-        )
+        self._log('info', 'Transmission details', details)
     
     def _update_contact_usage(self):
-        """Update contact usage statistics"""
-        try:
-            contact = FaxContact.objects.get(
-                account=self.account,
-                fax_number=self.transmission.recipient_number
-            )
-            contact.last_used = datetime.now()
-            contact.usage_count += 1
-            contact.save()
-        except FaxContact.DoesNotExist:
-            # Optionally create new contact
-            if self.transmission.status == 'completed':
-                FaxContact.objects.create(
-                    account=self.account,
-                    name=self.transmission.recipient_name or 'Auto-added',
-                    fax_number=self.transmission.recipient_number,
-                    last_used=datetime.now(),
-                    usage_count=1
-                )
+        """Update contact usage statistics (single upsert)"""
+        # New contacts are only auto-added for delivered faxes
+        FaxContact.objects.record_usage(
+            self.account,
+            [self.transmission.recipient_number],
+            names={self.transmission.recipient_number: self.transmission.recipient_name},
+            create_missing=self.transmission.status == 'completed'
+        )
     
     def _calculate_costs(self):
         """Calculate transmission costs"""
         if self.transmission.status == 'completed':
             self.transmission.cost = self.transmission.calculate_cost()
-            self.transmission.save()
+            self._mark_dirty('cost')
             self._log_info(f"Cost calculated: ${self.transmission.cost:.2f}")
     
-    def _send_confirmation_email(self):
-        """Send transmission confirmation email"""
+    def _queue_confirmation_email(self):
+        """Queue the transmission confirmation email (sent by send_fax_emails)"""
         try:
-            if self.transmission.status == 'completed':
+            if self.result_status == 'completed':
                 subject = f"Fax Sent Successfully to {self.transmission.recipient_number}"
                 status_text = "successfully sent"
             else:
@@ -166,39 +218,51 @@ Your fax transmission has been {status_text}.
 To: {self.transmission.recipient_number}
 Pages: {self.transmission.pages}
 Duration: {self.transmission.duration} seconds
-Status: {self.transmission.status}
+Status: {self.result_status}
 Cost: ${self.transmission.cost:.2f}
 
 Fax ID: {self.transmission.uuid}
 Sent: {self.transmission.started_at}
             """
             
-            if self.transmission.status != 'completed':
+            if self.result_status != 'completed':
                 body += f"\nError: {self.transmission.error_message}"
-                if self.transmission.retry_count < self.transmission.max_retries:
-                    body += f"\nRetry {self.transmission.retry_count + 1}/{self.transmission.max_retries} will be attempted."
+                if self.retry_scheduled:
+                    body += f"\nRetry {self.transmission.retry_count}/{self.transmission.max_retries} will be attempted."
             
-            email = EmailMessage(
+            email = queue_email(
+                to=[self.account.notification_email],
                 subject=subject,
                 body=body,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to=[self.account.notification_email],
+                transmission=self.transmission,
+                kind='confirmation'
             )
-            
-            email.send()
-            self._log_info(f"Confirmation email sent to {self.account.notification_email}")
+            self._log_info(f"Confirmation email #{email.pk} queued for {self.account.notification_email}")
             
         except Exception as e:
             self._log_error(f"Email notification failed: {str(e)}")
     
+    def _event_name(self):
+        return 'fax.sent' if self.result_status == 'completed' else 'fax.failed'
+    
+    def _result_data(self):
+        """Result fields shared by the per-fax webhook and digest entries"""
+        data = {
+            'uuid': str(self.transmission.uuid),
+            'from': self.transmission.sender_number,
+            'to': self.transmission.recipient_number,
+            'pages': self.transmission.pages,
+            'duration': self.transmission.duration,
+            'status': self.result_status,
+            'cost': float(self.transmission.cost),
+        }
+        if self.result_status != 'completed':
+            data['error'] = self.transmission.error_message
+        return data
+    
     def _trigger_webhooks(self):
         """Trigger appropriate webhooks"""
-        if self.transmission.status == 'completed':
-            event_type = 'on_sent'
-            event_name = 'fax.sent'
-        else:
-            event_type = 'on_failed'
-            event_name = 'fax.failed'
+        event_type = 'on_sent' if self.result_status == 'completed' else 'on_failed'
         
         webhooks = FaxWebhook.objects.filter(
             account=self.account,
@@ -206,7 +270,7 @@ Sent: {self.transmission.started_at}
         ).filter(**{event_type: True})
         
         for webhook in webhooks:
-            self._send_webhook(webhook, event_name)
+            self._send_webhook(webhook, self._event_name())
     
     def _send_webhook(self, webhook, event_name):
         """Send webhook notification"""
@@ -214,51 +278,12 @@ Sent: {self.transmission.started_at}
             payload = {
                 'event': event_name,
                 'timestamp': datetime.now().isoformat(),
-                'data': {
-                    'uuid': str(self.transmission.uuid),
-                    'from': self.transmission.sender_number,
-                    'to': self.transmission.recipient_number,
-                    'pages': self.transmission.pages,
-                    'duration': self.transmission.duration,
-                    'status': self.transmission.status,
-                    'cost': float(self.transmission.cost),
-                }
+                'data': self._result_data()
             }
-            
-            if self.transmission.status != 'completed':
-                payload['data']['error'] = self.transmission.error_message
-            
-            # Calculate signature
-            signature = hmac.new(
-                webhook.secret_key.encode(),
-                json.dumps(payload).encode(),
-                hashlib.sha256
-            ).hexdigest()
-            
-            headers = {
-                'Content-Type': 'application/json',
-                'X-Fax-Signature': signature
-            }
-            
-            response = requests.post(
-                webhook.url,
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                webhook.last_triggered = datetime.now()
-                webhook.failure_count = 0
-            else:
-                webhook.failure_count += 1
-            
-            webhook.save()
+            post_webhook(webhook, payload)
             self._log_info(f"Webhook triggered: {webhook.url}")
             
         except Exception as e:
-            webhook.failure_count += 1
-            webhook.save()
             self._log_error(f"Webhook failed: {str(e)}")
     
     def _handle_retry(self):
@@ -273,22 +298,18 @@ Sent: {self.transmission.started_at}
             
             # Reset status for retry
             self.transmission.status = 'queued'
-            self.transmission.save()
+            self._mark_dirty('status', 'retry_count')
+            self.retry_scheduled = True
             
             # In production, use Celery or similar for delayed execution
             # For now, just log the intention
-            FaxLog.objects.create(
-                transmission=self.transmission,
-                level='info',
-                message=f'Retry scheduled',
-                details={'retry_count': self.transmission.retry_count, 'delay': retry_delay}
-            )
+            self._log('info', 'Retry scheduled', {'retry_count': self.transmission.retry_count, 'delay': retry_delay})
     
     def _update_account_usage(self):
         """Update account usage statistics"""
         if self.transmission.status == 'completed':
-            self.account.pages_sent_this_month += self.transmission.pages
-            self.account.save()
+            # Applied as an F() increment in _commit() so concurrent completions don't race
+            self._pages_sent = self.transmission.pages
     
     def _archive_transmission(self):
         """Archive successful transmission"""
@@ -363,7 +384,7 @@ Sent: {self.transmission.started_at}
             # Update transmission status
             self.transmission.status = 'cancelled'
             self.transmission.completed_at = datetime.now()
-            self.transmission.save()
+            self.transmission.save(update_fields=['status', 'completed_at'])
             
             self._log_info(f"Transmission cancelled: {result}")
             return True
@@ -372,20 +393,25 @@ Sent: {self.transmission.started_at}
             self._log_error(f"Cancellation failed: {str(e)}")
             return False
     
-    def _log_info(self, message):
-        """Log info message"""
-        FaxLog.objects.create(
+    def _log(self, level, message, details=None):
+        """Write a FaxLog row, or queue it while process_completion is running"""
+        entry = FaxLog(
             transmission=self.transmission,
-            level='info',
-            message=message
+            level=level,
+            message=message,
+            details=details
         )
+        if self._buffer_logs:
+            self._pending_logs.append(entry)
+        else:
+            entry.save()
+    
+    def _log_info(self, message, details=None):
+        """Log info message"""
+        self._log('info', message, details)
         print(f"[INFO] {message}")
     
-    def _log_error(self, message):
+    def _log_error(self, message, details=None):
         """Log error message"""
-        FaxLog.objects.create(
-            transmission=self.transmission,
-            level='error',
-            message=message
-        )
+        self._log('error', message, details)
         print(f"[ERROR] {message}")
\ No newline at end of file
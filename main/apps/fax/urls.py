@@ -1,18 +1,34 @@
 from django.urls import path
 from .views import (
     SendFaxView,
+    BatchFaxView,
+    BatchFaxStatusView,
     UploadFaxFileView,
     FaxStatusView,
+    BulkFaxStatusView,
     FaxListView,
-    InboundFaxWebhookView
+    FaxSearchView,
+    FaxDownloadView,
+    InboundFaxWebhookView,
+    TelnyxOrderWebhookView,
+    TelnyxFaxWebhookView,
+    DIDProvisionView
 )
 
 app_name = 'fax'
 
 urlpatterns = [
     path('send/', SendFaxView.as_view(), name='send-fax'),
+    path('batch/', BatchFaxView.as_view(), name='batch-fax'),
+    path('batch/<uuid:uuid>/', BatchFaxStatusView.as_view(), name='batch-fax-status'),
     path('upload/', UploadFaxFileView.as_view(), name='upload-file'),
     path('status/<uuid:uuid>/', FaxStatusView.as_view(), name='fax-status'),
+    path('status/bulk/', BulkFaxStatusView.as_view(), name='fax-status-bulk'),
     path('list/', FaxListView.as_view(), name='fax-list'),
+    path('search/', FaxSearchView.as_view(), name='fax-search'),
+    path('download/<str:token>/', FaxDownloadView.as_view(), name='fax-download'),
     path('webhook/inbound/', InboundFaxWebhookView.as_view(), name='inbound-webhook'),
+    path('webhook/telnyx/orders/', TelnyxOrderWebhookView.as_view(), name='telnyx-order-webhook'),
+    path('webhook/telnyx/faxes/', TelnyxFaxWebhookView.as_view(), name='telnyx-fax-webhook'),
+    path('dids/provision/', DIDProvisionView.as_view(), name='did-provision'),
 ]
\ No newline at end of file
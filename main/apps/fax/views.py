@@ -2,20 +2,34 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from django.core import signing
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils import timezone
 import os
 import uuid
+from datetime import datetime, time, timedelta
 
-from .models import FaxTransaction, FaxQueue
+from .models import FaxTransaction, FaxQueue, FaxBatchJob
+from .models_complete import Tenant
 from .serializers import (
     FaxTransactionSerializer, 
     SendFaxSerializer, 
-    FaxStatusSerializer
+    FaxStatusSerializer,
+    BulkFaxStatusSerializer,
+    BatchFaxSerializer,
+    FaxBatchJobSerializer,
+    DIDProvisionSerializer,
+    FaxSearchSerializer
 )
 from .fax_handler import FaxHandler
+from .batch import create_batch_job, iter_csv_manifest, ManifestError
+from .telnyx_integration import TelnyxDIDManager
+from .search import FaxSearch
+from .mailer import download_path
 from main.apps.core.vars import TXFAX_DIR, RXFAX_DIR
 
 
@@ -32,7 +46,8 @@ class SendFaxView(APIView):
             "username": "908509999999",
             "filename": "document.pdf",
             "numbers": "05319999999,05329999999",
-            "is_enhanced": false
+            "is_enhanced": false,
+            "variables": {"to_name": "Ann", "subject": "Invoice"}
          }'
     ```
     """
@@ -56,7 +71,8 @@ class SendFaxView(APIView):
             file_path=data['filename'],
             numbers=data['numbers'],
             is_enhanced=data.get('is_enhanced', False),
-            user=request.user
+            user=request.user,
+            variables=data.get('variables')
         )
         
         if result['success']:
@@ -75,6 +91,114 @@ class SendFaxView(APIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class BatchFaxView(APIView):
+    """
+    Create a batch job: a different document and/or cover page per recipient
+    
+    Rows are stored in a job table and sent by the `dispatch_fax_batches`
+    management command; poll `/api/fax/batch/{uuid}/` for progress.
+    
+    Example (JSON):
+    ```
+    curl -X POST http://127.0.0.1:8000/api/fax/batch/ \
+         -H 'Authorization: Token YOUR_TOKEN' \
+         -H 'Content-Type: application/json' \
+         -d '{
+            "username": "908509999999",
+            "items": [
+                {"filename": "a.pdf", "number": "05319999999", "variables": {"to_name": "Ann"}},
+                {"filename": "b.pdf", "number": "05329999999"}
+            ]
+         }'
+    ```
+    
+    Example (CSV manifest with `filename,number,...` header):
+    ```
+    curl -X POST http://127.0.0.1:8000/api/fax/batch/ \
+         -H 'Authorization: Token YOUR_TOKEN' \
+         -F 'username=908509999999' \
+         -F 'manifest=@/path/to/manifest.csv'
+    ```
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    
+    def post(self, request):
+        serializer = BatchFaxSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        rows = data.get('items') or iter_csv_manifest(data['manifest'])
+        
+        try:
+            job = create_batch_job(
+                user=request.user,
+                sender_number=data['username'],
+                rows=rows,
+                is_enhanced=data['is_enhanced']
+            )
+        except ManifestError as e:
+            return Response(
+                {'status': 'Error', 'code': 400, 'message': str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({
+            'status': 'OK',
+            'code': 202,
+            'job': FaxBatchJobSerializer(job).data
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class BatchFaxStatusView(APIView):
+    """
+    Aggregate progress of a batch job
+    
+    Example:
+    ```
+    curl -X GET http://127.0.0.1:8000/api/fax/batch/UUID/ \
+         -H 'Authorization: Token YOUR_TOKEN'
+    ```
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, uuid=None):
+        jobs = FaxBatchJob.objects.all()
+        if not request.user.is_staff:
+            jobs = jobs.filter(user=request.user)
+        
+        job = jobs.filter(uuid=uuid).first()
+        if job is None:
+            return Response(
+                {'error': 'Batch job not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response(FaxBatchJobSerializer(job).data, status=status.HTTP_200_OK)
+    
+    def delete(self, request, uuid=None):
+        """Cancel a job; rows not yet dispatched are skipped"""
+        jobs = FaxBatchJob.objects.filter(uuid=uuid, status__in=['pending', 'processing'])
+        if not request.user.is_staff:
+            jobs = jobs.filter(user=request.user)
+        
+        if not jobs.update(status='cancelled'):
+            return Response(
+                {'error': 'No active batch job found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        FaxBatchJob.objects.get(uuid=uuid).items.filter(status='pending').update(status='cancelled')
+        return Response({'status': 'OK', 'code': 200}, status=status.HTTP_200_OK)
+
+
 class UploadFaxFileView(APIView):
     """
     Upload a file for fax transmission
@@ -154,6 +278,48 @@ class FaxStatusView(APIView):
             )
 
 
+class BulkFaxStatusView(APIView):
+    """
+    Get the status of many fax transactions in one request
+    
+    Non-staff users only see their own transactions; anything else is
+    reported under `not_found`.
+    
+    Example:
+    ```
+    curl -X POST http://127.0.0.1:8000/api/fax/status/bulk/ \
+         -H 'Authorization: Token YOUR_TOKEN' \
+         -H 'Content-Type: application/json' \
+         -d '{"uuids": ["UUID1", "UUID2"], "include_items": false}'
+    ```
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        serializer = BulkFaxStatusSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        handler = FaxHandler()
+        found, missing = handler.get_fax_statuses(
+            list(dict.fromkeys(data['uuids'])),
+            user=None if request.user.is_staff else request.user,
+            include_items=data['include_items']
+        )
+        
+        return Response({
+            'count': len(found),
+            'results': found,
+            'not_found': missing
+        }, status=status.HTTP_200_OK)
+
+
 class FaxListView(APIView):
     """
     List all fax transactions for the authenticated user
@@ -193,6 +359,85 @@ class FaxListView(APIView):
         }, status=status.HTTP_200_OK)
 
 
+class FaxSearchView(APIView):
+    """
+    Full-text search over fax numbers, contact names, dates and OCR text
+    
+    Results are ranked (best match first) and paginated. Non-staff users
+    only see their own faxes; staff may narrow by `tenant_id`.
+    
+    Example:
+    ```
+    curl -X GET 'http://127.0.0.1:8000/api/fax/search/?q=acme+invoice&date_from=2026-01-01&page=1' \
+         -H 'Authorization: Token YOUR_TOKEN'
+    ```
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        serializer = FaxSearchSerializer(data=request.query_params)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        tenant = None
+        if request.user.is_staff and data.get('tenant_id'):
+            tenant = Tenant.objects.filter(pk=data['tenant_id']).first()
+            if tenant is None:
+                return Response({'error': 'Tenant not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        def day_start(day):
+            return timezone.make_aware(datetime.combine(day, time.min)) if day else None
+        
+        search = FaxSearch(
+            data['q'],
+            user=None if request.user.is_staff else request.user,
+            tenant=tenant,
+            direction=data.get('direction'),
+            source=data.get('source'),
+            date_from=day_start(data.get('date_from')),
+            date_to=day_start(data['date_to'] + timedelta(days=1)) if data.get('date_to') else None
+        )
+        total, results = search.page(data['page'], data['page_size'])
+        
+        return Response({
+            'count': total,
+            'page': data['page'],
+            'page_size': data['page_size'],
+            'results': results
+        }, status=status.HTTP_200_OK)
+
+
+class FaxDownloadView(APIView):
+    """
+    Download a fax file from a link in a notification email
+    
+    Faxes above FAX_EMAIL_ATTACHMENT_LIMIT are emailed as signed links
+    instead of attachments; the signature is the only credential and
+    expires after FAX_EMAIL_LINK_DAYS.
+    """
+    authentication_classes = []
+    permission_classes = []
+    
+    def get(self, request, token=None):
+        try:
+            path = download_path(token)
+        except signing.SignatureExpired:
+            return Response({'error': 'Link expired'}, status=status.HTTP_410_GONE)
+        except signing.BadSignature:
+            return Response({'error': 'Invalid link'}, status=status.HTTP_404_NOT_FOUND)
+        
+        if not path or not os.path.isfile(path):
+            return Response({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+
 class InboundFaxWebhookView(APIView):
     """
     Webhook endpoint for receiving inbound fax notifications from FreeSWITCH
@@ -212,6 +457,14 @@ class InboundFaxWebhookView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        try:
+            pages = int(request.data.get('pages', 0) or 0)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'pages must be a whole number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
         file_path = os.path.join(RXFAX_DIR, file_name)
         
         # Create transaction record
@@ -219,10 +472,133 @@ class InboundFaxWebhookView(APIView):
         transaction = handler.receive_fax(
             caller_number=caller_number,
             called_number=called_number,
-            file_path=file_path
+            file_path=file_path,
+            call_uuid=request.data.get('call_uuid'),
+            pages=pages
         )
         
         return Response({
             'status': 'OK',
             'uuid': str(transaction.uuid)
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+class TelnyxOrderWebhookView(APIView):
+    """
+    Webhook endpoint for Telnyx number order events
+    
+    The payload is only used to learn which order changed; the order is
+    re-read from the Telnyx API before any DID is touched, so a forged
+    request can't activate numbers.
+    """
+    authentication_classes = []  # No auth for webhook
+    permission_classes = []
+    
+    def post(self, request):
+        data = request.data.get('data') or {}
+        event_type = data.get('event_type', '')
+        order_id = (data.get('payload') or {}).get('id')
+        
+        if not event_type.startswith('number_order') or not order_id:
+            return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
+        
+        manager = TelnyxDIDManager()
+        order = manager.get_order(order_id)
+        if order is None:
+            # Let Telnyx retry; sync_telnyx_orders picks it up otherwise
+            return Response({'error': 'Order lookup failed'}, status=status.HTTP_502_BAD_GATEWAY)
+        
+        return Response({
+            'status': 'OK',
+            'updated': manager.complete_order(order)
+        }, status=status.HTTP_200_OK)
+
+
+class TelnyxFaxWebhookView(APIView):
+    """
+    Webhook endpoint for Telnyx fax events
+    
+    Marks queue items sent through the Telnyx transport as processed once
+    the fax is delivered or failed, which also takes them out of the
+    transport's in-flight count. The status is re-read from the Telnyx API.
+    """
+    authentication_classes = []  # No auth for webhook
+    permission_classes = []
+    
+    FINAL_STATUSES = ('delivered', 'failed')
+    
+    def post(self, request):
+        data = request.data.get('data') or {}
+        event_type = data.get('event_type', '')
+        fax_id = (data.get('payload') or {}).get('fax_id')
+        
+        if not event_type.startswith('fax.') or not fax_id:
+            return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
+        
+        fax = TelnyxDIDManager().get_fax_status(fax_id)
+        if fax is None:
+            return Response({'error': 'Fax lookup failed'}, status=status.HTTP_502_BAD_GATEWAY)
+        if fax['status'] not in self.FINAL_STATUSES:
+            return Response({'status': 'OK', 'updated': 0}, status=status.HTTP_200_OK)
+        
+        updated = FaxQueue.objects.filter(job_uuid=fax_id, transport='telnyx', is_processed=False).update(
+            is_processed=True,
+            processed_at=timezone.now(),
+            event_name=f"fax.{fax['status']}",
+            updated_at=timezone.now()
+        )
+        return Response({'status': 'OK', 'updated': updated}, status=status.HTTP_200_OK)
+
+
+class DIDProvisionView(APIView):
+    """
+    Order DIDs for a tenant across several area codes (staff only)
+    
+    The area codes are searched concurrently and the numbers are bought in
+    a single Telnyx number order. The DIDs come back inactive with
+    `provisioning_status="pending"` and are activated by the order webhook.
+    
+    Example:
+    ```
+    curl -X POST http://127.0.0.1:8000/api/fax/dids/provision/ \
+         -H 'Authorization: Token YOUR_TOKEN' \
+         -H 'Content-Type: application/json' \
+         -d '{"tenant_id": 1, "area_codes": ["212", "646", "917"], "quantity": 200}'
+    ```
+    """
+    authentication_classes = [TokenAuthentication]
+    permission_classes = [IsAdminUser]
+    
+    def post(self, request):
+        serializer = DIDProvisionSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(
+                {'error': 'Invalid data', 'details': serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        data = serializer.validated_data
+        tenant = Tenant.objects.filter(pk=data['tenant_id']).first()
+        if tenant is None:
+            return Response({'error': 'Tenant not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        dids = TelnyxDIDManager().provision_numbers(
+            tenant,
+            area_codes=data['area_codes'],
+            quantity=data['quantity'],
+            country=data['country']
+        )
+        if not dids:
+            return Response(
+                {'error': 'No numbers could be ordered'},
+                status=status.HTTP_502_BAD_GATEWAY
+            )
+        
+        return Response({
+            'status': 'OK',
+            'code': 202,
+            'requested': data['quantity'],
+            'ordered': len(dids),
+            'order_id': dids[0].provider_order_id,
+            'numbers': [did.number for did in dids]
+        }, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from .models import Gateway, GatewayReload
+
+
+class GatewayAdmin(admin.ModelAdmin):
+	list_display = ("name", "profile", "username", "realm", "register", "is_active", "modified",)
+	list_filter = ("profile", "register", "is_active",)
+	search_fields = ["name", "username", "realm"]
+
+class GatewayReloadAdmin(admin.ModelAdmin):
+	list_display = ("name", "profile", "action", "created",)
+
+	def has_add_permission(self, request):
+		return False
+
+admin.site.register(Gateway, GatewayAdmin)
+admin.site.register(GatewayReload, GatewayReloadAdmin)
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class GatewayConfig(AppConfig):
+	default_auto_field = 'django.db.models.AutoField'
+	name = 'main.apps.gateway'
+
+	def ready(self):
+		from . import signals  # noqa: F401
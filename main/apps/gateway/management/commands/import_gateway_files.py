@@ -0,0 +1,32 @@
+import os
+from django.core.management.base import BaseCommand
+from main.apps.core.gateway.gateway import GateWay
+from main.apps.gateway.models import Gateway
+
+KNOWN_PARAMS = ('username', 'password', 'realm', 'proxy', 'register')
+
+
+class Command(BaseCommand):
+	help = 'Load gateways from the per-gateway XML files under sip_profiles/external into the database'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--path', default=GateWay.path, help='Directory holding <username>.xml files')
+
+	def handle(self, *args, **options):
+		GateWay.path = os.path.join(options['path'], '')
+		imported = 0
+		for entry in os.scandir(GateWay.path):
+			if not entry.is_file() or not entry.name.endswith('.xml'):
+				continue
+			for gw in GateWay(entry.name[:-4], "", "", "").root.findall('gateway'):
+				params = {p.get('name'): p.get('value') for p in gw.iter('param')}
+				Gateway.objects.update_or_create(name=gw.get('name'), defaults={
+					'username': params.get('username', ''),
+					'password': params.get('password', ''),
+					'realm': params.get('realm', ''),
+					'proxy': params.get('proxy', ''),
+					'register': params.get('register') == 'true',
+					'params': {k: v for k, v in params.items() if k not in KNOWN_PARAMS},
+				})
+				imported += 1
+		self.stdout.write("Imported %d gateways" % imported)
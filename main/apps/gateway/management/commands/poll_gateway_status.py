@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from main.apps.core.gateway.status import refresh_gateway_status, STATUS_TTL
+
+
+class Command(BaseCommand):
+	help = 'Refresh the cached `sofia xmlstatus gateway` snapshot'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--loop', action='store_true', help='Keep refreshing')
+		parser.add_argument('--interval', type=float, default=STATUS_TTL / 2, help='Seconds between refreshes with --loop')
+
+	def handle(self, *args, **options):
+		while True:
+			try:
+				snapshot = refresh_gateway_status()
+				self.stdout.write("%d gateways at %s" % (len(snapshot["gateways"]), snapshot["fetched_at"]))
+			except ConnectionError as e:
+				self.stderr.write(str(e))
+			if not options['loop']:
+				return
+			time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from main.apps.core.gateway.reload import GatewayReloader
+
+
+class Command(BaseCommand):
+	help = 'Apply queued gateway changes to FreeSWITCH in debounced batches'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--quiet', type=float, default=2, help='Seconds without new changes before a batch is applied')
+		parser.add_argument('--max-delay', type=float, default=30, help='Apply a batch at most this long after its first change')
+		parser.add_argument('--loop', action='store_true', help='Keep polling for changes')
+		parser.add_argument('--interval', type=float, default=1, help='Seconds between polls with --loop')
+		parser.add_argument('--now', action='store_true', help="Apply everything queued without waiting")
+
+	def handle(self, *args, **options):
+		reloader = GatewayReloader(quiet=options['quiet'], max_delay=options['max_delay'])
+		while True:
+			try:
+				commands = reloader.apply(force=options['now'])
+			except ConnectionError as e:
+				self.stderr.write(str(e))
+				commands = []
+			for command in commands:
+				self.stdout.write("sofia %s" % command)
+			if not options['loop']:
+				return
+			time.sleep(options['interval'])
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Gateway',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('profile', models.CharField(default='external', max_length=50)),
+                ('username', models.CharField(max_length=100)),
+                ('password', models.CharField(blank=True, max_length=100)),
+                ('realm', models.CharField(max_length=255)),
+                ('proxy', models.CharField(blank=True, max_length=255)),
+                ('register', models.BooleanField(default=False)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Extra <param> name/value pairs')),
+                ('is_active', models.BooleanField(default=True)),
+            ],
+            options={
+                'db_table': 'gateway',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='GatewayReload',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('profile', models.CharField(default='external', max_length=50)),
+                ('action', models.CharField(choices=[('rescan', 'Rescan'), ('kill', 'Kill')], max_length=10)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'gateway_reload',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import models
+from main.apps.core.models import TimeStampedModel
+
+
+class Gateway(TimeStampedModel):
+	"""SIP gateway served to FreeSWITCH through xml_curl (see main/apps/core/gateway/directory.py)"""
+	name = models.CharField(max_length=100, unique=True) # GATEWAY_PREFIX + username
+	profile = models.CharField(max_length=50, default='external')
+	username = models.CharField(max_length=100)
+	password = models.CharField(max_length=100, blank=True)
+	realm = models.CharField(max_length=255)
+	proxy = models.CharField(max_length=255, blank=True)
+	register = models.BooleanField(default=False)
+	params = models.JSONField(default=dict, blank=True, help_text='Extra <param> name/value pairs')
+	is_active = models.BooleanField(default=True)
+
+	class Meta:
+		db_table = 'gateway'
+		ordering = ['name']
+
+	def __str__(self):
+		return self.name
+
+	def get_params(self):
+		"""<param> name/value pairs in the order the old XML files used"""
+		params = [
+			('username', self.username),
+			('password', self.password),
+			('realm', self.realm),
+		]
+		if self.proxy:
+			params.append(('proxy', self.proxy))
+		params.append(('register', 'true' if self.register else 'false'))
+		params.extend((str(k), str(v)) for k, v in self.params.items())
+		return params
+
+
+class GatewayReload(models.Model):
+	"""Pending sofia change, applied in coalesced batches by reload_gateways"""
+	ACTION_CHOICES = [
+		('rescan', 'Rescan'), # new gateway: rescan picks it up
+		('kill', 'Kill'), # changed/removed gateway: killgw, then rescan re-adds it if still active
+	]
+	name = models.CharField(max_length=100)
+	profile = models.CharField(max_length=50, default='external')
+	action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+	created = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		db_table = 'gateway_reload'
+		ordering = ['id']
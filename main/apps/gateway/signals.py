@@ -0,0 +1,31 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from main.apps.core.gateway.directory import invalidate_gateways
+from .models import Gateway, GatewayReload
+
+
+@receiver(pre_save, sender=Gateway)
+def gateway_renamed(sender, instance, **kwargs):
+	"""A renamed (or moved) gateway must be killed under its old name"""
+	if not instance.pk:
+		return
+	old = Gateway.objects.filter(pk=instance.pk).values_list('name', 'profile').first()
+	if old and old != (instance.name, instance.profile):
+		GatewayReload.objects.create(name=old[0], profile=old[1], action='kill')
+
+
+@receiver(post_save, sender=Gateway)
+def gateway_saved(sender, instance, created, **kwargs):
+	GatewayReload.objects.create(
+		name=instance.name,
+		profile=instance.profile,
+		action='rescan' if created else 'kill'
+	)
+	transaction.on_commit(invalidate_gateways)
+
+
+@receiver(post_delete, sender=Gateway)
+def gateway_deleted(sender, instance, **kwargs):
+	GatewayReload.objects.create(name=instance.name, profile=instance.profile, action='kill')
+	transaction.on_commit(invalidate_gateways)
@@ -2,9 +2,13 @@ from django.urls import include, path
 from .views.operation import GatewayOperation
 from .views.check import GatewayCheck
 from .views.root import APIGatewayView
+from .views.directory import GatewayDirectory
+from .views.status import GatewayStatus
 
 urlpatterns = [
 	path('', APIGatewayView.as_view(), name="gateway"),
 	path('operation/', GatewayOperation.as_view(), name="operation"), #POST
 	path('check/', GatewayCheck.as_view(), name="check"),
+	path('status/', GatewayStatus.as_view(), name="gateway-status"),
+	path('directory/', GatewayDirectory.as_view(), name="directory"), # FreeSWITCH xml_curl
 ]
\ No newline at end of file
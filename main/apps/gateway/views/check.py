@@ -10,6 +10,7 @@ class GatewayCheck(APIView):
 * Requires token authentication.
 * Only users are able to access this view.
 * Params: [username].
+* Response carries the configured params in `body` and live sofia state (`state`, `status`, `ping_time`, call/failure counters) in `registration`, served from cache.
 
 ## CURL Example:
 
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.views import APIView
+from rest_framework import permissions
+from main.apps.core.gateway.directory import get_gateways_xml, NOT_FOUND
+from main.apps.core.vars import FREESWITCH_IP_ADDRESS
+
+# FreeSWITCH hosts allowed to fetch gateway credentials
+XML_CURL_ALLOWED_IPS = getattr(settings, 'GATEWAY_XML_CURL_ALLOWED_IPS', ['127.0.0.1', FREESWITCH_IP_ADDRESS])
+
+
+class GatewayDirectory(APIView):
+	"""
+### mod_xml_curl binding for gateways
+* Called by FreeSWITCH, not by API clients; restricted to `GATEWAY_XML_CURL_ALLOWED_IPS`.
+* Answers `section=directory&purpose=gateways` with the profile's active gateways, everything else with "not found".
+
+## xml_curl.conf.xml:
+
+	<binding name="gateways">
+	  <param name="gateway-url" value="http://127.0.0.1:8000/api/gateway/directory/" bindings="directory"/>
+	</binding>
+"""
+	authentication_classes = ()
+	permission_classes = (permissions.AllowAny,)
+
+	def post(self, request, *args, **kw):
+		if request.META.get('REMOTE_ADDR') not in XML_CURL_ALLOWED_IPS:
+			return HttpResponse(status=403)
+		params = request.POST
+		if params.get('section') != 'directory' or params.get('purpose') != 'gateways':
+			return HttpResponse(NOT_FOUND, content_type='text/xml')
+		profile = params.get('profile', 'external')
+		domain = params.get('domain') or FREESWITCH_IP_ADDRESS
+		return HttpResponse(get_gateways_xml(profile, domain), content_type='text/xml')
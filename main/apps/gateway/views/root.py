@@ -13,4 +13,5 @@ class APIGatewayView(APIView):
 		return Response({
 			'Operation': reverse('operation', request=request),
 			'Check': reverse('check', request=request),
+			'Status': reverse('gateway-status', request=request),
 			})
\ No newline at end of file
@@ -7,6 +7,8 @@ class CDRImportAdmin(admin.ModelAdmin):
 	date_hierarchy = 'starting_date'
 	list_display = ("callid", "caller_id_number", "caller_id_name", "destination_number", "starting_date", "duration", "billsec", "hangup_cause",)
 	using = 'cdr-pusher'
+	# CDR tables are large; avoid an extra unfiltered COUNT(*) per page
+	show_full_result_count = False
 	search_fields = ['callid', 'caller_id_number', 'caller_id_number', 'destination_number',]
 
 	def has_add_permission(self, request):
@@ -26,6 +28,7 @@ class CDRDetailedAdmin(admin.ModelAdmin):
 	list_display = ("uuid", "job_uuid", "cli", "cld", "event_name", "file",)
 	search_fields = ["uuid", "job_uuid", "cli", "cld", "file"]
 	using = 'cdr-pusher'
+	show_full_result_count = False
 	def save_model(self, request, obj, form, change):
 		# Tell Django to save objects to the 'other' database.
 		obj.save(using=self.using)
@@ -0,0 +1,70 @@
+import os
+import re
+import datetime as dt
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from main.apps.core.vars import RXFAX_DIR
+from main.apps.service.models import CDRImport, ReceivedFax
+
+RXFAX_NAME = re.compile(r"^rxfax-(?P<callid>[0-9a-fA-F-]+)\.tiff?$")
+
+class Command(BaseCommand):
+	help = "One-time scan of RXFAX_DIR into the rxfax_index table used by the fax inbox"
+
+	def add_arguments(self, parser):
+		parser.add_argument("--directory", default=RXFAX_DIR)
+		parser.add_argument("--batch-size", type=int, default=500)
+		parser.add_argument("--count-pages", action="store_true", help="Open each TIFF to count pages (slow on NFS)")
+		parser.add_argument("--database", default="cdr-pusher", help="Database holding cdr_import")
+
+	def handle(self, *args, **options):
+		batch = []
+		created = 0
+		# scandir returns names and cached stat data in one directory read
+		with os.scandir(options["directory"]) as entries:
+			for entry in entries:
+				match = RXFAX_NAME.match(entry.name)
+				if not match or not entry.is_file():
+					continue
+				batch.append((match.group("callid"), entry))
+				if len(batch) >= options["batch_size"]:
+					created += self.index_batch(batch, options)
+					batch = []
+		if batch:
+			created += self.index_batch(batch, options)
+		self.stdout.write("Indexed %d received faxes" % created)
+
+	def index_batch(self, batch, options):
+		callids = [callid for callid, _ in batch]
+		known = set(ReceivedFax.objects.filter(callid__in=callids).values_list("callid", flat=True))
+		cdrs = {}
+		for cdr in CDRImport.objects.using(options["database"]).filter(callid__in=callids)\
+				.values("callid", "caller_id_number", "destination_number", "starting_date"):
+			cdrs.setdefault(cdr["callid"], cdr)
+
+		rows = []
+		for callid, entry in batch:
+			if callid in known:
+				continue
+			stat = entry.stat()
+			cdr = cdrs.get(callid, {})
+			rows.append(ReceivedFax(
+				callid=callid,
+				caller_id_number=cdr.get("caller_id_number", ""),
+				destination_number=cdr.get("destination_number", ""),
+				starting_date=cdr.get("starting_date") or dt.datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+				file_name=entry.name,
+				file_path=entry.path,
+				file_size=stat.st_size,
+				pages=self.count_pages(entry.path) if options["count_pages"] else 0,
+			))
+		ReceivedFax.objects.bulk_create(rows, ignore_conflicts=True)
+		return len(rows)
+
+	def count_pages(self, path):
+		try:
+			from PIL import Image
+			with Image.open(path) as img:
+				return getattr(img, "n_frames", 1)
+		except Exception:
+			return 0
@@ -0,0 +1,96 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CDRImport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('switch', models.CharField(max_length=80)),
+                ('cdr_source_type', models.IntegerField(blank=True, null=True)),
+                ('callid', models.CharField(db_index=True, max_length=80)),
+                ('caller_id_number', models.CharField(max_length=80)),
+                ('caller_id_name', models.CharField(max_length=80)),
+                ('destination_number', models.CharField(max_length=80)),
+                ('dialcode', models.CharField(blank=True, max_length=10, null=True)),
+                ('state', models.CharField(blank=True, max_length=5, null=True)),
+                ('channel', models.CharField(blank=True, max_length=80, null=True)),
+                ('starting_date', models.DateTimeField()),
+                ('duration', models.IntegerField()),
+                ('billsec', models.IntegerField()),
+                ('progresssec', models.IntegerField(blank=True, null=True)),
+                ('answersec', models.IntegerField(blank=True, null=True)),
+                ('waitsec', models.IntegerField(blank=True, null=True)),
+                ('hangup_cause_id', models.IntegerField(blank=True, null=True)),
+                ('hangup_cause', models.CharField(blank=True, max_length=80, null=True)),
+                ('direction', models.IntegerField(blank=True, null=True)),
+                ('country_code', models.CharField(blank=True, max_length=3, null=True)),
+                ('accountcode', models.CharField(blank=True, max_length=40, null=True)),
+                ('buy_rate', models.DecimalField(blank=True, decimal_places=5, max_digits=10, null=True)),
+                ('buy_cost', models.DecimalField(blank=True, decimal_places=5, max_digits=12, null=True)),
+                ('sell_rate', models.DecimalField(blank=True, decimal_places=5, max_digits=10, null=True)),
+                ('sell_cost', models.DecimalField(blank=True, decimal_places=5, max_digits=12, null=True)),
+                ('extradata', models.TextField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'CDR General',
+                'verbose_name_plural': 'CDR General',
+                'db_table': 'cdr_import',
+                'ordering': ['-starting_date'],
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CDRDetailed',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('uuid', models.CharField(db_index=True, max_length=80)),
+                ('job_uuid', models.CharField(max_length=80)),
+                ('body', models.TextField(blank=True, null=True)),
+                ('cli', models.CharField(max_length=80)),
+                ('cld', models.CharField(max_length=80)),
+                ('event_name', models.CharField(max_length=80)),
+                ('file', models.CharField(max_length=80)),
+            ],
+            options={
+                'verbose_name': 'CDR Detailed',
+                'verbose_name_plural': 'CDR Detailed',
+                'db_table': 'cdr_detailed',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='ReceivedFax',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('callid', models.CharField(max_length=80, unique=True)),
+                ('caller_id_number', models.CharField(max_length=80)),
+                ('destination_number', models.CharField(max_length=80)),
+                ('starting_date', models.DateTimeField()),
+                ('file_name', models.CharField(max_length=255)),
+                ('file_path', models.CharField(max_length=500)),
+                ('file_size', models.BigIntegerField(default=0)),
+                ('pages', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Received Fax',
+                'verbose_name_plural': 'Received Faxes',
+                'db_table': 'rxfax_index',
+                'ordering': ['-starting_date', '-id'],
+                'indexes': [models.Index(fields=['destination_number', '-starting_date', '-id'], name='rxfax_inbox_idx')],
+            },
+        ),
+    ]
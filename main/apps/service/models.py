@@ -5,7 +5,7 @@ from main.apps.core.applabel import string_with_title
 class CDRImport(models.Model):
 	switch = models.CharField(max_length=80)
 	cdr_source_type = models.IntegerField(blank=True, null=True)
-	callid = models.CharField(max_length=80)
+	callid = models.CharField(max_length=80, db_index=True) # unmanaged: see Notes/cdr-state/cdr_import_indexes.sql
 	caller_id_number = models.CharField(max_length=80)
 	caller_id_name = models.CharField(max_length=80)
 	destination_number = models.CharField(max_length=80)
@@ -46,7 +46,7 @@ class CDRDetailed(TimeStampedModel):
 		app_label = 'service'
 		verbose_name_plural = verbose_name
 		managed = True
-	uuid = models.CharField(max_length=80)
+	uuid = models.CharField(max_length=80, db_index=True)
 	job_uuid = models.CharField(max_length=80)
 	body = models.TextField(blank=True, null=True)
 	cli = models.CharField(max_length=80)
@@ -54,8 +54,32 @@ class CDRDetailed(TimeStampedModel):
 	event_name = models.CharField(max_length=80)
 	file = models.CharField(max_length=80)
 
+class ReceivedFax(TimeStampedModel):
+	"""Index of received fax files, written at ingest so the inbox never stats the disk"""
+	class Meta:
+		db_table = "rxfax_index"
+		verbose_name = 'Received Fax'
+		app_label = 'service'
+		verbose_name_plural = 'Received Faxes'
+		ordering = ['-starting_date', '-id']
+		indexes = [
+			models.Index(fields=['destination_number', '-starting_date', '-id'], name='rxfax_inbox_idx'),
+		]
+	callid = models.CharField(max_length=80, unique=True)
+	caller_id_number = models.CharField(max_length=80)
+	destination_number = models.CharField(max_length=80)
+	starting_date = models.DateTimeField()
+	file_name = models.CharField(max_length=255)
+	file_path = models.CharField(max_length=500)
+	file_size = models.BigIntegerField(default=0)
+	pages = models.IntegerField(default=0)
+
 """
 To define this model on PostgresSQL database you shoud do:
 ./manage.py makemigrations service
 ./manage.py migrate service --database=cdr-pusher
+
+ReceivedFax (rxfax_index) lives in the default database:
+./manage.py migrate service
+./manage.py backfill_rxfax_index   # required once on upgrade: the inbox only lists indexed files
 """
\ No newline at end of file
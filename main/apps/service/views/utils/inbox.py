@@ -1,29 +1,76 @@
-from main.apps.service.models import CDRImport, CDRDetailed
+from main.apps.service.models import ReceivedFax
 import os
 import datetime as dt
-from main.apps.core.vars import RXFAX_DIR
+from django.db.models import Q
+from django.utils import timezone
+MAX_LIMIT = 1000
 class GeneralInbox(object):
-	def __init__(self, start_date, end_date, receivers):
-		self.start_date = dt.datetime.strptime(start_date, "%Y-%m-%d %H:%M")
-		self.end_date = dt.datetime.strptime(end_date, "%Y-%m-%d %H:%M")
+	"""
+	Received faxes for `receivers` between two dates, newest first.
+
+	Served from the rxfax_index table (see ReceivedFax), keyset-paginated:
+	pass the `next_cursor` of one page as `cursor` to get the next one.
+	"""
+	def __init__(self, start_date, end_date, receivers, limit=100, cursor=None):
+		self.start_date = self.parse_date(start_date)
+		self.end_date = self.parse_date(end_date)
 		self.receivers = receivers
-		self.fax_filename = ""
-	def file_exist(self, uuid):
-		self.fax_filename = "rxfax-%s.tiff" % uuid
-		file_path = "%s%s" % (RXFAX_DIR, self.fax_filename)
-		return os.path.exists(file_path)
+		self.limit = max(1, min(int(limit), MAX_LIMIT))
+		self.cursor = self.parse_cursor(cursor) if cursor else None
+		self.next_cursor = None
+	@staticmethod
+	def parse_date(value):
+		date = dt.datetime.strptime(value, "%Y-%m-%d %H:%M")
+		return timezone.make_aware(date) if timezone.is_naive(date) else date
+	@staticmethod
+	def parse_cursor(cursor):
+		# "<iso starting_date>|<id>" of the last row of the previous page
+		if not isinstance(cursor, str) or "|" not in cursor:
+			raise ValueError("Invalid cursor: %r" % (cursor,))
+		stamp, pk = cursor.rsplit("|", 1)
+		return dt.datetime.fromisoformat(stamp), int(pk)
+	@staticmethod
+	def make_cursor(fax):
+		return "%s|%s" % (fax.starting_date.isoformat(), fax.pk)
 	def getdata(self):
 		listo = []
-		cdr_imp = CDRImport.objects.using("cdr-pusher").order_by("-starting_date")\
+		rx_faxes = ReceivedFax.objects.order_by("-starting_date", "-id")\
 			.filter(starting_date__range=(self.start_date, self.end_date))\
 			.filter(destination_number__in=self.receivers)
-		for cdr in cdr_imp:
+		if self.cursor:
+			starting_date, pk = self.cursor
+			rx_faxes = rx_faxes.filter(Q(starting_date__lt=starting_date) | Q(starting_date=starting_date, id__lt=pk))
+		rows = list(rx_faxes[:self.limit + 1])
+		if len(rows) > self.limit:
+			rows = rows[:self.limit]
+			self.next_cursor = self.make_cursor(rows[-1])
+		for fax in rows:
 			dicto = {}
-			dicto["cli"] = cdr.caller_id_number
-			dicto["cld"] = cdr.destination_number
-			dicto["res_id"] = cdr.callid
-			dicto["fax_filename"] = self.fax_filename if self.file_exist(cdr.callid) else ""
-			dicto["datetime"] = cdr.starting_date.strftime("%Y-%m-%d %H:%M:%S")
+			dicto["cli"] = fax.caller_id_number
+			dicto["cld"] = fax.destination_number
+			dicto["res_id"] = fax.callid
+			dicto["fax_filename"] = fax.file_name
+			dicto["size"] = fax.file_size
+			dicto["pages"] = fax.pages
+			dicto["datetime"] = fax.starting_date.strftime("%Y-%m-%d %H:%M:%S")
 			listo.append(dicto)
 		return listo
 
+def index_received_fax(callid, caller_id_number, destination_number, starting_date, file_path, pages=0):
+	"""Record a received fax in rxfax_index; called once at ingest"""
+	try:
+		file_size = os.path.getsize(file_path)
+	except OSError:
+		file_size = 0
+	if timezone.is_naive(starting_date):
+		starting_date = timezone.make_aware(starting_date)
+	fax, _ = ReceivedFax.objects.update_or_create(callid=callid, defaults={
+		"caller_id_number": caller_id_number or "",
+		"destination_number": destination_number or "",
+		"starting_date": starting_date,
+		"file_name": os.path.basename(file_path),
+		"file_path": file_path,
+		"file_size": file_size,
+		"pages": pages or 0,
+	})
+	return fax
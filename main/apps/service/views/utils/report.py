@@ -1,26 +1,26 @@
+from django.db.models import Count, Case, When, Max, OuterRef, Subquery, Q
 from main.apps.service.models import CDRImport, CDRDetailed
 class GeneralReport(object):
 	def __init__(self, uuid):
 		self.uuid = uuid
 	def getdata(self):
 		args = {}
-		count = 0
-		delivered = 0
-		undelivered = 0
-		sender = ""
-		cdr_det = CDRDetailed.objects.using("cdr-pusher").filter(uuid=self.uuid)
-		for cdr_d in cdr_det:
-			cdr_imp = CDRImport.objects.using("cdr-pusher").filter(callid=cdr_d.job_uuid).first()
-			if cdr_imp:
-				count += 1
-				if cdr_imp.duration > 0:
-					delivered += 1
-				else:
-					undelivered += 1
-				sender = cdr_d.cli
-		args["count"] = count
-		args["delivered"] = delivered
-		args["undelivered"] = undelivered
+		# Duration of the latest CDR for each job, resolved in the same query
+		# (uses the cdr_import.callid / cdr_detailed.uuid indexes)
+		imp_duration = CDRImport.objects.using("cdr-pusher")\
+			.filter(callid=OuterRef("job_uuid"))\
+			.order_by("-starting_date").values("duration")[:1]
+		totals = CDRDetailed.objects.using("cdr-pusher").filter(uuid=self.uuid)\
+			.annotate(imp_duration=Subquery(imp_duration))\
+			.aggregate(
+				count=Count("imp_duration"),
+				delivered=Count(Case(When(imp_duration__gt=0, then=1))),
+				undelivered=Count(Case(When(imp_duration__lte=0, then=1))),
+				sender=Max("cli", filter=Q(imp_duration__isnull=False)),
+			)
+		args["count"] = totals["count"]
+		args["delivered"] = totals["delivered"]
+		args["undelivered"] = totals["undelivered"]
 		args["uuid"] = self.uuid
-		args["sender"] = sender
+		args["sender"] = totals["sender"] or ""
 		return args
\ No newline at end of file
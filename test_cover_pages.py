@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""Render cover pages in front of a sample TIFF (no database or FreeSWITCH needed)"""
+
+import os
+import tempfile
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from PIL import Image, ImageDraw
+from django.utils import timezone
+from main.apps.fax import coverpage
+from main.apps.fax.coverpage import CoverRenderer, CoverPageError, cover_fields, read_tiff
+from main.apps.fax.models_complete import CoverPage, Tenant
+from check_helpers import check, finish
+
+print("Cover Page Test")
+print("=" * 40)
+
+
+workdir = tempfile.mkdtemp()
+coverpage.COVER_LAYER_DIR = os.path.join(workdir, 'layers')
+
+
+def document(path, dpi, compression):
+    pages = [Image.new('1', (1728, dpi[1] * 11), 1) for _ in range(2)]
+    for number, page in enumerate(pages, 1):
+        ImageDraw.Draw(page).text((100, 100), f"Page {number}", fill=0)
+    pages[0].save(path, compression=compression, dpi=dpi, save_all=True, append_images=pages[1:])
+    with open(path, 'rb') as f:
+        return read_tiff(f.read())
+
+
+tenant = Tenant(name='Test', company_name='Test Co', updated_at=timezone.now())
+cover = CoverPage(pk=1, name='Test', tenant=tenant, custom_field_1_label='Account', updated_at=timezone.now())
+fields = cover_fields(None, '2125550100', '3105550100', {'to_name': 'Ann', 'subject': 'Invoice', 'custom_1': 'A-1'})
+
+for resolution, dpi, compression in (('standard', (204, 98), 'group3'), ('fine', (204, 196), 'group4')):
+    path = os.path.join(workdir, f'{resolution}.tiff')
+    source = document(path, dpi, compression)
+    renderer = CoverRenderer(cover, output_dir=workdir)
+    output = renderer.render(path, fields)
+    with open(output, 'rb') as f:
+        pages = read_tiff(f.read())
+
+    check(f"{resolution}: cover added in front", len(pages) == len(source) + 1)
+    check(f"{resolution}: document strips copied byte for byte", all(
+        [bytes(strip) for strip in copied[1]] == [bytes(strip) for strip in original[1]]
+        for copied, original in zip(pages[1:], source)
+    ))
+    with Image.open(output) as image:
+        check(f"{resolution}: cover is a {dpi[0]}x{dpi[1]} bilevel page",
+              image.mode == '1' and image.size == (1728, dpi[1] * 11)
+              and tuple(round(v) for v in image.info['dpi']) == dpi)
+    check(f"{resolution}: cover compressed like the document",
+          pages[0][0][coverpage.COMPRESSION][1] == source[0][0][coverpage.COMPRESSION][1])
+    check(f"{resolution}: static layer cached", any(resolution in name for name in os.listdir(coverpage.COVER_LAYER_DIR)))
+
+layers = len(coverpage._layers)
+CoverRenderer(cover, output_dir=workdir).render(os.path.join(workdir, 'standard.tiff'), fields)
+check("second send reuses the cached layer", len(coverpage._layers) == layers)
+
+cover.updated_at = timezone.now()
+CoverRenderer(cover, output_dir=workdir).render(os.path.join(workdir, 'standard.tiff'), fields)
+check("edited cover replaces its cached layer",
+      len([name for name in os.listdir(coverpage.COVER_LAYER_DIR) if name.endswith('-standard.png')]) == 1)
+
+bad = os.path.join(workdir, 'bad.tiff')
+with open(bad, 'w') as f:
+    f.write('not a tiff')
+try:
+    CoverRenderer(cover, output_dir=workdir).render(bad, fields)
+    check("rejects a non-TIFF document", False)
+except CoverPageError:
+    check("rejects a non-TIFF document", True)
+
+finish()
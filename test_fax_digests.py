@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""Check digest due/claim logic and per-webhook delivery (rolled back; no SMTP or webhook server needed)"""
+
+import os
+import django
+from datetime import timedelta
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from main.apps.fax import notifications
+from main.apps.fax.notifications import DigestRunner, buffer_result, DIGEST_STALE_AFTER
+from main.apps.fax.models_extended import FaxAccount, FaxWebhook, FaxDigestItem, FaxEmail
+from check_helpers import check, finish
+
+print("Fax Digest Test")
+print("=" * 40)
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+posts = []
+down = set()
+
+
+def fake_post(url, data=None, headers=None, timeout=None):
+    posts.append(url)
+    return Response(500 if url in down else 200)
+
+
+def account(name, minutes=5):
+    user = User.objects.create(username=f"digest-test-{name}")
+    return FaxAccount.objects.create(
+        user=user, fax_number=f"1555000{len(name):04d}", notification_email=f"{name}@example.com",
+        notification_mode='digest', digest_minutes=minutes
+    )
+
+
+def age(acct, minutes):
+    FaxDigestItem.objects.filter(account=acct).update(created_at=timezone.now() - timedelta(minutes=minutes))
+
+
+def emails(acct):
+    sent = FaxEmail.objects.filter(kind='digest').values_list('to_addresses', flat=True)
+    return sum(1 for to in sent if to == [acct.notification_email])
+
+
+notifications.requests.post = fake_post
+runner = DigestRunner()
+
+with transaction.atomic():
+    a = account('alpha')
+    for n in range(3):
+        buffer_result(a, None, 'fax.sent', {'to': f'21255501{n:02d}', 'status': 'completed', 'pages': 1})
+    check("not due before digest_minutes", a.pk not in runner.due_accounts())
+    age(a, 6)
+    check("due once the oldest result is digest_minutes old", a.pk in runner.due_accounts())
+
+    token, items = runner.claim(a.pk)
+    check("claim takes every waiting result", len(items) == 3)
+    check("claimed results are not due again", a.pk not in runner.due_accounts())
+    check("a second claim gets nothing", runner.claim(a.pk)[1] == [])
+    FaxDigestItem.objects.filter(claim=token).update(claimed_at=timezone.now() - DIGEST_STALE_AFTER * 2)
+    check("stale claims are released", runner.requeue_stale() == 3)
+
+    b = account('bravo-large', minutes=60)
+    notifications.DIGEST_MAX_ITEMS = 2
+    buffer_result(b, None, 'fax.failed', {'status': 'failed'})
+    buffer_result(b, None, 'fax.failed', {'status': 'failed'})
+    check("due early at DIGEST_MAX_ITEMS results", b.pk in runner.due_accounts())
+    notifications.DIGEST_MAX_ITEMS = 500
+    FaxDigestItem.objects.filter(account=b).delete()
+
+    ok_hook = FaxWebhook.objects.create(account=a, url='https://ok.example.com/hook')
+    bad_hook = FaxWebhook.objects.create(account=a, url='https://down.example.com/hook')
+    down.add(bad_hook.url)
+    runner.run_once()
+    check("one digest email queued", emails(a) == 1)
+    check("both webhooks called", sorted(posts) == sorted([ok_hook.url, bad_hook.url]))
+    kept = list(FaxDigestItem.objects.filter(account=a))
+    check("results kept while a webhook fails", len(kept) == 3 and all(item.claim for item in kept))
+    check("delivery recorded per webhook", all(item.delivered_to == [ok_hook.pk] for item in kept))
+
+    posts.clear()
+    down.clear()
+    FaxDigestItem.objects.filter(account=a).update(claimed_at=timezone.now() - DIGEST_STALE_AFTER * 2)
+    runner.run_once()
+    check("retry goes to the failed webhook only", posts == [bad_hook.url])
+    check("retry doesn't repeat the email", emails(a) == 1)
+    check("results deleted once every webhook has them", not FaxDigestItem.objects.filter(account=a).exists())
+
+    c = account('charlie')
+    buffer_result(c, None, 'fax.sent', {'status': 'completed'})
+    buffer_result(a, None, 'fax.sent', {'status': 'completed'})
+    age(a, 6)
+    age(c, 6)
+    flush = runner.flush
+
+    def broken_flush(acct, items):
+        if acct.pk == c.pk:
+            raise RuntimeError("boom")
+        return flush(acct, items)
+
+    runner.flush = broken_flush
+    check("a failing account doesn't stop the others", runner.run_once() == 1)
+    check("the failed account's results stay claimed",
+          FaxDigestItem.objects.filter(account=c, claim__isnull=False).count() == 1)
+    transaction.set_rollback(True)
+
+finish()
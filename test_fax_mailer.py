@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+"""Check outbox retry, backoff and reconnect against a fake SMTP connection, and download-token paths (rolled back)"""
+
+import os
+import smtplib
+import tempfile
+import django
+from datetime import timedelta
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.core import signing
+from django.db import transaction
+from django.test import override_settings
+from django.utils import timezone
+from main.apps.fax import mailer
+from main.apps.fax.mailer import Mailer, queue_email, download_path, DOWNLOAD_SALT, EMAIL_RETRY_DELAY, EMAIL_STALE_AFTER
+from main.apps.fax.models_extended import FaxEmail
+from check_helpers import check, finish
+
+print("Fax Mailer Test")
+print("=" * 40)
+
+
+class Connection:
+    """Stands in for the SMTP backend; `plan` holds errors for the next sends"""
+    opened = 0
+    plan = []
+    sent = []
+    reachable = True
+    reconnect = True
+
+    def open(self):
+        if not Connection.reachable or (Connection.opened and not Connection.reconnect):
+            raise ConnectionRefusedError("Connection refused")
+        Connection.opened += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if Connection.plan:
+            raise Connection.plan.pop(0)
+        Connection.sent.extend(messages)
+        return len(messages)
+
+
+def reset():
+    Connection.opened = 0
+    Connection.plan = []
+    Connection.sent = []
+    Connection.reachable = True
+    Connection.reconnect = True
+
+
+def queued(count=1, **kwargs):
+    return [queue_email(to=['user@example.com'], subject=f"Test {n}", body="Body", **kwargs) for n in range(count)]
+
+
+def fresh(email):
+    email.refresh_from_db()
+    return email
+
+
+def seconds_until(email):
+    return (email.next_attempt_at - timezone.now()).total_seconds()
+
+
+mailer.get_connection = lambda **kwargs: Connection()
+
+with transaction.atomic():
+    # Only this script's emails are due
+    FaxEmail.objects.filter(status__in=['pending', 'sending']).update(status='failed')
+
+    reset()
+    emails = queued(3)
+    runner = Mailer()
+    runner.run()
+    check("a batch goes out over one connection", Connection.opened == 1 and len(Connection.sent) == 3)
+    check("sent emails are marked sent", all(fresh(email).status == 'sent' for email in emails))
+
+    reset()
+    [email] = queued()
+    Connection.plan = [smtplib.SMTPServerDisconnected("idle timeout")]
+    runner = Mailer()
+    runner.open()
+    runner.send_batch()
+    check("a dropped connection is reopened once", Connection.opened == 2 and fresh(email).status == 'sent')
+
+    reset()
+    emails = queued(3)
+    Connection.plan = [smtplib.SMTPServerDisconnected("idle timeout")]
+    Connection.reconnect = False
+    Mailer().send_batch()
+    emails = [fresh(email) for email in emails]
+    check("a failed reconnect puts the rest of the batch back",
+          all(email.status == 'pending' and email.attempts == 1 for email in emails))
+    check("the rest of the batch sees the connection error",
+          all('Connection refused' in email.last_error for email in emails))
+    FaxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(status='failed')
+
+    reset()
+    [email] = queued()
+    Connection.plan = [smtplib.SMTPDataError(451, "try later")]
+    runner = Mailer()
+    runner.send_batch()
+    email = fresh(email)
+    check("a temporary error is retried", email.status == 'pending' and email.attempts == 1)
+    check("the first retry waits EMAIL_RETRY_DELAY", abs(seconds_until(email) - EMAIL_RETRY_DELAY) < 5)
+    check("emails aren't claimed before they are due", runner.send_batch() == 0)
+
+    FaxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+    Connection.plan = [smtplib.SMTPDataError(451, "try later")]
+    runner.send_batch()
+    check("the delay doubles with every attempt", abs(seconds_until(fresh(email)) - EMAIL_RETRY_DELAY * 2) < 5)
+
+    FaxEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now(), attempts=email.max_attempts - 1)
+    Connection.plan = [smtplib.SMTPDataError(451, "try later")]
+    runner.send_batch()
+    check("the last attempt fails the email", fresh(email).status == 'failed')
+
+    reset()
+    [email] = queued()
+    Connection.plan = [smtplib.SMTPRecipientsRefused({'user@example.com': (550, b'no such user')})]
+    Mailer().send_batch()
+    check("refused recipients fail at once", fresh(email).status == 'failed' and email.attempts == 1)
+
+    reset()
+    [email] = queued()
+    FaxEmail.objects.filter(pk=email.pk).update(attachments=[['/nonexistent/fax.pdf', 'fax.pdf', 'application/pdf']])
+    Mailer().send_batch()
+    check("a missing attachment fails at once", fresh(email).status == 'failed')
+
+    reset()
+    emails = queued(2)
+    Connection.reachable = False
+    Mailer().send_batch()
+    check("an unreachable server puts the batch back",
+          all(fresh(email).status == 'pending' and email.attempts == 1 for email in emails))
+    FaxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(status='failed')
+
+    [email] = queued()
+    FaxEmail.objects.filter(pk=email.pk).update(status='sending', updated_at=timezone.now() - EMAIL_STALE_AFTER * 2)
+    check("stale sending emails are requeued", Mailer().requeue_stale() == 1 and fresh(email).status == 'pending')
+    FaxEmail.objects.filter(pk=email.pk).update(status='failed')
+
+    reset()
+    polls = []
+
+    def sleep(seconds):
+        # A worker dies holding an email while this one idles; stop after the next poll
+        if polls:
+            raise KeyboardInterrupt
+        polls.append(seconds)
+        [stuck] = queued()
+        FaxEmail.objects.filter(pk=stuck.pk).update(status='sending', updated_at=timezone.now() - EMAIL_STALE_AFTER * 2)
+        polls.append(stuck)
+
+    real_sleep, mailer.time.sleep = mailer.time.sleep, sleep
+    try:
+        Mailer().run(loop=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mailer.time.sleep = real_sleep
+    check("a looping worker requeues stale emails on every poll", len(polls) == 2 and fresh(polls[1]).status == 'sent')
+    transaction.set_rollback(True)
+
+media = tempfile.mkdtemp()
+with override_settings(MEDIA_ROOT=media):
+    path = os.path.join(media, 'fax', 'rx', 'fax.pdf')
+    os.makedirs(os.path.dirname(path))
+    open(path, 'wb').close()
+    outside = tempfile.NamedTemporaryFile(delete=False)
+
+    def token(relative):
+        return signing.dumps(relative, salt=DOWNLOAD_SALT, compress=True)
+
+    check("a token resolves to its file", download_path(token('fax/rx/fax.pdf')) == path)
+    check("'..' out of MEDIA_ROOT is refused", download_path(token('../' * 8 + outside.name.lstrip('/'))) is None)
+    check("absolute paths are refused", download_path(token(outside.name)) is None)
+    os.symlink(outside.name, os.path.join(media, 'link.pdf'))
+    check("symlinks out of MEDIA_ROOT are refused", download_path(token('link.pdf')) is None)
+    try:
+        download_path(token('fax/rx/fax.pdf')[:-2] + 'xx')
+        check("tampered tokens are rejected", False)
+    except signing.BadSignature:
+        check("tampered tokens are rejected", True)
+    expired = token('fax/rx/fax.pdf')
+    real_time = signing.time.time
+    signing.time.time = lambda: real_time() + (mailer.EMAIL_LINK_DAYS + 1) * 86400
+    try:
+        download_path(expired)
+        check("expired tokens are rejected", False)
+    except signing.SignatureExpired:
+        check("expired tokens are rejected", True)
+    finally:
+        signing.time.time = real_time
+    os.remove(outside.name)
+
+finish()
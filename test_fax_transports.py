@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""Check transport selection, spill-over and failover with fake transports"""
+
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.core.cache import cache
+import time
+from main.apps.fax.transports import (
+    TransportRouter, FakeTransport, TransportError, record_result, _health_keys, HEALTH_BUCKET_SECONDS
+)
+from check_helpers import check, finish
+
+print("Fax Transport Routing Test")
+print("=" * 40)
+
+
+def reset_health():
+    bucket = int(time.time() // HEALTH_BUCKET_SECONDS)
+    for name in ('local', 'cloud'):
+        cache.delete_many(_health_keys(name, bucket) + _health_keys(name, bucket - 1))
+
+
+def router(*transports):
+    r = TransportRouter(transports=list(transports))
+    # No DID lookups: every sender uses automatic selection unless set here
+    r._preferences['2125550100'] = ''
+    return r
+
+
+reset_health()
+
+# Primary takes traffic while under capacity
+local, cloud = FakeTransport('local', capacity=3), FakeTransport('cloud', capacity=100)
+r = router(local, cloud)
+sent = [r.send('2125550100', f'31055501{i:02d}', '/tmp/a.tiff').transport for i in range(5)]
+check("first 3 faxes on the primary", sent[:3] == ['local'] * 3)
+check("overflow spills to the next transport", sent[3:] == ['cloud'] * 2)
+
+# Explicit preference wins while it has room
+local, cloud = FakeTransport('local', capacity=10), FakeTransport('cloud', capacity=10)
+r = router(local, cloud)
+r._preferences['2125550100'] = 'cloud'
+check("DID/tenant preference is used first", r.send('2125550100', '3105550100', '/tmp/a.tiff').transport == 'cloud')
+
+# Failover when the chosen transport raises
+local, cloud = FakeTransport('local', fail=True), FakeTransport('cloud')
+r = router(local, cloud)
+dispatch = r.send('2125550100', '3105550100', '/tmp/a.tiff')
+check("failed send retried on the next transport", dispatch.transport == 'cloud' and len(cloud.sent) == 1)
+
+# Error rate above the threshold takes a transport out of rotation
+for _ in range(20):
+    record_result('local', False)
+local, cloud = FakeTransport('local'), FakeTransport('cloud')
+r = router(local, cloud)
+check("unhealthy transport is skipped", r.send('2125550100', '3105550100', '/tmp/a.tiff').transport == 'cloud')
+
+# Nothing left to try
+reset_health()
+r = router(FakeTransport('local', fail=True), FakeTransport('cloud', fail=True))
+try:
+    r.send('2125550100', '3105550100', '/tmp/a.tiff')
+    check("TransportError when every transport fails", False)
+except TransportError as e:
+    check("TransportError when every transport fails", 'local' in str(e) and 'cloud' in str(e))
+
+reset_health()
+finish()
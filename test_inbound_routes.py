@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Check that the inbound routing map is cached and dropped when its rows change (rolled back)"""
+
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from main.apps.fax.bulk_actions import BULK_ACTIONS
+from main.apps.fax.inbound_routes import get_inbound_route, get_routes_version, INBOUND_ROUTES_VERSION_KEY
+from main.apps.fax.models_complete import Tenant, DID, InboundFaxSettings
+from main.apps.fax.models_extended import FaxAccount
+from check_helpers import check, finish
+
+print("Inbound Routing Map Test")
+print("=" * 40)
+
+
+def lookup(number):
+    with CaptureQueriesContext(connection) as queries:
+        route = get_inbound_route(number)
+    return route, len(queries)
+
+
+# Signals invalidate on commit; run those callbacks inside the rolled-back transaction
+committed = TestCase.captureOnCommitCallbacks
+
+with transaction.atomic():
+    with committed(execute=True):
+        user = User.objects.create(username='routes-test')
+        FaxAccount.objects.create(user=user, fax_number='12125550170', notification_email='routes@example.com')
+        tenant = Tenant.objects.create(name='routes-test', company_name='Routes', domain='routes.test')
+
+    route, queries = lookup('+1 212 555 0170')
+    check("account number routes to its account", route is not None and route.user_id == user.pk)
+    route, queries = lookup('2125550170')
+    check("a current map answers without queries", route is not None and queries == 0)
+    check("unknown numbers don't route", lookup('13105550199')[0] is None)
+
+    with committed(execute=False) as callbacks:
+        did = DID.objects.create(number='13105550171', tenant=tenant, assigned_to=user, is_fax_enabled=True)
+    check("the map is kept until the change commits", lookup('13105550171') == (None, 0))
+    for callback in callbacks:
+        callback()
+    route, queries = lookup('13105550171')
+    check("a new DID routes once committed", route is not None and route.did_id == did.pk and queries > 0)
+
+    with committed(execute=True):
+        BULK_ACTIONS['deactivate_tenants'][1](Tenant.objects.filter(pk=tenant.pk))
+    check("bulk tenant deactivation (no signals) drops the DID", lookup('13105550171')[0] is None)
+
+    with committed(execute=True):
+        BULK_ACTIONS['activate_tenants'][1](Tenant.objects.filter(pk=tenant.pk))
+    check("bulk tenant activation restores the DID", lookup('13105550171')[0] is not None)
+    DID.objects.filter(pk=did.pk).update(route_to_email='desk@example.com')
+    check("unsignalled updates wait for an invalidation", 'desk@example.com' not in lookup('13105550171')[0].emails)
+
+    # Another worker saving a row bumps the shared version
+    cache.incr(INBOUND_ROUTES_VERSION_KEY)
+    route, queries = lookup('13105550171')
+    check("a version bump from another worker rebuilds the map", queries > 0 and 'desk@example.com' in route.emails)
+    check("version is shared through the cache", cache.get(INBOUND_ROUTES_VERSION_KEY) == get_routes_version())
+
+    with committed(execute=True):
+        inbound = InboundFaxSettings.objects.create(
+            user=user, tenant=tenant, email_address='inbox@example.com', blocked_senders='1900*'
+        )
+    check("saved screening settings are compiled into the route",
+          not lookup('13105550171')[0].screen('19005550100').accepted)
+    with committed(execute=True):
+        inbound.blocked_senders = ''
+        inbound.save()
+    check("edited screening settings replace the compiled rules",
+          lookup('13105550171')[0].screen('19005550100').accepted)
+    transaction.set_rollback(True)
+
+finish()
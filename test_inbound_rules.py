@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Check compiled inbound screening rules (no database or FreeSWITCH needed)"""
+
+import os
+import django
+from datetime import datetime
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.utils import timezone
+from main.apps.fax.inbound_rules import compile_rules, RuleError
+from check_helpers import check, finish
+
+print("Inbound Rules Test")
+print("=" * 40)
+
+
+def at(day, hour, minute=0):
+    # 2024-01-01 is a Monday
+    return timezone.make_aware(datetime(2024, 1, day, hour, minute))
+
+
+rules = compile_rules({
+    'blocked_senders': '18005550100\n1888*\nanonymous',
+    'allowed_senders': '',
+    'routing_enabled': True,
+    'routing_rules': {'rules': [
+        {'senders': ['1900*'], 'action': 'reject'},
+        {'days': ['fri'], 'hours': '18:00-08:00', 'action': 'forward', 'email': 'oncall@example.com'},
+    ]},
+})
+
+check("exact block (national format)", not rules.evaluate('8005550100', at(1, 12)).accepted)
+check("prefix block", not rules.evaluate('+1 888 123 4567', at(1, 12)).accepted)
+check("anonymous block", not rules.evaluate('', at(1, 12)).accepted)
+check("rule reject by prefix", rules.evaluate('19005550100', at(1, 12)).reason == 'routing rule 1')
+check("ordinary sender accepted", rules.evaluate('12125550100', at(1, 12)) == (True, '', ()))
+check("overnight window on the start day", rules.evaluate('12125550100', at(5, 23)).emails == ('oncall@example.com',))
+check("overnight window after midnight", rules.evaluate('12125550100', at(6, 7)).emails == ('oncall@example.com',))
+check("outside the window", rules.evaluate('12125550100', at(6, 9)).emails == ())
+
+allow = compile_rules({'allowed_senders': '1212*', 'blocked_senders': '', 'routing_enabled': False, 'routing_rules': {}})
+check("allow list admits listed prefix", allow.evaluate('2125550100').accepted)
+check("allow list rejects others", not allow.evaluate('3105550100').accepted)
+
+check("nothing configured compiles to None", compile_rules({
+    'allowed_senders': '', 'blocked_senders': '', 'routing_enabled': True, 'routing_rules': {},
+}) is None)
+
+single = compile_rules({'allowed_senders': '', 'blocked_senders': '', 'routing_enabled': True, 'routing_rules': {
+    'rules': [{'senders': '18005550100', 'action': 'reject'}],
+}})
+check("a lone sender string is one number", not single.evaluate('18005550100', at(1, 12)).accepted)
+
+for bad in ({'rules': [{'action': 'drop'}]}, {'rules': [{'hours': '25:00-01:00'}]}, {'rules': [{'action': 'forward'}]},
+            {'rules': [{'senders': 18005550100, 'action': 'reject'}]}, {'rules': [{'days': {'sat': True}}]}):
+    try:
+        compile_rules({'allowed_senders': '', 'blocked_senders': '', 'routing_enabled': True, 'routing_rules': bad})
+        check(f"rejects {bad}", False)
+    except RuleError:
+        check(f"rejects {bad}", True)
+
+finish()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Check OCR job claiming under the per-tenant cap and stale requeue (rolled back; no tesseract needed)"""
+
+import os
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from main.apps.fax.ocr import OCRRunner, OCR_STALE_AFTER
+from main.apps.fax.models_complete import Tenant
+from main.apps.fax.models_extended import FaxAccount, FaxTransmission, FaxOCRJob
+from check_helpers import check, finish
+
+print("OCR Claim Test")
+print("=" * 40)
+
+
+def jobs(tenant, count):
+    user = User.objects.create(username=f"ocr-test-{tenant.name}")
+    account = FaxAccount.objects.create(user=user, fax_number=f"ocr-{tenant.name}", notification_email='ocr@example.com')
+    for _ in range(count):
+        transmission = FaxTransmission.objects.create(
+            account=account, direction='inbound', sender_number='2125550100', recipient_number=account.fax_number
+        )
+        FaxOCRJob.objects.create(transmission=transmission, tenant=tenant, total_pages=1)
+
+
+def tenants(claimed):
+    return sorted(job.tenant.name for job in claimed)
+
+
+with transaction.atomic():
+    # Only this script's jobs are claimable
+    FaxOCRJob.objects.filter(status__in=['pending', 'processing']).update(status='failed')
+    big = Tenant.objects.create(name='ocr-big', company_name='Big', domain='ocr-big.test')
+    small = Tenant.objects.create(name='ocr-small', company_name='Small', domain='ocr-small.test')
+    jobs(big, 4)
+    jobs(small, 1)
+
+    first = OCRRunner(tenant_limit=2)
+    claimed = first.claim(10)
+    check("claims up to the tenant cap", tenants(claimed) == ['ocr-big', 'ocr-big', 'ocr-small'])
+    check("claimed jobs are processing with a heartbeat",
+          all(job.status == 'processing' and job.heartbeat_at for job in FaxOCRJob.objects.filter(pk__in=[j.pk for j in claimed])))
+    check("a tenant's backlog doesn't block others", 'ocr-small' in tenants(claimed))
+
+    second = OCRRunner(tenant_limit=2)
+    check("the cap holds across runners", second.claim(10) == [])
+
+    FaxOCRJob.objects.filter(pk=claimed[0].pk).update(status='completed', completed_at=timezone.now())
+    check("a finished job frees a slot", tenants(second.claim(10)) == ['ocr-big'])
+
+    check("claim respects its limit", len(OCRRunner(tenant_limit=10).claim(1)) == 1)
+
+    FaxOCRJob.objects.filter(tenant=big, status='processing').update(
+        heartbeat_at=timezone.now() - OCR_STALE_AFTER * 2
+    )
+    first.active = {claimed[1].pk: {}}
+    first.heartbeat()
+    check("a live runner's job keeps its claim", FaxOCRJob.objects.get(pk=claimed[1].pk).status == 'processing')
+    check("jobs without a heartbeat are requeued",
+          FaxOCRJob.objects.filter(tenant=big, status='pending').count() == 2)
+
+    # A backlog larger than the claim window, queued ahead of another tenant's job
+    FaxOCRJob.objects.filter(status__in=['pending', 'processing']).update(status='failed')
+    flood = Tenant.objects.create(name='ocr-flood', company_name='Flood', domain='ocr-flood.test')
+    late = Tenant.objects.create(name='ocr-late', company_name='Late', domain='ocr-late.test')
+    jobs(flood, 40)
+    jobs(late, 1)
+    runner = OCRRunner(workers=3, tenant_limit=2)
+    check("a large backlog doesn't starve a later tenant",
+          tenants(runner.claim(3)) == ['ocr-flood', 'ocr-flood', 'ocr-late'])
+    transaction.set_rollback(True)
+
+finish()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Exercise the pooled Telnyx client against a local stub server"""
+
+import os
+import json
+import threading
+import django
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+django.setup()
+
+from django.core.cache import cache
+from main.apps.fax.telnyx_integration import TelnyxDIDManager, FAX_CONNECTION_CACHE_KEY
+from check_helpers import check, finish
+
+print("Telnyx Client Stub Test")
+print("=" * 40)
+
+
+class StubTelnyx(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    hits = []
+    ports = set()
+    # path -> statuses to return before succeeding
+    failures = {}
+
+    def _reply(self, code, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        StubTelnyx.hits.append((self.command, self.path))
+        StubTelnyx.ports.add(self.client_address[1])
+
+        pending = StubTelnyx.failures.get((self.command, self.path))
+        if pending:
+            code = pending.pop(0)
+            return self._reply(code, {'errors': []}, {'Retry-After': '0'} if code == 429 else None)
+
+        if self.path.startswith('/fax_applications'):
+            return self._reply(200, {'data': [{'id': 'conn-1'}]})
+        if self.path == '/faxes':
+            return self._reply(200, {'data': {'id': 'fax-1'}})
+        return self._reply(404, {'errors': []})
+
+    do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(('127.0.0.1', 0), StubTelnyx)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+base_url = f"http://127.0.0.1:{server.server_port}"
+
+
+cache.delete(FAX_CONNECTION_CACHE_KEY)
+manager = TelnyxDIDManager(api_key='test', base_url=base_url)
+
+# 429 with Retry-After on the lookup, then success
+StubTelnyx.failures[('GET', '/fax_applications')] = [429, 503]
+check("retries 429/503 on GET", manager.get_or_create_fax_connection() == 'conn-1')
+check("three attempts for the lookup", StubTelnyx.hits.count(('GET', '/fax_applications')) == 3)
+
+# Connection ID comes from cache now: no lookup per send
+StubTelnyx.hits.clear()
+StubTelnyx.failures[('POST', '/faxes')] = [429]
+check("retries 429 on POST", manager.send_fax('2125550100', '2125550101', 'http://example.com/a.pdf') == 'fax-1')
+check("no fax_applications lookup on send", ('GET', '/fax_applications') not in StubTelnyx.hits)
+
+# 5xx on a POST must not be repeated (it may have been processed)
+StubTelnyx.hits.clear()
+StubTelnyx.failures[('POST', '/faxes')] = [503]
+check("no retry of POST on 503", manager.send_fax('2125550100', '2125550101', 'http://example.com/a.pdf') is None)
+check("single POST attempt", StubTelnyx.hits.count(('POST', '/faxes')) == 1)
+
+check("requests reused one keep-alive connection", len(StubTelnyx.ports) == 1)
+
+server.shutdown()
+finish()